@@ -7,6 +7,8 @@ Each chunk is a dict with:
 - role: router/support/static
 - data: short embedded routing summary (what gets embedded)
 - text: full reference text (not embedded)
+- expands (optional): topics pulled in as support whenever this topic is selected
+- always_include (optional): include this topic's support on every prompt
 
 NOTE: Only `data` should be embedded for vector search.
 """
@@ -998,6 +1000,7 @@ PROMPT_PLANNER_POLICY = {
     "topic": "planner_policy",
     "priority": 80,
     "role": "support",
+    "always_include": True,  # keep tiny; do NOT mark "conditions" like this
     "data": """
 SUPPORT.RULE.planner_policy
 Intent: output format + plan writing constraints (Markdown sections, omit unused sections, flow numbering, branch formatting).
@@ -0,0 +1,107 @@
+# data/workflow_catalog.py
+"""
+Trigger, event and condition catalogs of the workflow builder, in the exact
+text the planner prompt (`planner.prompt_full`) embeds. `rag/catalog.py`
+parses them into a code-indexed catalog for plan validation, the router and
+the assembler.
+"""
+
+TRIGGERS_CATALOG = """
+TRIGGERS LIST
+TRG_API = "API Trigger"
+TRG_DB = "Database Trigger"
+TRG_FILE = "File Trigger"
+TRG_SCH = "Scheduled Trigger"
+TRG_BTN = "UI Trigger"
+TRG_WBH = "Webhook Trigger"
+TRG_AUTH = "Authentication Trigger"
+TRG_APRVL = "UI Approval Trigger"
+TRG_FLD = "UI Field Entry Trigger"
+TRG_OUT = "Process Timeout Trigger"
+
+TRIGGER METHODS
+["pwd_reset","login","logout","cng_pwd","add_helpdesk","mod_helpdesk","delete_helpdesk",
+"restore_helpdesk","add_form","mod_form","del_form","add_record","mod_record",
+"restore_record","del_record","add_user","del_user","mod_user","restore_user",
+"approved_public_registration","rejected_public_registration","add_department","mod_department",
+"del_department","restore_department","add_role","mod_role","delete_role","restore_role",
+"{method.lower()}_{str(status_code).lower()}"]
+"""
+
+EVENTS_CATALOG = """
+EVENTS LIST WITH DESCRIPTIONS
+"EVNT_NOTI_MAIL": "Email Notification - Email Events in the Workflow Builder module allow automated sending of emails based on workflow triggers. Users can configure emails with static values or dynamic content, including recipients, subject, body, and attachments. These events ensure timely and consistent communication by automatically sending emails when specific conditions or schedules are met.",
+"EVNT_NOTI_SMS": "SMS Notification - SMS Notifications enable automated text messaging through services like Twilio based on workflow triggers. Users can configure provider credentials, specify recipients and message content, and validate settings to ensure proper delivery. These notifications streamline timely communication by automatically sending SMS messages when workflow conditions are met.",
+"EVNT_NOTI_NOTI": "System Notification - Notification Events allow automated alerts to be sent to recipients based on specific workflow triggers. Users can configure the title, recipients, subject, and message content, ensuring that important updates reach the right stakeholders. This feature helps keep teams informed and ensures timely communication when predefined conditions are met.",
+"EVNT_NOTI_PUSH": "Push Notification - Push Notification Events allow automated alerts to be sent to mobile devices based on specific workflow triggers. Users can configure the title, recipients, subject, and message content to ensure timely updates. This feature keeps stakeholders informed in real-time and ensures important notifications are delivered promptly when predefined conditions are met.",
+"EVNT_UX_ALRT": "Alert Message - The Alert Message Event allows users to configure and display notifications within the system. Users can set the position on the screen, choose the alert type (default, success, error), specify an autoclose delay, and provide the message content. When triggered, the alert appears according to the configured settings, providing timely feedback or notifications to users.",
+"EVNT_RCRD_ADD": "Create A Dynamic Record - Automates creation of application-specific records within customizable windows (e.g., hotel bookings, patient records, inventory items). Supports field configuration using static data, workflow variables, previous node outputs, or user input. Enables bulk creation for scalable industry-specific data management.",
+"EVNT_RCRD_INFO": "Retrieve a Dynamic Record - Fetches specific application records from configurable system windows for processing, validation, or reference. Uses constants, workflow data, or filters to retrieve industry-specific data like military equipment, hotel reservations, or library transactions.",
+"EVNT_RCRD_UPDT": "Update A Dynamic Record - Modifies existing application records by selecting from dynamic system windows. Fields can be auto-filled with previous data and updated using static values, workflow variables, or user input for real-time application data maintenance across different domains.",
+"EVNT_RCRD_DEL": "Delete A Dynamic Record - Enables automated removal of application-specific records from dynamic windows based on predefined conditions. Uses constants, workflow data, or filters for precise deletion of industry-specific records like hospital appointments or military personnel data.",
+"EVNT_RCRD_REST": "Restore A Dynamic Record - Recovers previously deleted application records from dynamic system windows based on predefined conditions. Enables automatic restoration of domain-specific data across various business systems.",
+"EVNT_RCRD_DUP": "Duplicate A Dynamic Record - Creates exact copies of application records from dynamic system windows based on predefined conditions. Enables automatic duplication of industry-specific records with configurable field values for hotel room types, medical procedures, or library resources.",
+"EVNT_RCRD_ADD_STC": "Create A Static Record - Automates creation of system-level static records for user management, role assignments, department setup, and other standardized system configurations. Supports consistent field mapping across all applications and domains.",
+"EVNT_RCRD_INFO_STC": "Retrieve a Static Record - Fetches system-level static records from predefined tables for user authentication, role verification, department lookup, and other standardized system references that remain consistent regardless of application domain.",
+"EVNT_RCRD_UPDT_STC": "Update A Static Record - Modifies existing system-level static records for user profile updates, role changes, department modifications, and other standardized system maintenance tasks that apply universally across all systems.",
+"EVNT_RCRD_DEL_STC": "Delete A Static Record - Enables removal of system-level static records from predefined tables for user deactivation, role removal, or department cleanup following standardized system protocols applicable to all business domains.",
+"EVNT_RCRD_REST_STC": "Restore A Static Record - Recovers previously deleted system-level static records from predefined tables for user reactivation, role restoration, or department recovery using consistent system-wide standards.",
+"EVNT_RCRD_DUP_STC": "Duplicate A Static Record - Creates exact copies of system-level static records from predefined tables for role duplication, department cloning, or other standardized system configurations.",
+"EVNT_DATA_OPR": "Calculation - The Formula Event allows users to perform dynamic computations and data transformations within workflows using predefined formulas. Users can define formula rows with static values, workflow variables, or outputs from previous events. Available formula categories include String, Arithmetic, Statistics, DateTime, Array, Dictionary, Regex, Math, Digital Logic, and Utility functions.",
+"EVNT_FLTR": "Filter Records - The Filter Event allows users to retrieve multiple records from dynamic windows based on specific conditions. Users can define filtering criteria using field comparisons, logical operators, or workflow data to automatically select matching records. This event streamlines data retrieval.",
+"EVNT_JMES": "JMES Data Extraction - The JMESPath Data Extraction Event enables users to transform and extract specific elements from JSON data using JMESPath queries. Input JSON can come from static sources or previous workflow steps, and queries allow filtering, restructuring, and generating new JSON outputs.",
+"EVNT_JSON_CNTRCT": "JSON Contract Validation - The JSON Contract Validation Event enables users to validate JSON data against a predefined schema or contract. Acting as a quality gate in workflows, it ensures that data meets the required structure and constraints before proceeding.",
+"EVNT_LGR": "Workflow Logger - The Workflow Logger Event records key workflow activities, errors, and events for monitoring, debugging, and auditing. It supports configurable logging levels (Info, Error, Access, Security, Performance), structured JSON log formats, and conditional logging.",
+"EVNT_USER_MGMT_ADD": "Create a User - The Create User Event automates the creation of new users in the system by defining user details such as name, email, country, department, role, password, and creator. It supports specifying a logged-in or a static user as the creator.",
+"EVNT_USER_MGMT_UPDT": "Update a User - The Update User Event automates modifying existing user details in the system, such as name, email, country, department, and role. It allows selecting a specific user, configuring update parameters, and triggering the event to apply changes.",
+"EVNT_USER_MGMT_DEACT": "Deactivate / Activate a User - This event automates changing user statuses to 'Active' or 'Inactive.' Users can configure it for specific users via dropdown selection or for multiple users based on conditions (e.g., department).",
+"EVNT_USER_MGMT_ASSIGN": "Assign a Role - This event automates assigning roles to users. Roles can be assigned to specific users via dropdown selection or through a designated user performing the assignment.",
+"EVNT_USER_MGMT_EXTND": "Extend User to Another System - This event automates granting a user access to additional systems. Administrators select the user, choose the target system(s), and assign roles.",
+"EVNT_ROLE_PRMSSN": "Assign or Remove Permissions - Event for managing role permissions within the system.",
+"EVNT_PBL_RGSTN": "Public Registration - This event enables administrators to create a public registration link and send it via email. Configurations include link expiry, usage limits, department and role assignment, and customizable email content.",
+"EVNT_INVC_ADD": "Generate Invoice - Event for creating invoices within the system.",
+"EVNT_INVC_UPDT": "Update Invoice - Event for modifying existing invoices.",
+"EVNT_INVC_SEND": "Send Invoice - Event for sending invoices to recipients.",
+"EVNT_RPRT_PDF": "Report in PDF - This event enables automated report generation based on selected menus, windows, and templates. Users can configure input types and specify who updates the report.",
+"EVNT_SPRT_TKT": "Support Ticket - Event for managing support ticket operations.",
+"EVNT_RCRD_DUMP": "Generate Data Link - Event for creating data export links.",
+"EVNT_EXT_API": "External API Event - This event automates interactions with external APIs by configuring HTTP requests, including method, URL, headers, and query parameters.",
+"EVNT_NOTI_WBH": "Webhook - This event sends real-time notifications to external systems via a configured webhook URL. Users can set the URL, authentication credentials, payload, and notification settings.",
+"EVNT_CHATGPT": "AI-Powered Event - This event integrates OpenAI's ChatGPT into workflows to automate conversational tasks, text processing, and intelligent responses. Users configure a prompt and authenticate with an OpenAI API token.",
+"EVNT_EXT_DB": "External Database Integration - This event allows workflows to connect to external databases (PostgreSQL, MySQL, Oracle), execute SQL queries, and retrieve results in JSON format.",
+"EVNT_VAR_ADD": "Create a variable - This event allows users to define and store variables for use in workflows. Users can specify the variable name, type, and input source.",
+"EVNT_VAR_INFO": "Retrieve a variable - This event enables users to fetch previously stored variables for use in workflows. Users select the record ID to retrieve.",
+"EVNT_VAR_UPDT": "Update a variable - This event allows users to modify previously stored variables for use in workflows. Users select the record ID to update.",
+"EVNT_VAR_DEL": "Delete a variable - This event allows users to permanently remove stored variables. Users select the record ID to delete.",
+"EVNT_UX_RDRCT": "Redirect (URL) - The Redirect URL Event allows users to automate redirection to specific URLs, supporting both local and external destinations.",
+"EVNT_ACT_DYN_REQ": "Request an Approval - This event allows users to configure approval requests for specific records or processes. Users define the title, description, menu, window, and record setup.",
+"EVNT_ACT_DYN_MOD": "Modify a Request - This event allows users to modify existing approval requests by configuring the title, description, menu, window, record field, default values, and the assigned user.",
+"EVNT_ACT_VIEW": "View Data - Event for viewing specific data records.",
+"EVNT_ACT_BULK_VIEW": "View Bulk Data - Event for viewing multiple data records.",
+"EVNT_ACT_SHR": "Share - Event for sharing data or records.",
+"EVNT_ACT_QR": "QR Code Generation - Event for generating QR codes.",
+"EVNT_ACT_DWLND": "Download - Event for downloading data or files.",
+"EVNT_ACT_CPY_RW": "Copy Row - Event for copying table rows.",
+"EVNT_ACT_CPYDATA": "Copy Data - Event for copying data between fields or records.",
+"EVNT_ACT_DISC_FM": "Discussion Forum - Event for forum discussions.",
+"EVNT_ACT_MNG_SCH": "Manage Schedule - Event for schedule management.",
+"EVNT_ACT_VRFY": "Verify - Event for verification operations.",
+"EVNT_ACT_CMMNT": "Comment - Event for adding comments.",
+"EVNT_LOOP_FOR": "For Loop - Iterates over a range of numbers or items in an array. It runs a defined workflow for each item or value in the sequence. Ideal for automating repetitive batch tasks like processing lists or sending bulk notifications.",
+"EVNT_LOOP_WHILE": "While Loop - Repeats a workflow as long as a condition is true, checked before each iteration. Ideal for dynamic scenarios where the number of iterations is unknown and depends on changing data.",
+"EVNT_LOOP_DOWHILE": "Do While Loop - Executes its workflow at least once. The condition to continue is checked after each iteration. Ideal for ensuring an action runs before checking if it needs to repeat.",
+"EVNT_LOOP_BREAK": "Break Loop - This block is used to immediately exit a loop when a specified condition becomes true. It halts all further iterations, moving the workflow directly to the next step. This prevents unnecessary operations and optimizes efficiency.",
+"EVNT_LOOP_CONTINUE": "Continue Loop - Skips the current loop iteration when a condition is met. Proceeds directly to the next cycle, bypassing any remaining steps. This prevents redundant actions and improves loop efficiency."
+"""
+
+CONDITIONS_CATALOG = """
+CNDN_BIN = "Binary Condition - Binary Conditions in Workflow Management trigger actions based on true/false logic evaluations. A basic setup includes a logic block, an If block for true actions, and an Else block for false actions. Complex conditions can combine multiple criteria using AND/OR operators. Always validate and test conditions to ensure workflows run as expected."
+
+CNDN_SEQ = "Sequential Condition - Sequential Conditions let you run logical checks in a set order, executing the first matching condition's action and skipping the rest. A basic setup handles simple scenarios, while complex setups use logical operators for multi-criteria conditions. Always validate and test to ensure correct actions trigger based on different sequential checks. Use with CNDN_LGC for each independent logic block."
+
+CNDN_LGC = "Logic Block - Used within CNDN_SEQ to represent individual independent condition checks. Each CNDN_LGC contains one condition and its associated action."
+
+CNDN_DOM = "Domino Condition - Domino Conditions enable sequential logical evaluations in workflows, triggering specific actions in order until a match is found, with fallback options for unmatched scenarios. A basic setup defines multiple conditions with corresponding actions, while complex conditions use logical operators (AND/OR) for advanced logic. Always validate and test conditions to ensure accurate execution across all scenarios."
+
+CNDN_LGC_DOM = "Logic Domino Condition - Advanced domino conditions using logical operators (AND/OR) for complex multi-criteria evaluations in sequential order."
+"""
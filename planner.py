@@ -1,30 +1,93 @@
 import logging
 import json
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
 import os
 import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+
+from data.workflow_catalog import CONDITIONS_CATALOG, EVENTS_CATALOG, TRIGGERS_CATALOG
 
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
+PLANNER_MODEL = "gpt-4o-mini"
+PLANNER_TEMPERATURE = 0.0
+
+# crew: CrewAI agent over the full prompt_full (original path)
+# direct: RAG-assembled prompt (rag.assembler) in one chat completion
+# stream: as direct, parsing the streamed completion line by line
+# json: as direct, with a JSON-schema constrained plan (rag/plan_schema.py)
+PLANNER_MODES = ("crew", "direct", "stream", "json")
+PLANNER_MODE = os.getenv("PLANNER_MODE", "crew")
+PLANNER_SYSTEM_PROMPT = "You are a precise workflow planner. Output Markdown only."
+PLANNER_JSON_SYSTEM_PROMPT = (
+    "You are a precise workflow planner. Return the plan as JSON matching the workflow_plan schema "
+    "instead of Markdown: `flow` holds the numbered steps between Start and End, and each "
+    "↳ branch of a step (IF TRUE / IF FALSE, Logic Block, Container with its → IF / ELSE routes, "
+    "INSIDE LOOP) is one entry of its `branches`."
+)
+
+
+# -------- LLM (built on first use) --------
+# crewai / langchain_openai are heavy imports and need an API key, so nothing
+# is constructed at import time: `prompt_full` and the catalogs below can be
+# imported on their own. `planner.gpt4` / `planner.planner_agent` still work
+# through the module __getattr__ at the bottom of this file.
+@lru_cache(maxsize=1)
+def get_llm():
+    from dotenv import load_dotenv
+    from langchain_openai import ChatOpenAI
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    try:
+        gpt4 = ChatOpenAI(model=PLANNER_MODEL, temperature=PLANNER_TEMPERATURE, api_key=api_key)
+        logger.info(f"Initialized ChatOpenAI with model {PLANNER_MODEL} in orchestrator")
+    except Exception as e:
+        logger.error(f"Failed to initialize ChatOpenAI in orchestrator: {str(e)}")
+        raise
+    return gpt4
+
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    # reused across direct-mode calls (keeps the HTTP connection pool warm)
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    load_dotenv()
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@lru_cache(maxsize=1)
+def get_async_openai_client():
+    # for the bulk runner (scripts/plan_bulk.py); bound to the first event loop using it
+    from dotenv import load_dotenv
+    from openai import AsyncOpenAI
+
+    load_dotenv()
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@lru_cache(maxsize=1)
+def get_plan_cache():
+    from rag.plan_cache import PlanCache
+
+    return PlanCache()
+
+
+@lru_cache(maxsize=1)
+def get_template_cache():
+    from rag.query_templates import TemplateCache
+
+    return TemplateCache()
 
-# Initialize LLM
-try:
-    gpt4 = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=api_key)
-    logger.info("Initialized ChatOpenAI with model gpt-4o-mini in orchestrator")
-except Exception as e:
-    logger.error(f"Failed to initialize ChatOpenAI in orchestrator: {str(e)}")
-    raise
 
 # -------- Planner Agent --------
-planner_agent = Agent(
-    role="Workflow Planner",
-    goal="Transform user requests into structured workflow plans in Markdown with precise understanding of JMES extraction, filtering, retrieval, binary conditions, domino conditions, sequence conditions, and loops.",
-    backstory="""
+PLANNER_ROLE = "Workflow Planner"
+PLANNER_GOAL = "Transform user requests into structured workflow plans in Markdown with precise understanding of JMES extraction, filtering, retrieval, binary conditions, domino conditions, sequence conditions, and loops."
+PLANNER_BACKSTORY = """
 You are a top-tier enterprise workflow automation architect. You understand triggers, events, conditions, and workflow logic.
 You generate Markdown structured workflow plans that describe all steps from trigger selection to final actions.
 
@@ -160,9 +223,20 @@ TRIGGER SELECTION DECISION TREE:
 
 
 
-""",
-    llm=gpt4,
-)
+"""
+
+
+@lru_cache(maxsize=1)
+def get_planner_agent():
+    from crewai import Agent
+
+    return Agent(
+        role=PLANNER_ROLE,
+        goal=PLANNER_GOAL,
+        backstory=PLANNER_BACKSTORY,
+        llm=get_llm(),
+    )
+
 
 # -------- Full Prompt --------
 prompt_full = """
@@ -944,89 +1018,9 @@ It should describe:
 
 Stick strictly to the user's request. Do not add extra actions, events, or features such as notifications, emails, or any other outputs unless explicitly mentioned in the query. For example, if the user asks to retrieve or filter records, do not add sending notifications.
 
-TRIGGERS LIST
-TRG_API = "API Trigger"
-TRG_DB = "Database Trigger"
-TRG_FILE = "File Trigger"
-TRG_SCH = "Scheduled Trigger"
-TRG_BTN = "UI Trigger"
-TRG_WBH = "Webhook Trigger"
-TRG_AUTH = "Authentication Trigger"
-TRG_APRVL = "UI Approval Trigger"
-TRG_FLD = "UI Field Entry Trigger"
-TRG_OUT = "Process Timeout Trigger"
-
-TRIGGER METHODS
-["pwd_reset","login","logout","cng_pwd","add_helpdesk","mod_helpdesk","delete_helpdesk",
-"restore_helpdesk","add_form","mod_form","del_form","add_record","mod_record",
-"restore_record","del_record","add_user","del_user","mod_user","restore_user",
-"approved_public_registration","rejected_public_registration","add_department","mod_department",
-"del_department","restore_department","add_role","mod_role","delete_role","restore_role",
-"{method.lower()}_{str(status_code).lower()}"]
-
-EVENTS LIST WITH DESCRIPTIONS
-"EVNT_NOTI_MAIL": "Email Notification - Email Events in the Workflow Builder module allow automated sending of emails based on workflow triggers. Users can configure emails with static values or dynamic content, including recipients, subject, body, and attachments. These events ensure timely and consistent communication by automatically sending emails when specific conditions or schedules are met.",
-"EVNT_NOTI_SMS": "SMS Notification - SMS Notifications enable automated text messaging through services like Twilio based on workflow triggers. Users can configure provider credentials, specify recipients and message content, and validate settings to ensure proper delivery. These notifications streamline timely communication by automatically sending SMS messages when workflow conditions are met.",
-"EVNT_NOTI_NOTI": "System Notification - Notification Events allow automated alerts to be sent to recipients based on specific workflow triggers. Users can configure the title, recipients, subject, and message content, ensuring that important updates reach the right stakeholders. This feature helps keep teams informed and ensures timely communication when predefined conditions are met.",
-"EVNT_NOTI_PUSH": "Push Notification - Push Notification Events allow automated alerts to be sent to mobile devices based on specific workflow triggers. Users can configure the title, recipients, subject, and message content to ensure timely updates. This feature keeps stakeholders informed in real-time and ensures important notifications are delivered promptly when predefined conditions are met.",
-"EVNT_UX_ALRT": "Alert Message - The Alert Message Event allows users to configure and display notifications within the system. Users can set the position on the screen, choose the alert type (default, success, error), specify an autoclose delay, and provide the message content. When triggered, the alert appears according to the configured settings, providing timely feedback or notifications to users.",
-"EVNT_RCRD_ADD": "Create A Dynamic Record - Automates creation of application-specific records within customizable windows (e.g., hotel bookings, patient records, inventory items). Supports field configuration using static data, workflow variables, previous node outputs, or user input. Enables bulk creation for scalable industry-specific data management.",
-"EVNT_RCRD_INFO": "Retrieve a Dynamic Record - Fetches specific application records from configurable system windows for processing, validation, or reference. Uses constants, workflow data, or filters to retrieve industry-specific data like military equipment, hotel reservations, or library transactions.",
-"EVNT_RCRD_UPDT": "Update A Dynamic Record - Modifies existing application records by selecting from dynamic system windows. Fields can be auto-filled with previous data and updated using static values, workflow variables, or user input for real-time application data maintenance across different domains.",
-"EVNT_RCRD_DEL": "Delete A Dynamic Record - Enables automated removal of application-specific records from dynamic windows based on predefined conditions. Uses constants, workflow data, or filters for precise deletion of industry-specific records like hospital appointments or military personnel data.",
-"EVNT_RCRD_REST": "Restore A Dynamic Record - Recovers previously deleted application records from dynamic system windows based on predefined conditions. Enables automatic restoration of domain-specific data across various business systems.",
-"EVNT_RCRD_DUP": "Duplicate A Dynamic Record - Creates exact copies of application records from dynamic system windows based on predefined conditions. Enables automatic duplication of industry-specific records with configurable field values for hotel room types, medical procedures, or library resources.",
-"EVNT_RCRD_ADD_STC": "Create A Static Record - Automates creation of system-level static records for user management, role assignments, department setup, and other standardized system configurations. Supports consistent field mapping across all applications and domains.",
-"EVNT_RCRD_INFO_STC": "Retrieve a Static Record - Fetches system-level static records from predefined tables for user authentication, role verification, department lookup, and other standardized system references that remain consistent regardless of application domain.",
-"EVNT_RCRD_UPDT_STC": "Update A Static Record - Modifies existing system-level static records for user profile updates, role changes, department modifications, and other standardized system maintenance tasks that apply universally across all systems.",
-"EVNT_RCRD_DEL_STC": "Delete A Static Record - Enables removal of system-level static records from predefined tables for user deactivation, role removal, or department cleanup following standardized system protocols applicable to all business domains.",
-"EVNT_RCRD_REST_STC": "Restore A Static Record - Recovers previously deleted system-level static records from predefined tables for user reactivation, role restoration, or department recovery using consistent system-wide standards.",
-"EVNT_RCRD_DUP_STC": "Duplicate A Static Record - Creates exact copies of system-level static records from predefined tables for role duplication, department cloning, or other standardized system configurations.",
-"EVNT_DATA_OPR": "Calculation - The Formula Event allows users to perform dynamic computations and data transformations within workflows using predefined formulas. Users can define formula rows with static values, workflow variables, or outputs from previous events. Available formula categories include String, Arithmetic, Statistics, DateTime, Array, Dictionary, Regex, Math, Digital Logic, and Utility functions.",
-"EVNT_FLTR": "Filter Records - The Filter Event allows users to retrieve multiple records from dynamic windows based on specific conditions. Users can define filtering criteria using field comparisons, logical operators, or workflow data to automatically select matching records. This event streamlines data retrieval.",
-"EVNT_JMES": "JMES Data Extraction - The JMESPath Data Extraction Event enables users to transform and extract specific elements from JSON data using JMESPath queries. Input JSON can come from static sources or previous workflow steps, and queries allow filtering, restructuring, and generating new JSON outputs.",
-"EVNT_JSON_CNTRCT": "JSON Contract Validation - The JSON Contract Validation Event enables users to validate JSON data against a predefined schema or contract. Acting as a quality gate in workflows, it ensures that data meets the required structure and constraints before proceeding.",
-"EVNT_LGR": "Workflow Logger - The Workflow Logger Event records key workflow activities, errors, and events for monitoring, debugging, and auditing. It supports configurable logging levels (Info, Error, Access, Security, Performance), structured JSON log formats, and conditional logging.",
-"EVNT_USER_MGMT_ADD": "Create a User - The Create User Event automates the creation of new users in the system by defining user details such as name, email, country, department, role, password, and creator. It supports specifying a logged-in or a static user as the creator.",
-"EVNT_USER_MGMT_UPDT": "Update a User - The Update User Event automates modifying existing user details in the system, such as name, email, country, department, and role. It allows selecting a specific user, configuring update parameters, and triggering the event to apply changes.",
-"EVNT_USER_MGMT_DEACT": "Deactivate / Activate a User - This event automates changing user statuses to 'Active' or 'Inactive.' Users can configure it for specific users via dropdown selection or for multiple users based on conditions (e.g., department).",
-"EVNT_USER_MGMT_ASSIGN": "Assign a Role - This event automates assigning roles to users. Roles can be assigned to specific users via dropdown selection or through a designated user performing the assignment.",
-"EVNT_USER_MGMT_EXTND": "Extend User to Another System - This event automates granting a user access to additional systems. Administrators select the user, choose the target system(s), and assign roles.",
-"EVNT_ROLE_PRMSSN": "Assign or Remove Permissions - Event for managing role permissions within the system.",
-"EVNT_PBL_RGSTN": "Public Registration - This event enables administrators to create a public registration link and send it via email. Configurations include link expiry, usage limits, department and role assignment, and customizable email content.",
-"EVNT_INVC_ADD": "Generate Invoice - Event for creating invoices within the system.",
-"EVNT_INVC_UPDT": "Update Invoice - Event for modifying existing invoices.",
-"EVNT_INVC_SEND": "Send Invoice - Event for sending invoices to recipients.",
-"EVNT_RPRT_PDF": "Report in PDF - This event enables automated report generation based on selected menus, windows, and templates. Users can configure input types and specify who updates the report.",
-"EVNT_SPRT_TKT": "Support Ticket - Event for managing support ticket operations.",
-"EVNT_RCRD_DUMP": "Generate Data Link - Event for creating data export links.",
-"EVNT_EXT_API": "External API Event - This event automates interactions with external APIs by configuring HTTP requests, including method, URL, headers, and query parameters.",
-"EVNT_NOTI_WBH": "Webhook - This event sends real-time notifications to external systems via a configured webhook URL. Users can set the URL, authentication credentials, payload, and notification settings.",
-"EVNT_CHATGPT": "AI-Powered Event - This event integrates OpenAI's ChatGPT into workflows to automate conversational tasks, text processing, and intelligent responses. Users configure a prompt and authenticate with an OpenAI API token.",
-"EVNT_EXT_DB": "External Database Integration - This event allows workflows to connect to external databases (PostgreSQL, MySQL, Oracle), execute SQL queries, and retrieve results in JSON format.",
-"EVNT_VAR_ADD": "Create a variable - This event allows users to define and store variables for use in workflows. Users can specify the variable name, type, and input source.",
-"EVNT_VAR_INFO": "Retrieve a variable - This event enables users to fetch previously stored variables for use in workflows. Users select the record ID to retrieve.",
-"EVNT_VAR_UPDT": "Update a variable - This event allows users to modify previously stored variables for use in workflows. Users select the record ID to update.",
-"EVNT_VAR_DEL": "Delete a variable - This event allows users to permanently remove stored variables. Users select the record ID to delete.",
-"EVNT_UX_RDRCT": "Redirect (URL) - The Redirect URL Event allows users to automate redirection to specific URLs, supporting both local and external destinations.",
-"EVNT_ACT_DYN_REQ": "Request an Approval - This event allows users to configure approval requests for specific records or processes. Users define the title, description, menu, window, and record setup.",
-"EVNT_ACT_DYN_MOD": "Modify a Request - This event allows users to modify existing approval requests by configuring the title, description, menu, window, record field, default values, and the assigned user.",
-"EVNT_ACT_VIEW": "View Data - Event for viewing specific data records.",
-"EVNT_ACT_BULK_VIEW": "View Bulk Data - Event for viewing multiple data records.",
-"EVNT_ACT_SHR": "Share - Event for sharing data or records.",
-"EVNT_ACT_QR": "QR Code Generation - Event for generating QR codes.",
-"EVNT_ACT_DWLND": "Download - Event for downloading data or files.",
-"EVNT_ACT_CPY_RW": "Copy Row - Event for copying table rows.",
-"EVNT_ACT_CPYDATA": "Copy Data - Event for copying data between fields or records.",
-"EVNT_ACT_DISC_FM": "Discussion Forum - Event for forum discussions.",
-"EVNT_ACT_MNG_SCH": "Manage Schedule - Event for schedule management.",
-"EVNT_ACT_VRFY": "Verify - Event for verification operations.",
-"EVNT_ACT_CMMNT": "Comment - Event for adding comments.",
-"EVNT_LOOP_FOR": "For Loop - Iterates over a range of numbers or items in an array. It runs a defined workflow for each item or value in the sequence. Ideal for automating repetitive batch tasks like processing lists or sending bulk notifications.",
-"EVNT_LOOP_WHILE": "While Loop - Repeats a workflow as long as a condition is true, checked before each iteration. Ideal for dynamic scenarios where the number of iterations is unknown and depends on changing data.",
-"EVNT_LOOP_DOWHILE": "Do While Loop - Executes its workflow at least once. The condition to continue is checked after each iteration. Ideal for ensuring an action runs before checking if it needs to repeat.",
-"EVNT_LOOP_BREAK": "Break Loop - This block is used to immediately exit a loop when a specified condition becomes true. It halts all further iterations, moving the workflow directly to the next step. This prevents unnecessary operations and optimizes efficiency.",
-"EVNT_LOOP_CONTINUE": "Continue Loop - Skips the current loop iteration when a condition is met. Proceeds directly to the next cycle, bypassing any remaining steps. This prevents redundant actions and improves loop efficiency."
+""" + TRIGGERS_CATALOG.strip("\n") + """
+
+""" + EVENTS_CATALOG.strip("\n") + """
 
 CONDITIONS LIST WITH DESCRIPTIONS
 Include conditions ONLY if the workflow requires separate logical checks beyond inherent event logic (e.g., do not include for simple filters where the filter event already handles the criteria). Examples:
@@ -1037,15 +1031,7 @@ Include conditions ONLY if the workflow requires separate logical checks beyond
 NEVER include CRUD actions (add_record, mod_record, delete_record, etc.) in conditions.
 If no separate logical conditions are required, skip the Conditions section entirely.
 
-CNDN_BIN = "Binary Condition - Binary Conditions in Workflow Management trigger actions based on true/false logic evaluations. A basic setup includes a logic block, an If block for true actions, and an Else block for false actions. Complex conditions can combine multiple criteria using AND/OR operators. Always validate and test conditions to ensure workflows run as expected."
-
-CNDN_SEQ = "Sequential Condition - Sequential Conditions let you run logical checks in a set order, executing the first matching condition's action and skipping the rest. A basic setup handles simple scenarios, while complex setups use logical operators for multi-criteria conditions. Always validate and test to ensure correct actions trigger based on different sequential checks. Use with CNDN_LGC for each independent logic block."
-
-CNDN_LGC = "Logic Block - Used within CNDN_SEQ to represent individual independent condition checks. Each CNDN_LGC contains one condition and its associated action."
-
-CNDN_DOM = "Domino Condition - Domino Conditions enable sequential logical evaluations in workflows, triggering specific actions in order until a match is found, with fallback options for unmatched scenarios. A basic setup defines multiple conditions with corresponding actions, while complex conditions use logical operators (AND/OR) for advanced logic. Always validate and test conditions to ensure accurate execution across all scenarios."
-
-CNDN_LGC_DOM = "Logic Domino Condition - Advanced domino conditions using logical operators (AND/OR) for complex multi-criteria evaluations in sequential order."
+""" + CONDITIONS_CATALOG.strip("\n") + """
 
 IMPORTANT INSTRUCTIONS:
 - Analyze the user request thoroughly to identify all required components
@@ -1109,411 +1095,305 @@ logger.debug("Defined full prompt for planner_agent")
 
 
 
-def plan_workflow(user_input: str):
-    logger.info(f"Generating workflow plan for user input: {user_input}")
+def parse_workflow_plan(workflow_plan: str) -> dict:
+    """
+    Extract trigger / events / conditions / flow sequence and branch details
+    (codes_output) from a Markdown workflow plan; see rag/plan_parser.py.
+    """
+    from rag.plan_parser import parse_plan
+
+    return parse_plan(workflow_plan)
+
+
+_CREW_EXPECTED_OUTPUT = "Markdown structured workflow plan with explicit trigger_code, code, and code for each component."
+
+
+def _crew_description(user_input: str) -> str:
+    return f"User Query: {user_input}\n{prompt_full}"
+
+
+def _plan_with_crew(user_input: str) -> str:
+    from crewai import Crew, Task
+
+    planner_agent = get_planner_agent()
     task = Task(
-        description=f"User Query: {user_input}\n{prompt_full}",
+        description=_crew_description(user_input),
         agent=planner_agent,
-        expected_output="Markdown structured workflow plan with explicit trigger_code, code, and code for each component.",
+        expected_output=_CREW_EXPECTED_OUTPUT,
     )
     crew = Crew(agents=[planner_agent], tasks=[task])
+    result = crew.kickoff()
+    return result.output if hasattr(result, "output") else str(result)
+
+
+def direct_messages(user_input: str) -> Tuple[list, str]:
+    """(chat messages, registry version the prompt was assembled from)"""
+    from rag.assembler import assemble_prompt
+    from rag.registry import get_registry
+
+    version = get_registry().version
+    prompt = assemble_prompt(user_input, debug=False)
+    messages = [
+        {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+    return messages, version
+
+
+def _plan_direct(messages: list) -> str:
+    resp = get_openai_client().chat.completions.create(
+        model=PLANNER_MODEL,
+        temperature=PLANNER_TEMPERATURE,
+        messages=messages,
+    )
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        logger.info(f"Direct planner call: prompt_tokens={usage.prompt_tokens} completion_tokens={usage.completion_tokens}")
+    return resp.choices[0].message.content or ""
+
+
+def _json_messages(user_input: str) -> Tuple[list, str]:
+    messages, version = direct_messages(user_input)
+    messages[0] = {"role": "system", "content": PLANNER_JSON_SYSTEM_PROMPT}
+    return messages, version
+
+
+def _plan_json(messages: list) -> Tuple[str, dict]:
+    """(rendered Markdown plan, codes_output) from a schema-constrained completion."""
+    from rag.plan_schema import PLAN_SCHEMA, load_plan, render_markdown, to_codes_output
+
+    resp = get_openai_client().chat.completions.create(
+        model=PLANNER_MODEL,
+        temperature=PLANNER_TEMPERATURE,
+        messages=messages,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "workflow_plan", "strict": True, "schema": PLAN_SCHEMA},
+        },
+    )
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        logger.info(f"JSON planner call: prompt_tokens={usage.prompt_tokens} completion_tokens={usage.completion_tokens}")
+    message = resp.choices[0].message
+    if getattr(message, "refusal", None):
+        raise ValueError(f"Planner refused: {message.refusal}")
+    plan = load_plan(message.content or "")
+    return render_markdown(plan), to_codes_output(plan)
+
+
+# -------- Plan cache (rag/plan_cache.py, rag/query_templates.py) --------
+def _plan_cache_key(prompt: str, registry_version: str, use_cache: Optional[bool]) -> Optional[str]:
+    """Cache key for this exact prompt, or None when the cache is bypassed."""
+    from rag.plan_cache import PLAN_CACHE_ENABLED, plan_key
+
+    if not (PLAN_CACHE_ENABLED if use_cache is None else use_cache):
+        return None
+    return plan_key(prompt, PLANNER_MODEL, PLANNER_TEMPERATURE, registry_version)
+
+
+def _cached_plan(key: Optional[str], user_input: str, mode: str, registry_version: str):
+    """Exact prompt hit first, then a re-filled plan of the query's template."""
+    from rag.query_templates import QUERY_TEMPLATES_ENABLED
+
+    if key is None:
+        return None
+    hit = get_plan_cache().get(key)
+    if hit is not None:
+        logger.info(f"Plan cache hit {key[:12]}")
+        return hit
+    # template refills re-parse the Markdown, which would replace json mode's codes_output
+    if QUERY_TEMPLATES_ENABLED and mode != "json":
+        hit = get_template_cache().lookup(user_input, mode, PLANNER_MODEL, PLANNER_TEMPERATURE, registry_version)
+        if hit is not None:
+            logger.info(f"Plan template hit for: {user_input}")
+    return hit
+
+
+def _store_plan(
+    key: Optional[str], user_input: str, mode: str, registry_version: str, workflow_plan: str, codes_output: dict
+) -> None:
+    from rag.query_templates import QUERY_TEMPLATES_ENABLED
+
+    if key is None or not workflow_plan.strip():
+        return
+    get_plan_cache().put(key, PLANNER_MODEL, PLANNER_TEMPERATURE, registry_version, workflow_plan, codes_output)
+    if QUERY_TEMPLATES_ENABLED and mode != "json":
+        get_template_cache().store(
+            user_input, mode, PLANNER_MODEL, PLANNER_TEMPERATURE, registry_version, workflow_plan, codes_output
+        )
+
+
+def _check_codes(codes_output: dict) -> None:
+    """Flag unknown / misplaced catalog codes (rag/catalog.py, PLAN_CODE_CHECK)."""
+    from rag.catalog import check_plan_codes
+
+    check_plan_codes(codes_output)
+
+
+@dataclass
+class DirectPlanRequest:
+    """A direct-mode plan whose completion the caller sends itself."""
+    user_input: str
+    messages: list
+    registry_version: str
+    cache_key: Optional[str]
+    # (workflow_plan, codes_output) when served from the plan cache
+    cached: Optional[Tuple[str, dict]] = None
+
+
+def prepare_direct_plan(user_input: str, use_cache: Optional[bool] = None) -> DirectPlanRequest:
+    """
+    Direct-mode messages plus the plan cache lookup, for callers that send
+    the chat completion themselves (scripts/plan_bulk.py, async clients).
+    A cached plan's codes are already checked; otherwise pass the model's
+    reply to finish_direct_plan(). Blocking (router, assembler, SQLite).
+    """
+    messages, registry_version = direct_messages(user_input)
+    key = _plan_cache_key(json.dumps(messages), registry_version, use_cache)
+    hit = _cached_plan(key, user_input, "direct", registry_version)
+    if hit is not None:
+        _check_codes(hit[1])
+    return DirectPlanRequest(user_input, messages, registry_version, key, hit)
+
+
+def finish_direct_plan(request: DirectPlanRequest, workflow_plan: str) -> Tuple[str, dict]:
+    """Parse, check and cache the reply to a prepare_direct_plan() request."""
+    if not workflow_plan.strip():
+        raise ValueError("Planner returned an empty plan")
+    codes_output = parse_workflow_plan(workflow_plan)
+    _check_codes(codes_output)
+    _store_plan(
+        request.cache_key, request.user_input, "direct", request.registry_version, workflow_plan, codes_output
+    )
+    return workflow_plan, codes_output
+
+
+def plan_workflow_stream(user_input: str, on_record: Optional[Callable] = None, use_cache: Optional[bool] = None):
+    """
+    Direct mode over a streamed chat completion. Each line of the plan is
+    parsed as soon as it is complete and `on_record` gets the
+    rag.plan_parser.PlanRecord (trigger / event / condition / step / branch)
+    it produced, so provisioning can start before the plan is finished.
+    Returns (workflow_plan, codes_output), the same as parsing the whole plan.
+    On a plan cache hit the cached plan's records are replayed.
+    """
+    from rag.plan_parser import PlanParser
+
+    logger.info(f"Generating workflow plan (stream) for user input: {user_input}")
+    t0 = time.perf_counter()
+    first_trigger: Optional[float] = None
+    parser = PlanParser(records=True)
+    parts = []
+
+    def deliver(records) -> None:
+        nonlocal first_trigger
+        for record in records:
+            if first_trigger is None and record.kind == "trigger":
+                first_trigger = time.perf_counter() - t0
+                logger.info(f"First trigger {record.code} after {first_trigger * 1000:.0f} ms")
+            if on_record is not None:
+                on_record(record)
+
     try:
-        result = crew.kickoff()
-        workflow_plan = result.output if hasattr(result, "output") else str(result)
+        messages, registry_version = direct_messages(user_input)
+        key = _plan_cache_key(json.dumps(messages), registry_version, use_cache)
+        # same prompt as direct mode, so the two share cache entries
+        hit = _cached_plan(key, user_input, "direct", registry_version)
+        if hit is not None:
+            deliver(parser.feed(hit[0]))
+            deliver(parser.close())
+            _check_codes(hit[1])
+            return hit
+
+        stream = get_openai_client().chat.completions.create(
+            model=PLANNER_MODEL,
+            temperature=PLANNER_TEMPERATURE,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                logger.info(f"Streamed planner call: prompt_tokens={usage.prompt_tokens} completion_tokens={usage.completion_tokens}")
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                deliver(parser.feed(delta))
+        deliver(parser.close())
+    except Exception as e:
+        logger.error(f"Error in plan_workflow_stream: {str(e)}")
+        raise
+
+    workflow_plan = "".join(parts)
+    codes_output = parser.result()
+    logger.debug(f"Generated workflow plan:\n{workflow_plan}")
+    logger.info(f"Streamed plan complete after {(time.perf_counter() - t0) * 1000:.0f} ms")
+    _check_codes(codes_output)
+    _store_plan(key, user_input, "direct", registry_version, workflow_plan, codes_output)
+    return workflow_plan, codes_output
+
+
+def plan_workflow(user_input: str, mode: Optional[str] = None, use_cache: Optional[bool] = None):
+    """
+    Returns (workflow_plan, codes_output). `mode` overrides PLANNER_MODE:
+    "crew" runs the CrewAI agent on prompt_full, "direct" sends the
+    RAG-assembled prompt (rag.assembler) in a single chat completion,
+    "stream" is plan_workflow_stream() without a record callback and "json"
+    asks for a schema-constrained JSON plan (rag/plan_schema.py), converted
+    to codes_output directly; its workflow_plan is Markdown rendered locally.
+    Responses are served from / stored in the plan cache unless `use_cache`
+    is False (default: PLAN_CACHE). Every plan's codes are checked against
+    the catalog (rag/catalog.py, PLAN_CODE_CHECK=warn|error|off).
+    """
+    mode = mode or PLANNER_MODE
+    if mode not in PLANNER_MODES:
+        raise ValueError(f"Unknown planner mode '{mode}' (expected one of: {', '.join(PLANNER_MODES)})")
+    if mode == "stream":
+        return plan_workflow_stream(user_input, use_cache=use_cache)
+
+    logger.info(f"Generating workflow plan ({mode}) for user input: {user_input}")
+    try:
+        if mode == "direct":
+            messages, registry_version = direct_messages(user_input)
+            prompt = json.dumps(messages)
+        elif mode == "json":
+            from rag.plan_schema import PLAN_SCHEMA
+
+            messages, registry_version = _json_messages(user_input)
+            prompt = json.dumps([messages, PLAN_SCHEMA])
+        else:
+            # prompt_full does not come from the registry
+            registry_version = ""
+            prompt = "\n".join(
+                [PLANNER_ROLE, PLANNER_GOAL, PLANNER_BACKSTORY, _crew_description(user_input), _CREW_EXPECTED_OUTPUT]
+            )
+        key = _plan_cache_key(prompt, registry_version, use_cache)
+        hit = _cached_plan(key, user_input, mode, registry_version)
+        if hit is not None:
+            _check_codes(hit[1])
+            return hit
+
+        if mode == "json":
+            workflow_plan, codes_output = _plan_json(messages)
+        else:
+            workflow_plan = _plan_direct(messages) if mode == "direct" else _plan_with_crew(user_input)
+            codes_output = parse_workflow_plan(workflow_plan)
         logger.debug(f"Generated workflow plan:\n{workflow_plan}")
-        
-        # Extract codes and flow sequence from the workflow plan
-        trigger = None
-        events = []
-        conditions = []
-        flow_sequence = []
-        
-        # Enhanced regex patterns
-        flow_sequence_pattern = r"^\s*\d+\.\s*([^\(]+?)\s*\((\w+)\)\s*$"
-        code_pattern = r"(?i)(?:code|trigger_code|event_code|condition_code)?:\s*([A-Za-z0-9_]+)"
-        
-        # Exact patterns from original code
-        standalone_event_pattern = r"\b(EVNT_[A-Z_]+)\b"
-        standalone_trigger_pattern = r"\b(TRG_[A-Z_]+)\b"
-        standalone_condition_pattern = r"\b(CNDN_[A-Z_]+|cndn_[a-z_]+)\b"
-        
-        current_section = None
-        lines = workflow_plan.split("\n")
-        
-        for line in lines:
-            line = line.strip()
-            
-
-            if line.startswith("#"):
-                line_lower = line.lower()
-
-                if "trigger" in line_lower and "detail" not in line_lower:
-                    current_section = "Trigger"
-
-                elif "events" in line_lower or "actions" in line_lower:
-                    current_section = "Events"
-
-                # ✅ PATCH: treat Conditions / Logic Steps as Flow Sequence
-                elif "condition" in line_lower and "flow" not in line_lower:
-                    current_section = "Flow Sequence"
-
-                elif "flow" in line_lower and "sequence" in line_lower:
-                    current_section = "Flow Sequence"
-
-            
-        
-            code_matches = re.findall(code_pattern, line)
-            for code in code_matches:
-                if current_section == "Trigger" and not trigger:
-                    if re.match(r"TRG_[A-Z_]+", code):
-                        trigger = code
-                        logger.debug(f"  Found trigger: {code}")
-                elif current_section == "Events":
-                    if re.match(r"EVNT_[A-Z_]+", code) and code not in events:
-                        events.append(code)
-                        logger.debug(f"  Found event: {code}")
-                elif current_section == "Conditions":
-                    if re.match(r"(CNDN_[A-Z_]+)", code) and code not in conditions:
-                        conditions.append(code)
-                        logger.debug(f"  Found condition: {code}")
-
-            # Standalone codes (UNCHANGED)
-            if current_section == "Events":
-                standalone_events = re.findall(standalone_event_pattern, line)
-                for event in standalone_events:
-                    if event not in events:
-                        events.append(event)
-                        logger.debug(f"  Found standalone event: {event}")
-            elif current_section == "Trigger" and not trigger:
-                standalone_triggers = re.findall(standalone_trigger_pattern, line)
-                if standalone_triggers:
-                    trigger = standalone_triggers[0]
-                    logger.debug(f"  Found standalone trigger: {trigger}")
-            elif current_section == "Conditions":
-                standalone_conditions = re.findall(standalone_condition_pattern, line)
-                for condition in standalone_conditions:
-                    condition_upper = condition.upper()
-                    if condition_upper not in conditions:
-                        conditions.append(condition_upper)
-                        logger.debug(f"  Found standalone condition: {condition_upper}")
-
-            if current_section in ["Events", "Conditions"] or "CNDN_BIN" in line or "cndn_bin" in line.lower():
-                line_conditions = re.findall(standalone_condition_pattern, line)
-                for condition in line_conditions:
-                    condition_upper = condition.upper()
-                    if condition_upper not in conditions:
-                        conditions.append(condition_upper)
-            
-            if current_section is None:
-                # Check if line looks like a numbered flow item: "1. Something (CODE)"
-                if re.match(r"^\s*\d+\.\s*.+\([A-Z_]+\)", line):
-                    current_section = "Flow Sequence"
-                    logger.debug(f"✅ Auto-detected Flow Sequence from numbered item: {line}")
-                # Also check for branch lines that indicate we're in flow sequence
-                elif re.match(r"^\s*↳\s*(IF TRUE|IF FALSE|INSIDE LOOP|Logic Block|Container)", line):
-                    current_section = "Flow Sequence"
-                    logger.debug(f"✅ Auto-detected Flow Sequence from branch line: {line}")
-
-       
-            if current_section == "Flow Sequence":
-                logger.debug(f"[FLOW SEQ] Processing: {line}")
-                
-                # Main flow items (numbered) - UNCHANGED
-                main_flow_match = re.match(flow_sequence_pattern, line)
-                if main_flow_match:
-                    description, code = main_flow_match.groups()
-                    logger.debug(f"  Main flow match: {description} ({code})")
-                    
-                    # Validation
-                    is_valid_trigger = re.match(r"TRG_[A-Z_]+", code)
-                    is_valid_event = re.match(r"EVNT_[A-Z_]+", code)
-                    is_valid_condition = re.match(r"CNDN_[A-Z_]+", code.upper())
-                    
-                    if is_valid_trigger or is_valid_event or is_valid_condition:
-                        flow_item = {
-                            "step": description.strip(),
-                            "code": code,
-                            "branches": {}
-                        }
-                        flow_sequence.append(flow_item)
-                        logger.debug(f"  ✅ Added to flow_sequence: {code}")
-                        
-                        # Populate main lists
-                        if is_valid_trigger and not trigger:
-                            trigger = code
-                        elif is_valid_event and code not in events:
-                            events.append(code)
-                        elif is_valid_condition:
-                            code_upper = code.upper()
-                            if code_upper not in conditions:
-                                conditions.append(code_upper)
-                    continue
-                
-                
-
-            
-                branch_match = re.match(
-                    r"^\s*↳\s*(IF TRUE|IF FALSE|INSIDE LOOP|Logic Block \d+|Container \d+)\s*(?:\(([A-Z_]+)\))?:\s*(.+?)(?:\s*→\s*(.+))?$",
-                    line
-                )
-                
-                if branch_match:
-                    if not flow_sequence:
-                        logger.warning(f"  ⚠️ Branch found but flow_sequence is empty: {line}")
-                        continue
-                    
-                    branch_type, condition_code, description, flow_dest = branch_match.groups()
-                    logger.debug(f"  Branch match: type={branch_type}, condition={condition_code}, desc={description}, dest={flow_dest}")
-                    
-
-                    event_code = None
-                    if flow_dest:
-                        event_match = re.search(r"\(([A-Z_]+)\)$", flow_dest)
-                        if event_match:
-                            event_code = event_match.group(1)
-                            logger.debug(f"    Extracted event code from flow_dest: {event_code}")
-                    
-                    # Fallback: if condition_code is actually an event code (starts with EVNT_)
-                    if not event_code and condition_code and condition_code.startswith("EVNT_"):
-                        event_code = condition_code
-                        logger.debug(f"    Using condition_code as event: {event_code}")
-                    
-                    # Get the last main flow item
-                    last_item = flow_sequence[-1]
-
-                    # For Logic Blocks, find the CNDN_SEQ parent
-                    if "Logic Block" in branch_type:
-                        for item in reversed(flow_sequence):
-                            if item.get("code") == "CNDN_SEQ":
-                                last_item = item
-                                break
-
-                    # Extract event code if present
-                    if event_code:
-                        # Add to events list if not already present
-                        if event_code not in events:
-                            events.append(event_code)
-                            logger.debug(f"    Added event from branch: {event_code}")
-                        
-                        # ========================================================
-                        # Store in branches based on type
-                        # ========================================================
-                        if branch_type == "IF TRUE":
-                            last_item["branches"]["if_true"] = event_code
-                            last_item["branches"]["if_true_desc"] = description.strip()
-                            logger.debug(f"    ✅ Set IF TRUE: {event_code}")
-                            
-                        elif branch_type == "IF FALSE":
-                            last_item["branches"]["if_false"] = event_code
-                            last_item["branches"]["if_false_desc"] = description.strip()
-                            logger.debug(f"    ✅ Set IF FALSE: {event_code} (explicit action)")
-                                
-                        elif branch_type == "INSIDE LOOP":
-                            if "loop_internal" not in last_item["branches"]:
-                                last_item["branches"]["loop_internal"] = []
-                            last_item["branches"]["loop_internal"].append({
-                                "event": event_code,
-                                "description": description.strip()
-                            })
-                            logger.debug(f"    ✅ Added to loop_internal: {event_code}")
-                            
-                        elif "Logic Block" in branch_type:
-                            if "logic_blocks" not in last_item["branches"]:
-                                last_item["branches"]["logic_blocks"] = []
-                            last_item["branches"]["logic_blocks"].append({
-                                "event": event_code,
-                                "description": description.strip() + (" → " + flow_dest if flow_dest else "")
-                            })
-                            logger.debug(f"    ✅ Added to logic_blocks: {event_code}")
-                            
-                        elif "Container" in branch_type:
-                            if "containers" not in last_item["branches"]:
-                                last_item["branches"]["containers"] = []
-                            last_item["branches"]["containers"].append({
-                                "event": event_code,
-                                "description": description.strip()
-                            })
-                            logger.debug(f"    ✅ Added to containers: {event_code}")
-                    
-                    else:
-                        # No event code found - check if it's "route to END"
-                        description_lower = description.lower() if description else ""
-                        flow_dest_upper = flow_dest.upper() if flow_dest else ""
-                        
-                        if "route to end" in description_lower or "END" in flow_dest_upper:
-                            if branch_type == "IF FALSE":
-                                last_item["branches"]["if_false"] = "END"
-                                last_item["branches"]["if_false_desc"] = "Route to END"
-                                logger.debug(f"    ✅ Set IF FALSE: END (implicit - no event code)")
-                            elif branch_type == "IF TRUE":
-                                last_item["branches"]["if_true"] = "END"
-                                last_item["branches"]["if_true_desc"] = "Route to END"
-                                logger.debug(f"    ✅ Set IF TRUE: END (implicit - no event code)")
-                        
-                        # For Logic Blocks without event code in flow_dest, try to extract from description
-                        elif "Logic Block" in branch_type:
-                            # Try to find event code anywhere in the line
-                            full_line_event = re.search(r"\(EVNT_[A-Z_]+\)", line)
-                            if full_line_event:
-                                extracted_event = full_line_event.group(0)[1:-1]  # Remove parentheses
-                                if extracted_event not in events:
-                                    events.append(extracted_event)
-                                if "logic_blocks" not in last_item["branches"]:
-                                    last_item["branches"]["logic_blocks"] = []
-                                last_item["branches"]["logic_blocks"].append({
-                                    "event": extracted_event,
-                                    "description": description.strip() + (" → " + flow_dest if flow_dest else "")
-                                })
-                                logger.debug(f"    ✅ Added to logic_blocks (full line search): {extracted_event}")
-                    
-                    continue
-
-        
-                nested_match = re.match(
-                    r"^\s*→\s*(IF|ELSE):\s*(.+?)(?:\s*\(([A-Z_]+)\))?(?:\s*→\s*(.+))?",
-                    line
-                )
-                if nested_match and flow_sequence:
-                    branch_type, description, event_code, flow_dest = nested_match.groups()
-                    
-                    last_item = flow_sequence[-1]
-                    if "containers" in last_item["branches"] and last_item["branches"]["containers"]:
-                        last_container = last_item["branches"]["containers"][-1]
-                        
-                        if "nested" not in last_container:
-                            last_container["nested"] = []
-                        
-                        nested_item = {
-                            "branch_type": branch_type.strip(),
-                            "description": description.strip(),
-                            "event": event_code if event_code else None,
-                            "flow_dest": flow_dest.strip() if flow_dest else None
-                        }
-                        last_container["nested"].append(nested_item)
-                        
-                        # Add event to main list if present
-                        if event_code and event_code not in events:
-                            events.append(event_code)
-                            logger.debug(f"    Added nested event: {event_code}")
-        
-       
-        if not flow_sequence:
-            logger.warning("Flow sequence is empty, constructing from collected components")
-            if trigger:
-                flow_sequence.append({
-                    "step": f"Trigger on {trigger.lower().replace('_', ' ')}",
-                    "code": trigger,
-                    "branches": {}
-                })
-            for condition in conditions:
-                flow_sequence.append({
-                    "step": f"Evaluate condition {condition}",
-                    "code": condition,
-                    "branches": {}
-                })
-            for event in events:
-                flow_sequence.append({
-                    "step": f"Execute event {event}",
-                    "code": event,
-                    "branches": {}
-                })
-       
-        binary_branches = {}
-        sequence_logic_blocks = []
-        domino_containers = []
-        loop_internal_events = []
-        
-        for step in flow_sequence:
-            code = step.get("code", "")
-            branches = step.get("branches", {})
-            
-            # Binary condition branches
-            if code == "CNDN_BIN":
-                if_branch = branches.get("if_true")
-                else_branch = branches.get("if_false")
-                
-                # Determine if else is explicit
-                has_explicit_else = else_branch is not None and else_branch != "END"
-                
-                binary_branches = {
-                    "if_branch": if_branch,
-                    "else_branch": else_branch,
-                    "has_explicit_else": has_explicit_else,
-                    "if_branch_desc": branches.get("if_true_desc", ""),
-                    "else_branch_desc": branches.get("if_false_desc", "")
-                }
-                logger.info(f"✅ Extracted binary branches: {binary_branches}")
-            
-            # Sequence condition logic blocks
-            # elif code == "CNDN_SEQ":
-            #     logic_blocks = branches.get("logic_blocks", [])
-            #     sequence_logic_blocks = [lb["event"] for lb in logic_blocks if "event" in lb]
-            #     logger.info(f"✅ Extracted sequence logic blocks: {sequence_logic_blocks}")
-
-            elif code == "CNDN_SEQ":
-                logic_blocks = branches.get("logic_blocks", [])
-                sequence_logic_blocks = []
-
-                for idx, lb in enumerate(logic_blocks, start=1):
-                    event = lb.get("event")
-                    sequence_logic_blocks.append({
-                        "logic_id": f"logic_{idx}",
-                        "description": lb.get("description"),
-                        "event": event,
-                        "next": "END"
-                    })
-
-                    # ✅ push events immediately, safely
-                    if event and event not in events:
-                        events.append(event)
-
-                logger.info(f"✅ Extracted sequence logic blocks: {sequence_logic_blocks}")
-
-
-            # Domino condition containers
-            elif code == "CNDN_DOM":
-                containers = branches.get("containers", [])
-                domino_containers = [c["event"] for c in containers if "event" in c]
-                logger.info(f" Extracted domino containers: {domino_containers}")
-            
-            # Loop internal events
-            elif code == "EVNT_LOOP_FOR":
-                loop_events = branches.get("loop_internal", [])
-                loop_internal_events = [le["event"] for le in loop_events if "event" in le]
-                logger.info(f"Extracted loop internal events: {loop_internal_events}")
-        
-    
-        codes_output = {
-            "trigger": trigger or "UNKNOWN",
-            "events": events,
-            "conditions": conditions,
-            "flow_sequence": flow_sequence,
-            "binary_branches": binary_branches,
-            "sequence_logic_blocks": sequence_logic_blocks,
-            "domino_containers": domino_containers,
-            "loop_internal_events": loop_internal_events
-        }
-        
-        logger.info(f" Final extraction summary:")
-        logger.info(f"  Trigger: {trigger}")
-        logger.info(f"  Events: {events}")
-        logger.info(f"  Conditions: {conditions}")
-        logger.info(f"  Flow sequence items: {len(flow_sequence)}")
-        logger.info(f"  Binary branches: {binary_branches}")
-        
-        # try:
-        #     with open("codes.json", "w") as f:
-        #         json.dump(codes_output, f, indent=2)
-        #     logger.info(" Saved extracted codes and flow sequence to codes.json")
-        # except Exception as e:
-        #     logger.error(f"Failed to save codes to codes.json: {str(e)}")
-        #     raise
-        
+        _check_codes(codes_output)
+        _store_plan(key, user_input, mode, registry_version, workflow_plan, codes_output)
         return workflow_plan, codes_output
     except Exception as e:
         logger.error(f"Error in plan_workflow: {str(e)}")
         raise
 
 
-
-
+def __getattr__(name):
+    # lazy module attributes kept for callers of the old eager globals
+    if name == "gpt4":
+        return get_llm()
+    if name == "planner_agent":
+        return get_planner_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,24 @@
 # rag/assembler.py
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
-from rag.registry import ALL_CHUNKS
+from rag.registry import Registry, get_registry, text_hash
 from rag.router import route_topics
 from rag.support_expander import expand_support
-import hashlib
 
+BLOCK_SEPARATOR = "\n\n---\n\n"
+
+# (registry version, joined CORE text); rebuilt when the registry is reloaded
+_CORE_PREFIX: Tuple[str, str] = ("", "")
+
+
+def _core_prefix(reg: Registry) -> str:
+    global _CORE_PREFIX
+    version, prefix = _CORE_PREFIX
+    if version != reg.version:
+        texts = (ch["text"].strip() for ch in reg.index.core_blocks)
+        prefix = BLOCK_SEPARATOR.join(t for t in texts if t)
+        _CORE_PREFIX = (reg.version, prefix)
+    return prefix
 
 
 def _sort_by_priority_desc(chunks: List[Dict]) -> List[Dict]:
@@ -13,21 +26,15 @@ def _sort_by_priority_desc(chunks: List[Dict]) -> List[Dict]:
 
 
 def assemble_prompt(user_query: str, debug: bool = False) -> str:
-    # 1) CORE intro (static always)
-    core_blocks = [
-        ch for ch in ALL_CHUNKS
-        if ch.get("role") == "static" and (
-            ch.get("doc_type") == "CORE" or ch.get("topic") in {"core_intro", "intro", "core"}
-        )
-    ]
-
-    core_blocks = _sort_by_priority_desc(core_blocks)
+    # One registry version for the whole call, even if a reload lands mid-way
+    reg = get_registry()
+    index = reg.index
 
     # 2) Router topics
     allowed_topics = route_topics(user_query, debug=debug)
 
     # 3) Expand support
-    selected_blocks = expand_support(allowed_topics)
+    selected_blocks = expand_support(allowed_topics, index=index)
 
     router_blocks = [ch for ch in selected_blocks if ch.get("role") == "router"]
     support_blocks = [ch for ch in selected_blocks if ch.get("role") == "support"]
@@ -38,19 +45,17 @@ def assemble_prompt(user_query: str, debug: bool = False) -> str:
     support_blocks = _dedupe_by_text(_sort_by_priority_desc(support_blocks))
 
     # cross-dedupe: don't include support blocks that repeat router blocks
-    router_hashes = {hashlib.sha1(ch["text"].strip().encode("utf-8")).hexdigest() for ch in router_blocks}
+    router_hashes = {_text_sha1(ch) for ch in router_blocks}
     support_blocks = [
         ch for ch in support_blocks
-        if hashlib.sha1(ch["text"].strip().encode("utf-8")).hexdigest() not in router_hashes
+        if _text_sha1(ch) not in router_hashes
     ]
 
 
 
     # 4) Build prompt in strict order
-    parts: List[str] = []
-
-    for ch in core_blocks:
-        parts.append(ch["text"].strip())
+    # CORE intro (static always, cached per registry version)
+    parts: List[str] = [_core_prefix(reg)]
 
     # Router-selected topic blocks
     for ch in router_blocks:
@@ -63,23 +68,31 @@ def assemble_prompt(user_query: str, debug: bool = False) -> str:
     # User query at the end
     parts.append("USER.QUERY\n" + user_query.strip())
 
-    final_prompt = "\n\n---\n\n".join([p for p in parts if p])
+    final_prompt = BLOCK_SEPARATOR.join([p for p in parts if p])
 
     if debug:
+        from rag.catalog import get_catalog
+
         topics_line = ", ".join(allowed_topics) if allowed_topics else "(none)"
+        codes = get_catalog().codes_in(final_prompt)
         final_prompt = (
-            f"[debug] allowed_topics: {topics_line}\n\n"
+            f"[debug] allowed_topics: {topics_line}\n"
+            f"[debug] catalog codes in prompt: {len(codes)}\n\n"
             + final_prompt
         )
 
     return final_prompt
 
+def _text_sha1(ch: Dict) -> str:
+    # registry chunks carry a precomputed hash; fall back for ad-hoc dicts
+    return ch.get("text_sha1") or text_hash(ch["text"])
+
+
 def _dedupe_by_text(chunks):
     seen = set()
     out = []
     for ch in chunks:
-        txt = ch["text"].strip()
-        h = hashlib.sha1(txt.encode("utf-8")).hexdigest()
+        h = _text_sha1(ch)
         if h in seen:
             continue
         seen.add(h)
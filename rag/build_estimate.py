@@ -0,0 +1,195 @@
+# rag/build_estimate.py
+"""
+Dry-run cost/size estimate for an embedding build (`create_embeddings --dry-run`).
+
+Works offline: token counts come from `rag.tokens` under `local_only()`
+(tiktoken when its encoding file is already cached, else the ~4 chars/token
+estimate; nothing is downloaded), the
+incremental diff is taken against the active build manifest (`active.json`)
+instead of the collection, and the embedding cache is only read if its file
+already exists. Nothing is sent to the API and Chroma is never opened.
+
+Wall time is a model, not a measurement: each request costs
+`EMBED_EST_REQUEST_SECONDS` plus `EMBED_EST_SECONDS_PER_1K_TOKENS` per 1k
+tokens, requests are spread over `EMBED_CONCURRENCY` workers, and the result
+is floored by the `EMBED_TPM` / `EMBED_RPM` rate limits. On-disk sizes are
+approximations calibrated on chromadb 1.x stores.
+"""
+import heapq
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Set
+
+from rag.embedder import EMBED_BATCH_SIZE, EMBED_CONCURRENCY, EMBED_MAX_BATCH_TOKENS, make_batches
+from rag.embedding_cache import EMBED_CACHE_PATH, text_sha256
+from rag.manifest import build_keys
+from rag.tokens import count_tokens, local_only, tokenizer_name
+
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_EST_REQUEST_SECONDS = float(os.getenv("EMBED_EST_REQUEST_SECONDS", "0.3"))
+EMBED_EST_SECONDS_PER_1K_TOKENS = float(os.getenv("EMBED_EST_SECONDS_PER_1K_TOKENS", "0.01"))
+
+# USD per 1M input tokens; EMBED_PRICE_PER_MTOK overrides
+_PRICE_PER_MTOK = {
+    "text-embedding-3-small": 0.02,
+    "text-embedding-3-large": 0.13,
+    "text-embedding-ada-002": 0.10,
+}
+_NATIVE_DIM = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# HNSW link lists (max_neighbors=16, two levels of int32) + per-element header
+_HNSW_LINK_BYTES = 16 * 2 * 4 + 100
+_HNSW_MIN_ELEMENTS = 100
+_SQLITE_BASE_BYTES = 200 * 1024
+_SQLITE_ROW_BYTES = 250
+_JSON_FLOAT_BYTES = 20
+
+
+def _cached_hashes(path: str, model: str, dimensions: int, hashes: List[str]) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    found: Set[str] = set()
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            rows = conn.execute(
+                "SELECT text_sha256 FROM embeddings WHERE model = ? AND dimensions = ? "
+                f"AND text_sha256 IN ({','.join('?' * len(part))})",
+                [model, dimensions, *part],
+            )
+            found.update(h for (h,) in rows)
+    except sqlite3.Error:
+        return set()
+    finally:
+        conn.close()
+    return found
+
+
+def _simulate_wall_seconds(batch_tokens: List[int], concurrency: int) -> float:
+    # greedy: each batch goes to the worker that frees up first
+    workers = [0.0] * max(1, concurrency)
+    for tokens in batch_tokens:
+        start = heapq.heappop(workers)
+        heapq.heappush(
+            workers, start + EMBED_EST_REQUEST_SECONDS + tokens / 1000.0 * EMBED_EST_SECONDS_PER_1K_TOKENS
+        )
+    return max(workers)
+
+
+def estimate_build(
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[Dict[str, Any]],
+    embed_model: str,
+    embed_dimensions: int = 0,
+    build: Optional[Dict[str, Any]] = None,
+    incremental: bool = True,
+    cache_path: Optional[str] = EMBED_CACHE_PATH,
+    prototypes_k: int = 1,
+) -> Dict[str, Any]:
+    """
+    Estimate requests, tokens, wall time, cost and on-disk size of building
+    the index for (ids, texts, metadatas). With `incremental` and a build
+    manifest, only records whose embed key is missing from the manifest count
+    as new (a `text`-only edit re-embeds nothing).
+    """
+    built_keys = set((build or {}).get("chunk_hashes") or [])
+    if incremental and build:
+        keys = build_keys(build, ids, metadatas)
+        new_ids = [cid for cid, key in zip(ids, keys) if key not in built_keys]
+        removed = len(built_keys - set(keys))
+    else:
+        new_ids = list(ids)
+        removed = 0
+    new_set = set(new_ids)
+
+    # one request input per distinct `data` string
+    unique: Dict[str, str] = {}
+    for cid, text in zip(ids, texts):
+        if cid in new_set:
+            unique.setdefault(text_sha256(text), text)
+
+    cached = _cached_hashes(cache_path, embed_model, embed_dimensions, list(unique)) if cache_path else set()
+    to_embed = [t for h, t in unique.items() if h not in cached]
+
+    with local_only():
+        token_counts = [count_tokens(t, embed_model) for t in to_embed]
+        batches = make_batches(to_embed, EMBED_BATCH_SIZE, EMBED_MAX_BATCH_TOKENS, embed_model)
+        tokenizer = tokenizer_name(embed_model)
+    batch_tokens = [sum(token_counts[i] for i in b) for b in batches]
+    tokens = sum(token_counts)
+
+    wall = _simulate_wall_seconds(batch_tokens, EMBED_CONCURRENCY)
+    wall = max(wall, tokens / EMBED_TPM * 60.0, len(batches) / EMBED_RPM * 60.0)
+
+    price = float(os.getenv("EMBED_PRICE_PER_MTOK", _PRICE_PER_MTOK.get(embed_model, 0.0)))
+    dim = embed_dimensions or int((build or {}).get("dim") or 0) or _NATIVE_DIM.get(embed_model, 1536)
+
+    n = len(ids)
+    vec = dim * 4
+    data_bytes = sum(len(t.encode("utf-8")) for t in texts)
+    router_topics = {m.get("topic") for m in metadatas if m.get("role") == "router"}
+    centroid_rows = len(router_topics) * (1 + (prototypes_k if prototypes_k > 1 else 0))
+    centroid_json = centroid_rows * dim * _JSON_FLOAT_BYTES
+
+    sizes = {
+        "chroma_sqlite": _SQLITE_BASE_BYTES + n * (vec + _SQLITE_ROW_BYTES) + 2 * data_bytes,
+        "chroma_hnsw": max(n, _HNSW_MIN_ELEMENTS) * (vec + _HNSW_LINK_BYTES),
+        "centroids_json": centroid_json,
+        "bundle": n * vec + n * 120 + centroid_json // 2 + data_bytes,
+        "embedding_cache": len(unique) * (vec + 120) if cache_path else 0,
+        "checkpoint_jsonl": len(to_embed) * (dim * _JSON_FLOAT_BYTES + 80),
+    }
+
+    return {
+        "mode": "incremental" if incremental and build else "full",
+        "model": embed_model,
+        "dim": dim,
+        "tokenizer": tokenizer,
+        "chunks": n,
+        "new_chunks": len(new_ids),
+        "removed_chunks": removed,
+        "unchanged_chunks": n - len(new_ids),
+        "unique_texts": len(unique),
+        "cache_hits": len(unique) - len(to_embed),
+        "texts_to_embed": len(to_embed),
+        "tokens": tokens,
+        "requests": len(batches),
+        "max_batch_tokens": max(batch_tokens, default=0),
+        "concurrency": EMBED_CONCURRENCY,
+        "wall_seconds": wall if batches else 0.0,
+        "cost_usd": tokens / 1_000_000 * price,
+        "sizes": sizes,
+    }
+
+
+def print_estimate(est: Dict[str, Any]) -> None:
+    def size(n: int) -> str:
+        return f"{n / 1024 / 1024:8.2f} MB" if n >= 1024 * 1024 else f"{n / 1024:8.1f} KB"
+
+    print(f"🧮 Dry run ({est['mode']}): model={est['model']} dim={est['dim']} tokenizer={est['tokenizer']}")
+    print(f"   chunks={est['chunks']} new={est['new_chunks']} removed={est['removed_chunks']} "
+          f"unchanged={est['unchanged_chunks']}")
+    print(f"   unique texts={est['unique_texts']} cache hits={est['cache_hits']} "
+          f"to embed={est['texts_to_embed']}")
+    print(f"   tokens={est['tokens']:,} requests={est['requests']} "
+          f"(largest batch {est['max_batch_tokens']:,} tokens)")
+    print(f"   est. wall time ≈ {est['wall_seconds']:.1f}s at concurrency {est['concurrency']}, "
+          f"est. cost ≈ ${est['cost_usd']:.4f}")
+    print("💾 Projected on-disk size:")
+    labels = {
+        "chroma_sqlite": "Chroma SQLite",
+        "chroma_hnsw": "Chroma HNSW segment",
+        "centroids_json": "topic centroids JSON",
+        "bundle": "router bundle",
+        "embedding_cache": "embedding cache",
+        "checkpoint_jsonl": "checkpoint (transient)",
+    }
+    for key, label in labels.items():
+        print(f"   {label:<24}{size(est['sizes'][key])}")
@@ -0,0 +1,358 @@
+# rag/bundle.py
+"""
+Portable, prebuilt router index in one file.
+
+`python rag/bundle.py export` packs the active index version (every stored
+vector, its metadata and the topic centroids) together with the registry
+snapshot into a single checksummed file. A new worker loads it with one
+`mmap` instead of opening `chroma_store/` (SQLite + HNSW segments) and the
+centroid JSON:
+
+    ROUTER_BUNDLE=router.bundle   # route_topics() and the registry use it
+
+Layout (little-endian):
+    [0:64)   preamble: magic, header offset, header length, header sha256
+    [64:...) sections, each 64-byte aligned:
+             vectors          float32 (count, dim), uncompressed so it can be
+                              memory-mapped straight into a NumPy array
+             meta             zlib JSON {"ids", "metadatas"}
+             centroids        zlib JSON (same payload as topic_centroids.json)
+             snapshot_header  zlib JSON registry snapshot header
+             snapshot_blob    zlib registry snapshot text blob
+    header   JSON describing model, dimension, distance space, source
+             version and every section (offset, size, codec, sha256)
+
+    python rag/bundle.py export [PATH]
+    python rag/bundle.py info PATH
+    python rag/bundle.py verify PATH
+
+Loading only checks the header checksum (and zlib's own CRC on the sections
+it decodes); hashing every section would cost more than the mmap saves, so
+full verification is `bundle.py verify`, run after export / in CI.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.centroids import CentroidIndex
+
+FORMAT_VERSION = 1
+MAGIC = b"RAGBUNDL"
+_PREAMBLE = struct.Struct("<8sQQ32s")
+_ALIGN = 64
+
+ROUTER_BUNDLE = os.getenv("ROUTER_BUNDLE", "")
+
+
+class BundleError(RuntimeError):
+    pass
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+class VectorIndex:
+    """
+    Exact nearest-neighbour search over the bundle's vectors; `query()`
+    returns the same shape as a Chroma collection query.
+    """
+
+    def __init__(self, ids: List[str], metadatas: List[Dict], vectors: np.ndarray, space: str = "l2"):
+        if space not in ("l2", "cosine", "ip"):
+            raise ValueError(f"Unsupported distance space: {space}")
+        self.ids = ids
+        self.metadatas = metadatas
+        self.vectors = vectors
+        self.space = space
+        self._norms: Optional[np.ndarray] = None
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _row_norms(self) -> np.ndarray:
+        # computed on first query, so loading never touches every page
+        if self._norms is None:
+            self._norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        return self._norms
+
+    def distances(self, qvec: Sequence[float]) -> np.ndarray:
+        q = np.asarray(qvec, dtype=np.float32)
+        dots = self.vectors @ q
+        if self.space == "ip":
+            return 1.0 - dots
+        sq = self._row_norms()
+        if self.space == "cosine":
+            denom = np.sqrt(sq) * float(np.linalg.norm(q))
+            denom[denom == 0.0] = 1.0
+            return 1.0 - dots / denom
+        # Chroma's "l2" is squared euclidean distance
+        return np.maximum(sq - 2.0 * dots + float(q @ q), 0.0)
+
+    def query(self, query_embeddings: List[Sequence[float]], n_results: int = 10,
+              include: Sequence[str] = ("distances", "metadatas")) -> Dict[str, List]:
+        out: Dict[str, List] = {"ids": [], "distances": [], "metadatas": []}
+        k = min(n_results, len(self.ids))
+        for qvec in query_embeddings:
+            d = self.distances(qvec)
+            top = np.argpartition(d, k - 1)[:k] if k < len(d) else np.arange(len(d))
+            top = top[np.argsort(d[top], kind="stable")]
+            out["ids"].append([self.ids[i] for i in top])
+            out["distances"].append([float(d[i]) for i in top])
+            out["metadatas"].append([self.metadatas[i] for i in top])
+        return out
+
+
+@dataclass
+class Bundle:
+    """
+    A loaded bundle. Only `index.vectors` references the mapping, so it is
+    unmapped once the last request holding this bundle (or its index) is
+    done, or on `close()`.
+    """
+
+    path: str
+    header: Dict[str, Any]
+    index: VectorIndex
+    centroids: Optional[CentroidIndex]
+    _raw: Dict[str, bytes]      # sections decoded on demand, still encoded
+
+    def section(self, name: str) -> bytes:
+        return _decode_section(self.header, name, self._raw[name])
+
+    def registry(self):
+        """
+        Registry from the bundled snapshot, or None when it is missing or was
+        built from different chunk sources than this checkout.
+        """
+        from rag.snapshot import is_fresh, registry_from_snapshot
+
+        if "snapshot_header" not in self.header["sections"]:
+            return None
+        snap = json.loads(self.section("snapshot_header"))
+        if not is_fresh(snap):
+            return None
+        return registry_from_snapshot(snap, self.section("snapshot_blob"))
+
+    def close(self) -> None:
+        # drops the only reference to the mapping
+        self.index.vectors = None
+        self._raw = {}
+
+
+def _read_section(mm, header: Dict, name: str) -> bytes:
+    sec = header["sections"][name]
+    return _decode_section(header, name, mm[sec["offset"]:sec["offset"] + sec["nbytes"]])
+
+
+def _decode_section(header: Dict, name: str, raw: bytes) -> bytes:
+    if header["sections"][name]["codec"] != "zlib":
+        return raw
+    try:
+        return zlib.decompress(raw)
+    except zlib.error as e:
+        raise BundleError(f"Bundle section '{name}' is corrupt: {e}") from e
+
+
+def _collection_space(col) -> str:
+    config = getattr(col, "configuration", None) or {}
+    space = (config.get("hnsw") or {}).get("space") if isinstance(config, dict) else None
+    return space or (col.metadata or {}).get("hnsw:space") or "l2"
+
+
+def export_bundle(path: str, chroma_dir: Optional[str] = None, include_snapshot: bool = True) -> Dict[str, Any]:
+    import chromadb
+    from chromadb.config import Settings
+
+    from rag.manifest import CHROMA_DIR, COLLECTION_NAME, active_index
+
+    chroma_dir = chroma_dir or CHROMA_DIR
+    active = active_index(chroma_dir, COLLECTION_NAME)
+    chroma = chromadb.PersistentClient(path=chroma_dir, settings=Settings(anonymized_telemetry=False))
+    col = chroma.get_collection(name=active.collection)
+
+    res = col.get(include=["embeddings", "metadatas"])
+    vectors = np.asarray(res["embeddings"], dtype=np.float32)
+    if vectors.ndim != 2 or not len(vectors):
+        raise BundleError(f"Collection '{active.collection}' has no vectors to export")
+
+    try:
+        with open(active.centroids_path, "r", encoding="utf-8") as f:
+            centroids = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Cannot read centroids {active.centroids_path}: {e}")
+
+    sections: List[Tuple[str, str, bytes]] = [
+        ("vectors", "raw", vectors.tobytes()),
+        ("meta", "zlib", zlib.compress(json.dumps(
+            {"ids": res["ids"], "metadatas": res["metadatas"]}, ensure_ascii=False).encode("utf-8"))),
+        ("centroids", "zlib", zlib.compress(json.dumps(centroids).encode("utf-8"))),
+    ]
+    if include_snapshot:
+        from rag.snapshot import compile_snapshot
+
+        snap_header, blob = compile_snapshot()
+        sections.append(("snapshot_header", "zlib", zlib.compress(json.dumps(snap_header, ensure_ascii=False).encode("utf-8"))))
+        sections.append(("snapshot_blob", "zlib", zlib.compress(blob)))
+
+    header: Dict[str, Any] = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "embed_model": centroids.get("embed_model"),
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "space": _collection_space(col),
+        "source": {"collection": active.collection, "version": active.version},
+        "build": active.build,
+        "sections": {},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _PREAMBLE.size + b"\0" * _pad(_PREAMBLE.size))
+        for name, codec, data in sections:
+            offset = f.tell()
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+            header["sections"][name] = {
+                "offset": offset,
+                "nbytes": len(data),
+                "codec": codec,
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        header_offset = f.tell()
+        f.write(header_bytes)
+        f.seek(0)
+        f.write(_PREAMBLE.pack(MAGIC, header_offset, len(header_bytes), hashlib.sha256(header_bytes).digest()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return header
+
+
+def read_bundle_header(mm) -> Dict[str, Any]:
+    if len(mm) < _PREAMBLE.size:
+        raise BundleError("Not a router bundle (file too small)")
+    magic, offset, length, digest = _PREAMBLE.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise BundleError("Not a router bundle (bad magic)")
+    raw = mm[offset:offset + length]
+    if len(raw) != length or hashlib.sha256(raw).digest() != digest:
+        raise BundleError("Bundle header is truncated or corrupt")
+    header = json.loads(raw)
+    if header.get("format_version") != FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format {header.get('format_version')}")
+    return header
+
+
+def verify_sections(mm, header: Dict[str, Any]) -> None:
+    with memoryview(mm) as view:
+        for name, sec in header["sections"].items():
+            with view[sec["offset"]:sec["offset"] + sec["nbytes"]] as part:
+                ok = len(part) == sec["nbytes"] and hashlib.sha256(part).hexdigest() == sec["sha256"]
+            if not ok:
+                raise BundleError(f"Bundle section '{name}' failed its checksum")
+
+
+def load_bundle(path: str, verify: bool = False) -> Bundle:
+    """
+    Memory-map a bundle. Vectors are used in place; the small compressed
+    sections (metadata, centroids) are decoded eagerly, the registry snapshot
+    is copied out still compressed and decoded only when `Bundle.registry()`
+    is called. `verify` also checks every
+    section's SHA-256 (reads the whole file; off on the router's hot path).
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header = read_bundle_header(mm)
+        if verify:
+            verify_sections(mm, header)
+        meta = json.loads(_read_section(mm, header, "meta"))
+        sec = header["sections"]["vectors"]
+        vectors = np.frombuffer(
+            mm, dtype=np.float32, count=header["count"] * header["dim"], offset=sec["offset"]
+        ).reshape(header["count"], header["dim"])
+        centroids = CentroidIndex.from_payload(json.loads(_read_section(mm, header, "centroids")))
+        raw = {
+            name: mm[sec["offset"]:sec["offset"] + sec["nbytes"]]
+            for name, sec in header["sections"].items()
+            if name not in ("vectors", "meta", "centroids")
+        }
+    except Exception:
+        vectors = None
+        mm.close()
+        raise
+    index = VectorIndex(meta["ids"], meta["metadatas"], vectors, header.get("space", "l2"))
+    return Bundle(path, header, index, centroids, raw)
+
+
+# Loads happen under the lock, so concurrent first calls map the file once
+_BUNDLE_LOCK = threading.Lock()
+_BUNDLE_CACHE: Dict[str, Tuple[Tuple[int, int], Bundle]] = {}
+
+
+def get_bundle(path: str) -> Bundle:
+    """
+    Process-wide bundle for `path`, reloaded when the file is replaced.
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _BUNDLE_LOCK:
+        cached = _BUNDLE_CACHE.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        bundle = load_bundle(path)
+        # the replaced bundle is unmapped when its last reader drops it
+        _BUNDLE_CACHE[path] = (stamp, bundle)
+    return bundle
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export, inspect or verify a router bundle.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export")
+    exp.add_argument("path", nargs="?", default=ROUTER_BUNDLE or "router.bundle")
+    exp.add_argument("--no-snapshot", action="store_true", help="leave out the registry snapshot")
+    for cmd in ("info", "verify"):
+        sub.add_parser(cmd).add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        t0 = time.perf_counter()
+        header = export_bundle(args.path, include_snapshot=not args.no_snapshot)
+        ms = (time.perf_counter() - t0) * 1000
+        size = os.path.getsize(args.path)
+        print(f"✅ Wrote router bundle: {args.path} ({size / 1024:.1f} KiB, {ms:.0f} ms)")
+        print(f"   source={header['source']['collection']} vectors={header['count']}x{header['dim']} "
+              f"space={header['space']} model={header['embed_model']}")
+        return
+
+    t0 = time.perf_counter()
+    bundle = load_bundle(args.path, verify=args.cmd == "verify")
+    ms = (time.perf_counter() - t0) * 1000
+    h = bundle.header
+    if args.cmd == "verify":
+        print(f"✅ {args.path}: all {len(h['sections'])} section checksums OK ({ms:.1f} ms)")
+    print(f"📦 {args.path} format={h['format_version']} created={h['created_at']}")
+    print(f"   source={h['source']['collection']} vectors={h['count']}x{h['dim']} "
+          f"space={h['space']} model={h['embed_model']}")
+    for name, sec in h["sections"].items():
+        print(f"   {name:<16} {sec['codec']:<4} {sec['nbytes'] / 1024:9.1f} KiB")
+    bundle.close()
+
+
+if __name__ == "__main__":
+    main()
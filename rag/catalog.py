@@ -0,0 +1,251 @@
+# rag/catalog.py
+"""
+Code catalog of the workflow builder: every trigger, event and condition code
+with its name, description, category and static/dynamic flag.
+
+The catalogs are parsed once (on first `get_catalog()`) from the same text
+the planner prompt embeds (data/workflow_catalog.py), so the prompt and the
+lookups cannot drift apart. Lookups are O(1) dict hits by code.
+
+`validate_codes(codes_output)` checks a planner result in one pass over its
+trigger, events, conditions and flow steps / branches. It reports codes that
+are not in the catalog (hallucinated) and codes used in the wrong place (an
+event as trigger, a condition listed as an event, a logic block code as a
+flow step, ...). `check_plan_codes()` applies `PLAN_CODE_CHECK` to those
+issues (warn: log them, error: raise `PlanCodeError`, off: skip);
+`planner.plan_workflow` runs it on every plan, cached ones included.
+
+`codes_in(text)` lists the catalog codes a text mentions (the assembler's
+debug header uses it to show which codes a prompt exposes).
+
+    python rag/catalog.py                    # summary by kind / category
+    python rag/catalog.py EVNT_RCRD_ADD_STC  # look up codes
+    python rag/catalog.py --validate plan.md # check a Markdown plan
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PLAN_CODE_CHECK = os.getenv("PLAN_CODE_CHECK", "warn")
+
+TRIGGER = "trigger"
+EVENT = "event"
+CONDITION = "condition"
+
+_TRIGGER_LINE = re.compile(r'^(TRG_[A-Z0-9_]+)\s*=\s*"([^"]*)"', re.M)
+_EVENT_LINE = re.compile(r'^"(EVNT_[A-Z0-9_]+)"\s*:\s*"(.*)",?\s*$', re.M)
+_CONDITION_LINE = re.compile(r'^(CNDN_[A-Z0-9_]+)\s*=\s*"(.*)"\s*$', re.M)
+_ANY_CODE = re.compile(r"\b(?:TRG|EVNT|CNDN)_[A-Z0-9_]*[A-Z0-9]\b")
+
+# event code prefix -> category; the first (longest) matching prefix wins
+_EVENT_CATEGORIES: Tuple[Tuple[str, str], ...] = (
+    ("EVNT_NOTI_WBH", "integration"),
+    ("EVNT_NOTI_", "notification"),
+    ("EVNT_UX_", "ui"),
+    ("EVNT_RCRD_DUMP", "data"),
+    ("EVNT_RCRD_", "record"),
+    ("EVNT_DATA_OPR", "data"),
+    ("EVNT_FLTR", "data"),
+    ("EVNT_JMES", "data"),
+    ("EVNT_JSON_CNTRCT", "data"),
+    ("EVNT_LGR", "logging"),
+    ("EVNT_USER_MGMT_", "user_management"),
+    ("EVNT_ROLE_PRMSSN", "user_management"),
+    ("EVNT_PBL_RGSTN", "user_management"),
+    ("EVNT_INVC_", "invoice"),
+    ("EVNT_RPRT_", "report"),
+    ("EVNT_SPRT_", "support"),
+    ("EVNT_EXT_", "integration"),
+    ("EVNT_CHATGPT", "integration"),
+    ("EVNT_VAR_", "variable"),
+    ("EVNT_ACT_", "action"),
+    ("EVNT_LOOP_", "loop"),
+)
+
+# only valid inside their parent condition, never as a flow step of their own
+LOGIC_BLOCK_CODES = {"CNDN_LGC": "CNDN_SEQ", "CNDN_LGC_DOM": "CNDN_DOM"}
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    code: str
+    kind: str           # trigger | event | condition
+    name: str
+    description: str
+    category: str       # trigger | notification | record | ... | condition | logic_block
+    static: bool        # static system-table record event (*_STC); False = dynamic / n.a.
+
+
+@dataclass(frozen=True)
+class CodeIssue:
+    code: str
+    where: str          # trigger | events | conditions | flow_sequence[i] | flow_sequence[i].<branch>
+    problem: str        # unknown | miscategorized
+
+    def __str__(self) -> str:
+        return f"{self.where}: {self.code} ({self.problem})"
+
+
+class PlanCodeError(ValueError):
+    def __init__(self, issues: List[CodeIssue]):
+        super().__init__("; ".join(str(i) for i in issues))
+        self.issues = issues
+
+
+def _split_name(text: str) -> Tuple[str, str]:
+    name, sep, description = text.partition(" - ")
+    return (name.strip(), description.strip()) if sep else (text.strip(), "")
+
+
+def _event_category(code: str) -> str:
+    for prefix, category in _EVENT_CATEGORIES:
+        if code.startswith(prefix):
+            return category
+    return "other"
+
+
+class Catalog:
+    def __init__(self, entries: List[CatalogEntry]):
+        self.entries: Dict[str, CatalogEntry] = {e.code: e for e in entries}
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.entries
+
+    def __iter__(self) -> Iterator[CatalogEntry]:
+        return iter(self.entries.values())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, code: str) -> Optional[CatalogEntry]:
+        return self.entries.get(code)
+
+    def kind(self, code: str) -> Optional[str]:
+        entry = self.entries.get(code)
+        return entry.kind if entry else None
+
+    def codes(self, kind: Optional[str] = None, category: Optional[str] = None) -> List[str]:
+        return [
+            e.code for e in self.entries.values()
+            if (kind is None or e.kind == kind) and (category is None or e.category == category)
+        ]
+
+    def codes_in(self, text: str) -> List[str]:
+        """Catalog codes mentioned in `text`, in first-mention order."""
+        seen: Dict[str, None] = {}
+        for code in _ANY_CODE.findall(text):
+            if code in self.entries:
+                seen.setdefault(code, None)
+        return list(seen)
+
+
+def parse_catalog(triggers: str, events: str, conditions: str) -> Catalog:
+    entries: List[CatalogEntry] = []
+    for code, name in _TRIGGER_LINE.findall(triggers):
+        entries.append(CatalogEntry(code, TRIGGER, name.strip(), "", TRIGGER, False))
+    for code, text in _EVENT_LINE.findall(events):
+        name, description = _split_name(text)
+        entries.append(CatalogEntry(code, EVENT, name, description, _event_category(code), code.endswith("_STC")))
+    for code, text in _CONDITION_LINE.findall(conditions):
+        name, description = _split_name(text)
+        category = "logic_block" if code in LOGIC_BLOCK_CODES else CONDITION
+        entries.append(CatalogEntry(code, CONDITION, name, description, category, False))
+    return Catalog(entries)
+
+
+@lru_cache(maxsize=1)
+def get_catalog() -> Catalog:
+    from data.workflow_catalog import CONDITIONS_CATALOG, EVENTS_CATALOG, TRIGGERS_CATALOG
+
+    return parse_catalog(TRIGGERS_CATALOG, EVENTS_CATALOG, CONDITIONS_CATALOG)
+
+
+# ---- plan validation ----
+def validate_codes(codes_output: Dict[str, Any], catalog: Optional[Catalog] = None) -> List[CodeIssue]:
+    """Unknown and misplaced codes of a codes_output, each reported once per place."""
+    catalog = catalog or get_catalog()
+    entries = catalog.entries
+    issues: List[CodeIssue] = []
+    seen = set()
+
+    def check(code: Optional[str], where: str, kinds: Tuple[str, ...], flow_step: bool = False) -> None:
+        if not code or code == "END" or (code, where) in seen:
+            return
+        seen.add((code, where))
+        entry = entries.get(code)
+        if entry is None:
+            issues.append(CodeIssue(code, where, "unknown"))
+        elif entry.kind not in kinds or (flow_step and code in LOGIC_BLOCK_CODES):
+            issues.append(CodeIssue(code, where, "miscategorized"))
+
+    check(codes_output.get("trigger"), "trigger", (TRIGGER,))
+    for code in codes_output.get("events") or ():
+        check(code, "events", (EVENT,))
+    for code in codes_output.get("conditions") or ():
+        check(code, "conditions", (CONDITION,))
+
+    for i, step in enumerate(codes_output.get("flow_sequence") or ()):
+        where = f"flow_sequence[{i}]"
+        check(step.get("code"), where, (TRIGGER, EVENT, CONDITION) if i == 0 else (EVENT, CONDITION), flow_step=True)
+        branches = step.get("branches") or {}
+        for key in ("if_true", "if_false"):
+            check(branches.get(key), f"{where}.{key}", (EVENT,))
+        for key in ("loop_internal", "logic_blocks", "containers"):
+            for item in branches.get(key) or ():
+                check(item.get("event"), f"{where}.{key}", (EVENT,))
+                for route in item.get("nested") or ():
+                    check(route.get("event"), f"{where}.{key}.nested", (EVENT,))
+    return issues
+
+
+def check_plan_codes(codes_output: Dict[str, Any]) -> List[CodeIssue]:
+    """validate_codes() under PLAN_CODE_CHECK (warn | error | off)."""
+    if PLAN_CODE_CHECK not in ("warn", "error", "off"):
+        raise ValueError(f"PLAN_CODE_CHECK must be warn, error or off (got {PLAN_CODE_CHECK!r})")
+    if PLAN_CODE_CHECK == "off":
+        return []
+    issues = validate_codes(codes_output)
+    if issues and PLAN_CODE_CHECK == "error":
+        raise PlanCodeError(issues)
+    for issue in issues:
+        logger.warning(f"⚠️ Plan code {issue}")
+    return issues
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect the trigger / event / condition catalog.")
+    parser.add_argument("codes", nargs="*", help="codes to look up")
+    parser.add_argument("--validate", metavar="PLAN_MD", help="check the codes of a Markdown plan")
+    args = parser.parse_args(argv)
+
+    catalog = get_catalog()
+    if args.validate:
+        from rag.plan_parser import parse_plan
+
+        with open(args.validate, "r", encoding="utf-8") as f:
+            issues = validate_codes(parse_plan(f.read()), catalog)
+        for issue in issues:
+            print(f"   ❌ {issue}")
+        print(f"{'✅' if not issues else '⚠️ '} {len(issues)} code issue(s) in {args.validate}")
+    elif args.codes:
+        for code in args.codes:
+            entry = catalog.get(code)
+            print(json.dumps(entry.__dict__ if entry else {"code": code, "kind": None}, ensure_ascii=False))
+    else:
+        counts: Dict[Tuple[str, str], int] = {}
+        for entry in catalog:
+            counts[(entry.kind, entry.category)] = counts.get((entry.kind, entry.category), 0) + 1
+        print(f"📚 {len(catalog)} codes")
+        for (kind, category), n in sorted(counts.items()):
+            print(f"   {kind:<9} {category:<16} {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# rag/centroids.py
+"""
+Topic centroids for routing, built and scored with NumPy.
+
+`build_centroids` gives one (optionally L2-normalized) mean vector per topic.
+`build_prototypes` gives up to k vectors per topic via spherical mini-batch
+k-means, for topics whose router summaries cover several distinct phrasings.
+
+`CentroidIndex` stacks every prototype (or the centroid, for topics without
+prototypes) into one unit-norm matrix, so a query is scored against all of
+them with a single matrix-vector product; a topic's distance is
+1 - its best prototype's cosine similarity.
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CENTROID_NORMALIZE = os.getenv("CENTROID_NORMALIZE", "1") not in ("0", "false", "False")
+CENTROID_PROTOTYPES = int(os.getenv("CENTROID_PROTOTYPES", "1"))  # k per topic; 1 = mean only
+
+RouterItem = Tuple[str, Dict[str, Any], Sequence[float]]
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return m / norms
+
+
+def _group_by_topic(router_items: List[RouterItem]) -> Dict[str, np.ndarray]:
+    by_topic: Dict[str, List[Sequence[float]]] = {}
+    for _cid, meta, emb in router_items:
+        topic = (meta or {}).get("topic")
+        if not topic:
+            continue
+        by_topic.setdefault(topic, []).append(emb)
+    return {t: np.asarray(vecs, dtype=np.float64) for t, vecs in by_topic.items()}
+
+
+def build_centroids(
+    router_items: List[RouterItem],
+    normalize: bool = CENTROID_NORMALIZE,
+) -> Dict[str, List[float]]:
+    """
+    router_items: list of (chunk_id, meta, embedding)
+    Returns: { topic: centroid_embedding }
+    """
+    centroids: Dict[str, List[float]] = {}
+    for topic, m in _group_by_topic(router_items).items():
+        mean = m.mean(axis=0, keepdims=True)
+        if normalize:
+            mean = _normalize_rows(mean)
+        centroids[topic] = mean[0].tolist()
+    return centroids
+
+
+def minibatch_kmeans(
+    x: np.ndarray,
+    k: int,
+    batch_size: int = 64,
+    iterations: int = 50,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Spherical mini-batch k-means (cosine) over the rows of `x`.
+    Returns a (k', dim) array of unit-norm centers, k' = min(k, len(x)).
+    """
+    x = _normalize_rows(np.asarray(x, dtype=np.float64))
+    n = len(x)
+    if n <= k:
+        return x.copy()
+
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on cosine distance
+    centers = [x[rng.integers(n)]]
+    for _ in range(1, k):
+        d = 1.0 - np.max(x @ np.asarray(centers).T, axis=1)
+        d = np.clip(d, 0.0, None) ** 2
+        total = d.sum()
+        idx = rng.choice(n, p=d / total) if total > 0 else rng.integers(n)
+        centers.append(x[idx])
+    c = np.asarray(centers)
+
+    counts = np.zeros(k)
+    for _ in range(iterations):
+        batch = x[rng.choice(n, size=min(batch_size, n), replace=False)]
+        assign = np.argmax(batch @ c.T, axis=1)
+        for j, v in zip(assign, batch):
+            counts[j] += 1.0
+            eta = 1.0 / counts[j]
+            c[j] = (1.0 - eta) * c[j] + eta * v
+        c = _normalize_rows(c)
+    return c
+
+
+def build_prototypes(
+    router_items: List[RouterItem],
+    k: int = CENTROID_PROTOTYPES,
+    seed: int = 0,
+) -> Dict[str, List[List[float]]]:
+    """
+    { topic: [prototype, ...] } for topics with more than one router chunk.
+    Empty when k <= 1 (routing then uses the mean centroids).
+    """
+    if k <= 1:
+        return {}
+    out: Dict[str, List[List[float]]] = {}
+    for topic, m in _group_by_topic(router_items).items():
+        if len(m) < 2:
+            continue
+        out[topic] = minibatch_kmeans(m, k, seed=seed).tolist()
+    return out
+
+
+@dataclass(frozen=True)
+class CentroidIndex:
+    topics: Tuple[str, ...]
+    matrix: np.ndarray        # (n_prototypes, dim), unit rows, grouped by topic
+    starts: np.ndarray        # first row of each topic in `matrix`
+    embed_model: Optional[str] = None
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1])
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> Optional["CentroidIndex"]:
+        centroids = payload.get("centroids") or {}
+        prototypes = payload.get("prototypes") or {}
+        if not isinstance(centroids, dict) or not centroids:
+            return None
+
+        topics: List[str] = []
+        rows: List[Sequence[float]] = []
+        starts: List[int] = []
+        for topic in sorted(set(centroids) | set(prototypes)):
+            vecs = prototypes.get(topic) or [centroids[topic]]
+            vecs = [v for v in vecs if v]
+            if not vecs:
+                continue
+            topics.append(topic)
+            starts.append(len(rows))
+            rows.extend(vecs)
+        if not rows:
+            return None
+        matrix = _normalize_rows(np.asarray(rows, dtype=np.float32))
+        return cls(tuple(topics), matrix, np.asarray(starts, dtype=np.intp), payload.get("embed_model"))
+
+    def distances(self, qvec: Sequence[float]) -> Dict[str, float]:
+        """
+        { topic: 1 - max cosine similarity over the topic's prototypes }
+        """
+        q = np.asarray(qvec, dtype=np.float32)
+        qn = float(np.linalg.norm(q))
+        if qn == 0.0:
+            return {t: 1.0 for t in self.topics}
+        sims = self.matrix @ (q / qn)
+        best = np.maximum.reduceat(sims, self.starts)
+        return {t: 1.0 - float(s) for t, s in zip(self.topics, best)}
+
+
+_INDEX_CACHE: Dict[str, Tuple[Tuple[int, int], Optional[CentroidIndex]]] = {}
+
+
+def load_centroid_index(path: str) -> Optional[CentroidIndex]:
+    """
+    Load (and cache per file mtime/size) the centroid file written by
+    `rag/create_embeddings.py`. Returns None when missing or empty.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _INDEX_CACHE.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = CentroidIndex.from_payload(json.load(f))
+    except (OSError, ValueError):
+        index = None
+    _INDEX_CACHE[path] = (stamp, index)
+    return index
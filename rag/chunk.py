@@ -0,0 +1,161 @@
+# rag/chunk.py
+"""
+Compact, immutable chunk record used by the registry.
+
+`Chunk` keeps dict-style read access (`ch["text"]`, `ch.get("topic")`,
+`ch.keys()`), so code written against the old plain-dict chunks keeps working.
+Metadata strings are interned and roles are `Role` enum members, so the many
+registries a worker may hold share one copy of each doc_type/topic/role.
+
+`chunk_id` is content-addressed: it only changes when the chunk's identity
+fields or its data/text change, never because of its position in the list.
+"""
+import hashlib
+import sys
+from enum import Enum
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class Role(str, Enum):
+    ROUTER = "router"
+    SUPPORT = "support"
+    STATIC = "static"
+
+    # Behave exactly like the plain string: equal, same hash, same str().
+    __hash__ = str.__hash__
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+# fields that define a chunk's identity (and therefore its chunk_id)
+IDENTITY_FIELDS = ("doc_type", "topic", "role", "data", "text")
+
+
+def content_id(doc_type: str, topic: str, role: str, data: str, text: str) -> str:
+    """
+    Stable chunk ID derived from the normalized identity fields.
+    """
+    h = hashlib.sha256()
+    for value in (doc_type, topic, str(role), data, text):
+        h.update(value.encode("utf-8"))
+        h.update(b"\x1f")
+    return "chunk-" + h.hexdigest()[:20]
+
+
+class Chunk:
+    __slots__ = (
+        "chunk_id",
+        "doc_type",
+        "topic",
+        "priority",
+        "role",
+        "data",
+        "text",
+        "expands",
+        "always_include",
+        "source",
+        "text_sha1",
+        "data_sha256",
+        "data_tokens",
+        "text_tokens",
+    )
+
+    def __init__(
+        self,
+        doc_type: str,
+        topic: str,
+        priority: int,
+        role: str,
+        data: str,
+        text: str,
+        expands: Tuple[str, ...] = (),
+        always_include: bool = False,
+        source: str = "clean",
+        text_sha1: Optional[str] = None,
+        data_sha256: Optional[str] = None,
+        data_tokens: Optional[int] = None,
+        text_tokens: Optional[int] = None,
+        chunk_id: Optional[str] = None,
+    ):
+        init = object.__setattr__
+        init(self, "chunk_id", chunk_id or content_id(doc_type, topic, role, data, text))
+        init(self, "doc_type", sys.intern(doc_type))
+        init(self, "topic", sys.intern(topic))
+        init(self, "priority", int(priority))
+        init(self, "role", Role(role))
+        init(self, "data", data)
+        init(self, "text", text)
+        init(self, "expands", tuple(sys.intern(t) for t in expands))
+        init(self, "always_include", bool(always_include))
+        init(self, "source", sys.intern(source))
+        init(self, "text_sha1", text_sha1 or hashlib.sha1(text.strip().encode("utf-8")).hexdigest())
+        init(self, "data_sha256", data_sha256 or hashlib.sha256(data.encode("utf-8")).hexdigest())
+        init(self, "data_tokens", data_tokens)
+        init(self, "text_tokens", text_tokens)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Chunk is immutable; use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("Chunk is immutable")
+
+    def replace(self, **changes) -> "Chunk":
+        fields = self.to_dict()
+        if any(k in changes for k in IDENTITY_FIELDS):
+            fields["chunk_id"] = None
+        if "text" in changes:
+            fields["text_sha1"] = None
+            fields["text_tokens"] = None
+        if "data" in changes:
+            fields["data_sha256"] = None
+            fields["data_tokens"] = None
+        fields.update(changes)
+        return Chunk(**fields)
+
+    # ---- dict-style read access ----
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__slots__
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.__slots__]
+
+    def values(self):
+        return [getattr(self, k) for k in self.__slots__]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Chunk):
+            return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.chunk_id, self.priority))
+
+    def __repr__(self) -> str:
+        return (
+            f"Chunk({self.chunk_id}, doc_type={self.doc_type!r}, topic={self.topic!r}, "
+            f"role={self.role.value!r}, priority={self.priority})"
+        )
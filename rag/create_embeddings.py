@@ -1,6 +1,9 @@
 import os
 import json
-from typing import Dict, List, Any, Tuple
+import time
+import argparse
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Set, Tuple
 from dotenv import load_dotenv
 
 import chromadb
@@ -13,102 +16,199 @@ load_dotenv()
 CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", os.getenv("CHROMA_DIR", ".chroma"))
 COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "rag_chunks_v1")
 EMBED_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", os.getenv("EMBED_MODEL", "text-embedding-3-small"))
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", "0"))  # 0 = model default
+
+# Finished embedding batches of an interrupted build (removed on success)
+CHECKPOINT_PATH = os.path.join(CHROMA_DIR, "embed_checkpoint.jsonl")
+
+# Merged chunk registry (clean + legacy); chunk ids are content-addressed
+from rag.registry import get_registry
+from rag.embedder import embed_texts
+from rag.embedding_cache import EMBED_CACHE_PATH, EmbeddingCache, text_sha256
+from rag.manifest import (
+    activate, active_index, build_manifest, embed_key, gc, index_metadata, new_version, versioned_names,
+)
+from rag.centroids import CENTROID_NORMALIZE, CENTROID_PROTOTYPES, build_centroids, build_prototypes
+
+
+def _embed_texts(oai: OpenAI, texts: List[str], cache: Optional[EmbeddingCache] = None) -> List[List[float]]:
+    # Cached vectors first; the rest in size/token-bounded concurrent batches
+    hashes = [text_sha256(t) for t in texts]
+    found = cache.get_many(EMBED_MODEL, EMBED_DIMENSIONS, hashes) if cache else {}
+
+    hits = sum(1 for h in hashes if h in found)
+    missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+    if missing:
+        os.makedirs(CHROMA_DIR, exist_ok=True)
+        extra = {"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}
+        vectors = embed_texts(
+            oai, list(missing.values()), EMBED_MODEL, checkpoint_path=CHECKPOINT_PATH, **extra
+        )
+        new = dict(zip(missing, vectors))
+        if cache:
+            cache.put_many(EMBED_MODEL, EMBED_DIMENSIONS, new.items())
+        found.update(new)
 
-# Where to write centroids (requested)
-CENTROIDS_PATH = os.path.join(CHROMA_DIR, "topic_centroids.json")
+    if cache:
+        print(f"📦 Embedding cache: {hits}/{len(texts)} hits, {len(missing)} embedded")
+    return [found[h] for h in hashes]
 
-# Import your chunk registry (adjust import if your file name differs)
-# Expected: chunk_data = [ {doc_type, topic, priority, role, data, text}, ... ]
-from data.rag_chunks_data_clean import chunk_data
 
+def _prepare_records() -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """
+    ids, texts (embedded `data`) and metadatas for every registry chunk.
+    """
+    # Prepare docs to embed: ONLY `data` is embedded
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    ids: List[str] = []
 
-def _embed_texts(oai: OpenAI, texts: List[str]) -> List[List[float]]:
-    # Batched embedding for speed + stability
-    resp = oai.embeddings.create(model=EMBED_MODEL, input=texts)
-    return [d.embedding for d in resp.data]
+    for ch in get_registry().chunks:
+        data = (ch.get("data") or "").strip()
+        if not data:
+            continue
 
+        # stable, content-addressed chunk id (same id the registry uses)
+        cid = ch["chunk_id"]
 
-def _avg_vectors(vectors: List[List[float]]) -> List[float]:
-    if not vectors:
-        return []
-    dim = len(vectors[0])
-    out = [0.0] * dim
-    for v in vectors:
-        for i, x in enumerate(v):
-            out[i] += float(x)
-    n = float(len(vectors))
-    return [x / n for x in out]
+        texts.append(data)
+        metadatas.append(index_metadata(ch))
+        ids.append(cid)
 
+    return ids, texts, metadatas
 
-def build_centroids(router_items: List[Tuple[str, Dict[str, Any], List[float]]]) -> Dict[str, List[float]]:
-    """
-    router_items: list of (chunk_id, meta, embedding)
-    Returns: { topic: centroid_embedding }
-    """
-    by_topic: Dict[str, List[List[float]]] = {}
-    for _cid, meta, emb in router_items:
-        topic = (meta or {}).get("topic")
-        if not topic:
-            continue
-        by_topic.setdefault(topic, []).append(emb)
 
-    centroids: Dict[str, List[float]] = {}
-    for topic, vecs in by_topic.items():
-        centroids[topic] = _avg_vectors(vecs)
+def _load_centroid_file(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
 
-    return centroids
 
+def _write_centroids(
+    path: str,
+    collection: str,
+    centroids: Dict[str, List[float]],
+    prototypes: Dict[str, List[List[float]]],
+) -> None:
+    os.makedirs(CHROMA_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "collection": collection,
+                "embed_model": EMBED_MODEL,
+                "normalized": CENTROID_NORMALIZE,
+                "prototypes_k": CENTROID_PROTOTYPES,
+                "centroids": centroids,
+                "prototypes": prototypes,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp, path)
 
-def main():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not found (check .env)")
 
-    oai = OpenAI(api_key=api_key)
+@contextmanager
+def _stage(timings: Dict[str, float], name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
 
-    chroma = chromadb.PersistentClient(
-        path=CHROMA_DIR,
-        settings=Settings(anonymized_telemetry=False),
-    )
 
-    # Recreate collection cleanly
-    try:
-        chroma.delete_collection(COLLECTION_NAME)
-        print(f"🧹 Deleted existing collection: {COLLECTION_NAME}")
-    except Exception:
-        pass
+def _as_floats(vec) -> List[float]:
+    # Chroma returns numpy arrays; keep JSON/centroid math on plain floats
+    return [float(x) for x in vec]
 
-    col = chroma.get_or_create_collection(name=COLLECTION_NAME)
 
-    # Prepare docs to embed: ONLY `data` is embedded
-    texts: List[str] = []
-    metadatas: List[Dict[str, Any]] = []
-    ids: List[str] = []
+def _new_target() -> Tuple[str, str, str]:
+    """(version, collection name, centroid path) for a fresh build."""
+    version = new_version()
+    collection, centroids_file = versioned_names(version, COLLECTION_NAME)
+    return version, collection, os.path.join(CHROMA_DIR, centroids_file)
 
-    for i, ch in enumerate(chunk_data):
-        data = (ch.get("data") or "").strip()
-        if not data:
-            continue
 
-        # stable chunk id
-        cid = f"chunk-{i+1}"
+def _max_batch(chroma, default: int = 1000) -> int:
+    # records per add/upsert call; Chroma rejects larger calls
+    get = getattr(chroma, "get_max_batch_size", None)
+    return int(get()) if get else default
 
-        meta = {
-            "doc_type": ch.get("doc_type"),
-            "topic": ch.get("topic"),
-            "priority": int(ch.get("priority", 0)),
-            "role": ch.get("role"),
-        }
 
-        texts.append(data)
-        metadatas.append(meta)
-        ids.append(cid)
+def _write_batched(write, batch: int, ids: List[str], **columns: List[Any]) -> None:
+    # col.add / upsert / update / delete in slices of at most `batch` records
+    for start in range(0, len(ids), batch):
+        end = start + batch
+        write(ids=ids[start:end], **{k: v[start:end] for k, v in columns.items()})
 
-    # Embed and add to Chroma
-    embeddings = _embed_texts(oai, texts)
 
-    col.add(
-        ids=ids,
+def _clone_collection(src, dst, page: int = 1000) -> int:
+    # Copy stored vectors as-is: a new version starts from the active one
+    total = src.count()
+    for offset in range(0, total, page):
+        res = src.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        if not res["ids"]:
+            break
+        dst.add(
+            ids=res["ids"],
+            embeddings=[_as_floats(e) for e in res["embeddings"]],
+            documents=res["documents"],
+            metadatas=res["metadatas"],
+        )
+    return total
+
+
+def _validate(col, ids: List[str], metadatas: List[Dict[str, Any]], centroids: Dict[str, List[float]]) -> None:
+    """
+    Refuse to activate a version that is incomplete or unusable for routing.
+    """
+    count = col.count()
+    if count != len(ids):
+        raise RuntimeError(f"Validation failed: collection has {count} records, expected {len(ids)}")
+
+    router_topics = {m.get("topic") for m in metadatas if m.get("role") == "router"}
+    missing = sorted(t for t in router_topics if t and t not in centroids)
+    if missing:
+        raise RuntimeError(f"Validation failed: no centroid for router topics {missing}")
+
+    if ids:
+        # a stored vector must find itself
+        probe = col.get(ids=[ids[0]], include=["embeddings"])
+        hit = col.query(query_embeddings=[_as_floats(probe["embeddings"][0])], n_results=1)
+        if hit["ids"][0][:1] != [ids[0]]:
+            raise RuntimeError(f"Validation failed: probe query for {ids[0]} returned {hit['ids'][0][:1]}")
+
+
+def _collection_dim(col) -> int:
+    res = col.get(limit=1, include=["embeddings"])
+    return len(res["embeddings"][0]) if len(res["embeddings"]) else 0
+
+
+def _publish(chroma, version: str, collection: str, metadatas: List[Dict[str, Any]], dim: int) -> None:
+    build = build_manifest([embed_key(m) for m in metadatas], EMBED_MODEL, EMBED_DIMENSIONS, dim)
+    activate(version, CHROMA_DIR, COLLECTION_NAME, build=build)
+    print(f"📌 Active version: {version} (collection='{collection}')")
+    dropped = gc(chroma, CHROMA_DIR, COLLECTION_NAME)
+    if dropped:
+        print(f"🧹 Dropped old versions: {', '.join(dropped)}")
+
+
+def full_rebuild(oai: OpenAI, chroma, cache: Optional[EmbeddingCache] = None) -> None:
+    ids, texts, metadatas = _prepare_records()
+
+    # Embed first so a failed run leaves the active version (and a checkpoint)
+    embeddings = _embed_texts(oai, texts, cache)
+
+    # Build into a new versioned collection; readers keep using the active one
+    version, collection, centroids_path = _new_target()
+    col = chroma.create_collection(name=collection)
+
+    _write_batched(
+        col.add,
+        _max_batch(chroma),
+        ids,
         embeddings=embeddings,
         documents=texts,      # keep embedded text for inspect/debug
         metadatas=metadatas,
@@ -121,22 +221,236 @@ def main():
             router_items.append((cid, meta, emb))
 
     centroids = build_centroids(router_items)
+    prototypes = build_prototypes(router_items)
+    _write_centroids(centroids_path, collection, centroids, prototypes)
 
-    os.makedirs(CHROMA_DIR, exist_ok=True)
-    with open(CENTROIDS_PATH, "w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "collection": COLLECTION_NAME,
-                "embed_model": EMBED_MODEL,
-                "centroids": centroids,
-            },
-            f,
-            ensure_ascii=False,
+    _validate(col, ids, metadatas, centroids)
+    print(f"✅ Embedded {len(ids)}/{len(ids)}")
+    print(f"\n🎉 Done. Collection='{collection}', dir='{CHROMA_DIR}', total={len(ids)}")
+    print(f"🧠 Wrote centroids: {centroids_path} (topics={len(centroids)}, "
+          f"prototype topics={len(prototypes)})")
+    _publish(chroma, version, collection, metadatas, len(embeddings[0]) if embeddings else 0)
+
+
+def sync(oai: OpenAI, chroma, cache: Optional[EmbeddingCache] = None) -> Dict[str, Any]:
+    """
+    Incrementally bring the index in line with the registry.
+
+    Diffs the active version by content-addressed id. If anything changed, the
+    active collection is copied into a new version, which then gets the
+    changes: new chunks are upserted (embedding only `data` strings the
+    collection does not already hold, matched by data_sha256), changed
+    metadata is updated and removed ids are deleted. Only the centroids of
+    topics whose router chunks changed are recomputed. The new version is
+    activated after validation.
+    """
+    timings: Dict[str, float] = {}
+    active = active_index(CHROMA_DIR, COLLECTION_NAME)
+
+    with _stage(timings, "diff"):
+        try:
+            src = chroma.get_collection(name=active.collection)
+        except Exception:
+            src = None
+        ids, texts, metadatas = _prepare_records()
+        desired = {cid: (text, meta) for cid, text, meta in zip(ids, texts, metadatas)}
+
+        existing_res = src.get(include=["metadatas"]) if src is not None else {}
+        existing = {
+            cid: (meta or {})
+            for cid, meta in zip(existing_res.get("ids", []), existing_res.get("metadatas", []))
+        }
+
+        added = [cid for cid in ids if cid not in existing]
+        removed = [cid for cid in existing if cid not in desired]
+        meta_changed = [
+            cid for cid in ids
+            if cid in existing and existing[cid] != desired[cid][1]
+        ]
+
+        # Topics whose router membership changed need a fresh centroid
+        affected_topics: Set[str] = set()
+        for cid in added + meta_changed:
+            if desired[cid][1].get("role") == "router":
+                affected_topics.add(desired[cid][1].get("topic"))
+        for cid in removed + meta_changed:
+            if existing[cid].get("role") == "router":
+                affected_topics.add(existing[cid].get("topic"))
+
+        previous = _load_centroid_file(active.centroids_path) or {}
+        centroids = previous.get("centroids") or {}
+        prototypes = previous.get("prototypes") or {}
+        if (
+            not centroids
+            or previous.get("embed_model") != EMBED_MODEL
+            or previous.get("normalized") != CENTROID_NORMALIZE
+            or previous.get("prototypes_k", 1) != CENTROID_PROTOTYPES
+        ):
+            # no usable centroid file: recompute every router topic
+            affected_topics = {m.get("topic") for m in metadatas if m.get("role") == "router"}
+            centroids, prototypes = {}, {}
+        affected_topics.discard(None)
+
+    if not (added or removed or meta_changed or affected_topics):
+        print(f"✅ '{active.collection}' is up to date ({len(ids)} chunks); nothing to sync")
+        return {"added": 0, "removed": 0, "metadata_updated": 0, "unchanged": len(ids),
+                "embedded": 0, "reused_vectors": 0, "centroids_recomputed": [],
+                "version": active.version, "timings": timings}
+
+    with _stage(timings, "reuse"):
+        # An id can be new while its `data` is unchanged (e.g. only `text` was
+        # edited); reuse the stored vector instead of re-embedding.
+        by_hash: Dict[str, str] = {}
+        for cid, meta in existing.items():
+            if meta.get("data_sha256"):
+                by_hash.setdefault(meta["data_sha256"], cid)
+
+        vectors: Dict[str, List[float]] = {}
+        donors = {}
+        for cid in added:
+            donor = by_hash.get(desired[cid][1].get("data_sha256"))
+            if donor:
+                donors[cid] = donor
+        if donors:
+            got = src.get(ids=sorted(set(donors.values())), include=["embeddings"])
+            donor_vecs = {d: _as_floats(e) for d, e in zip(got["ids"], got["embeddings"])}
+            for cid, donor in donors.items():
+                if donor in donor_vecs:
+                    vectors[cid] = donor_vecs[donor]
+
+    with _stage(timings, "embed"):
+        to_embed: Dict[str, List[str]] = {}
+        for cid in added:
+            if cid not in vectors:
+                to_embed.setdefault(desired[cid][0], []).append(cid)
+        unique_texts = list(to_embed)
+        if unique_texts:
+            for text, emb in zip(unique_texts, _embed_texts(oai, unique_texts, cache)):
+                for cid in to_embed[text]:
+                    vectors[cid] = emb
+
+    with _stage(timings, "write"):
+        version, collection, centroids_path = _new_target()
+        col = chroma.create_collection(name=collection)
+        batch = _max_batch(chroma)
+        if src is not None:
+            _clone_collection(src, col, min(1000, batch))
+        if added:
+            _write_batched(
+                col.upsert,
+                batch,
+                added,
+                embeddings=[vectors[cid] for cid in added],
+                documents=[desired[cid][0] for cid in added],
+                metadatas=[desired[cid][1] for cid in added],
+            )
+        if meta_changed:
+            _write_batched(col.update, batch, meta_changed, metadatas=[desired[cid][1] for cid in meta_changed])
+        if removed:
+            _write_batched(col.delete, batch, removed)
+
+    with _stage(timings, "centroids"):
+        if affected_topics:
+            res = col.get(where={"role": "router"}, include=["metadatas", "embeddings"])
+            router_items = [
+                (cid, meta, _as_floats(emb))
+                for cid, meta, emb in zip(res["ids"], res["metadatas"], res["embeddings"])
+                if (meta or {}).get("topic") in affected_topics
+            ]
+            fresh = build_centroids(router_items)
+            fresh_protos = build_prototypes(router_items)
+            for topic in affected_topics:
+                centroids.pop(topic, None)
+                prototypes.pop(topic, None)
+                if topic in fresh:
+                    centroids[topic] = fresh[topic]
+                if topic in fresh_protos:
+                    prototypes[topic] = fresh_protos[topic]
+        _write_centroids(centroids_path, collection, centroids, prototypes)
+
+    with _stage(timings, "validate"):
+        _validate(col, ids, metadatas, centroids)
+
+    summary = {
+        "added": len(added),
+        "removed": len(removed),
+        "metadata_updated": len(meta_changed),
+        "unchanged": len(ids) - len(added) - len(meta_changed),
+        "embedded": len(unique_texts),
+        "reused_vectors": len(added) - sum(len(v) for v in to_embed.values()),
+        "centroids_recomputed": sorted(affected_topics),
+        "version": version,
+        "timings": timings,
+    }
+
+    print(f"🔁 Sync '{active.collection}' -> '{collection}' in '{CHROMA_DIR}'")
+    print(f"   added={summary['added']} removed={summary['removed']} "
+          f"metadata_updated={summary['metadata_updated']} unchanged={summary['unchanged']}")
+    print(f"   embedded={summary['embedded']} reused_vectors={summary['reused_vectors']}")
+    print(f"🧠 Centroids recomputed: {', '.join(summary['centroids_recomputed']) or '(none)'}")
+    print("⏱️  " + "  ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    _publish(chroma, version, collection, metadatas, _collection_dim(col))
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Embed registry chunk data into Chroma.")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="incremental: embed only new/changed chunks instead of rebuilding the collection",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="ignore the embedding cache (EMBED_CACHE_PATH) and embed everything via the API",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="estimate tokens, requests, wall time and store size; no API calls, collection untouched",
+    )
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        from rag.build_estimate import estimate_build, print_estimate
+
+        ids, texts, metadatas = _prepare_records()
+        print_estimate(
+            estimate_build(
+                ids,
+                texts,
+                metadatas,
+                EMBED_MODEL,
+                EMBED_DIMENSIONS,
+                build=active_index(CHROMA_DIR, COLLECTION_NAME).build,
+                incremental=args.sync,
+                cache_path=None if args.no_cache else EMBED_CACHE_PATH,
+                prototypes_k=CENTROID_PROTOTYPES,
+            )
         )
+        return
 
-    print(f"✅ Embedded {len(ids)}/{len(ids)}")
-    print(f"\n🎉 Done. Collection='{COLLECTION_NAME}', dir='{CHROMA_DIR}', total={len(ids)}")
-    print(f"🧠 Wrote centroids: {CENTROIDS_PATH} (topics={len(centroids)})")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not found (check .env)")
+
+    oai = OpenAI(api_key=api_key)
+
+    chroma = chromadb.PersistentClient(
+        path=CHROMA_DIR,
+        settings=Settings(anonymized_telemetry=False),
+    )
+
+    cache = None if args.no_cache else EmbeddingCache()
+    try:
+        if args.sync:
+            sync(oai, chroma, cache)
+        else:
+            full_rebuild(oai, chroma, cache)
+    finally:
+        if cache:
+            cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+# rag/embedder.py
+"""
+Batched, concurrent embedding calls for the index builder.
+
+Inputs are split into batches bounded by both `EMBED_BATCH_SIZE` (inputs per
+request) and `EMBED_MAX_BATCH_TOKENS` (tokens per request). Up to
+`EMBED_CONCURRENCY` batches run at once. Rate-limit and transient API errors
+are retried with exponential backoff (honoring `Retry-After` when the API
+sends it). Results come back in input order.
+
+When a checkpoint path is given, every finished batch is appended to it, so
+a failed run can be resumed without re-embedding what already succeeded.
+Checkpoint entries are keyed by model, request kwargs (`dimensions`, ...) and
+text, so a resume with other settings re-embeds instead of mixing vectors.
+The checkpoint is removed after a fully successful run.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import openai
+
+from rag.tokens import count_tokens
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "100000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))
+EMBED_BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", "60.0"))
+
+# transient API errors worth a retry with backoff
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def make_batches(
+    texts: List[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_tokens: int = EMBED_MAX_BATCH_TOKENS,
+    model: Optional[str] = None,
+) -> List[List[int]]:
+    """
+    Split input positions into consecutive batches of at most `batch_size`
+    inputs and `max_tokens` tokens. A single oversized input gets its own
+    batch (the API reports it rather than us silently dropping it).
+    """
+    if batch_size < 1:
+        raise ValueError("EMBED_BATCH_SIZE must be >= 1")
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text, model)
+        if current and (len(current) >= batch_size or current_tokens + n > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait (Retry-After header), if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _create_with_backoff(oai, model: str, inputs: List[str], **kwargs) -> List[List[float]]:
+    attempt = 0
+    while True:
+        try:
+            resp = oai.embeddings.create(model=model, input=inputs, **kwargs)
+            return [d.embedding for d in resp.data]
+        except RETRYABLE_ERRORS as exc:
+            attempt += 1
+            if attempt > EMBED_MAX_RETRIES:
+                raise
+            delay = retry_after(exc)
+            if delay is None:
+                delay = min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+            print(f"⏳ {type(exc).__name__}; retry {attempt}/{EMBED_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _text_key(model: str, text: str, kwargs: Optional[Dict] = None) -> str:
+    # every request kwarg changes the vector (e.g. `dimensions`), so it is part of the key
+    params = json.dumps(kwargs or {}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{model}\x1f{params}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+def _load_checkpoint(path: Optional[str]) -> Dict[str, List[float]]:
+    done: Dict[str, List[float]] = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # torn last line from an interrupted write
+                continue
+            done[row["key"]] = row["embedding"]
+    return done
+
+
+def embed_texts(
+    oai,
+    texts: List[str],
+    model: str,
+    checkpoint_path: Optional[str] = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_tokens: int = EMBED_MAX_BATCH_TOKENS,
+    concurrency: int = EMBED_CONCURRENCY,
+    **kwargs,
+) -> List[List[float]]:
+    """
+    Embed `texts` and return one vector per input, in input order.
+
+    Duplicate texts are embedded once. Extra kwargs (e.g. `dimensions`) are
+    passed to `embeddings.create`.
+    """
+    done = _load_checkpoint(checkpoint_path)
+    keys = [_text_key(model, t, kwargs) for t in texts]
+
+    pending: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in done:
+            pending.setdefault(key, text)
+    if done:
+        reused = sum(1 for k in keys if k in done)
+        print(f"↩️  Resuming from checkpoint: {reused}/{len(texts)} already embedded")
+        stale = len(done.keys() - set(keys))
+        if stale:
+            print(f"⚠️  Ignoring {stale} checkpoint entries from another model / dimensions / input set")
+
+    pending_keys = list(pending)
+    pending_texts = [pending[k] for k in pending_keys]
+    batches = make_batches(pending_texts, batch_size, max_tokens, model)
+
+    write_lock = threading.Lock()
+    ckpt = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path and batches else None
+
+    def run(batch: List[int]) -> None:
+        vectors = _create_with_backoff(oai, model, [pending_texts[i] for i in batch], **kwargs)
+        if len(vectors) != len(batch):
+            raise RuntimeError(f"Embedding API returned {len(vectors)} vectors for {len(batch)} inputs")
+        with write_lock:
+            for i, vec in zip(batch, vectors):
+                done[pending_keys[i]] = vec
+                if ckpt is not None:
+                    ckpt.write(json.dumps({"key": pending_keys[i], "embedding": vec}) + "\n")
+            if ckpt is not None:
+                ckpt.flush()
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches) or 1)))
+    try:
+        futures = [pool.submit(run, batch) for batch in batches]
+        for future in futures:
+            future.result()
+    finally:
+        # on failure, drop queued batches; in-flight ones still reach the checkpoint
+        pool.shutdown(wait=True, cancel_futures=True)
+        if ckpt is not None:
+            ckpt.close()
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return [done[k] for k in keys]
@@ -0,0 +1,203 @@
+# rag/embedding_cache.py
+"""
+Durable embedding cache shared across rebuilds, collections and machines.
+
+Vectors are stored in a SQLite file as float32 blobs keyed by
+`(embed_model, dimensions, sha256(text))`; `dimensions` is 0 when the model's
+native size is used. `create_embeddings` looks texts up here before calling
+the API and stores whatever it had to embed.
+
+    python rag/embedding_cache.py stats
+    python rag/embedding_cache.py export PATH [--model M] [--registry]
+    python rag/embedding_cache.py import PATH
+
+An export is itself a cache file. Importing one built for the same corpus
+lets a fresh store be built with zero embedding requests.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBED_CACHE_PATH = os.getenv(
+    "EMBED_CACHE_PATH",
+    os.path.join(_REPO_ROOT, ".cache", "embeddings.sqlite"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model       TEXT    NOT NULL,
+    dimensions  INTEGER NOT NULL,
+    text_sha256 TEXT    NOT NULL,
+    vector      BLOB    NOT NULL,
+    created_at  REAL    NOT NULL,
+    PRIMARY KEY (model, dimensions, text_sha256)
+) WITHOUT ROWID
+"""
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vec: Iterable[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    out = array("f")
+    out.frombytes(blob)
+    return out.tolist()
+
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or EMBED_CACHE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get_many(self, model: str, dimensions: int, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            part = unique[i:i + 500]
+            marks = ",".join("?" * len(part))
+            rows = self._conn.execute(
+                f"SELECT text_sha256, vector FROM embeddings "
+                f"WHERE model = ? AND dimensions = ? AND text_sha256 IN ({marks})",
+                [model, dimensions, *part],
+            )
+            for h, blob in rows:
+                found[h] = _unpack(blob)
+        self.hits += sum(1 for h in hashes if h in found)
+        self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model: str, dimensions: int, items: Iterable[Tuple[str, List[float]]]) -> int:
+        now = time.time()
+        rows = [(model, dimensions, h, _pack(vec), now) for h, vec in items]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def stats(self) -> List[Tuple[str, int, int, int]]:
+        """(model, dimensions, entries, bytes) per model/dimension pair."""
+        return list(
+            self._conn.execute(
+                "SELECT model, dimensions, COUNT(*), SUM(LENGTH(vector)) "
+                "FROM embeddings GROUP BY model, dimensions ORDER BY model, dimensions"
+            )
+        )
+
+    def export(self, path: str, model: Optional[str] = None, hashes: Optional[Iterable[str]] = None) -> int:
+        """
+        Copy entries (optionally one model, optionally only `hashes`) into a
+        new cache file at `path`.
+        """
+        if os.path.exists(path):
+            raise ValueError(f"Refusing to overwrite existing file: {path}")
+        out = EmbeddingCache(path)
+        out.close()
+
+        where, params = [], []
+        if model:
+            where.append("model = ?")
+            params.append(model)
+        self._conn.execute("ATTACH DATABASE ? AS dst", (path,))
+        try:
+            with self._conn:
+                if hashes is not None:
+                    self._conn.execute("CREATE TEMP TABLE wanted (h TEXT PRIMARY KEY)")
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO wanted VALUES (?)", ((h,) for h in hashes)
+                    )
+                    where.append("text_sha256 IN (SELECT h FROM wanted)")
+                clause = f"WHERE {' AND '.join(where)}" if where else ""
+                cur = self._conn.execute(
+                    f"INSERT INTO dst.embeddings SELECT * FROM main.embeddings {clause}", params
+                )
+                n = cur.rowcount
+                if hashes is not None:
+                    self._conn.execute("DROP TABLE temp.wanted")
+        finally:
+            self._conn.execute("DETACH DATABASE dst")
+        return n
+
+    def import_from(self, path: str) -> int:
+        """
+        Merge entries from another cache file; existing entries are kept.
+        """
+        if not os.path.exists(path):
+            raise ValueError(f"Cache file not found: {path}")
+        self._conn.execute("ATTACH DATABASE ? AS src", (path,))
+        try:
+            with self._conn:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO main.embeddings SELECT * FROM src.embeddings"
+                )
+                n = cur.rowcount
+        finally:
+            self._conn.execute("DETACH DATABASE src")
+        return n
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect, export or import the embedding cache.")
+    parser.add_argument("--cache", default=None, help=f"cache file (default: {EMBED_CACHE_PATH})")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    exp = sub.add_parser("export")
+    exp.add_argument("path")
+    exp.add_argument("--model", default=None, help="only this embedding model")
+    exp.add_argument("--registry", action="store_true", help="only the current registry's chunk data")
+    imp = sub.add_parser("import")
+    imp.add_argument("path")
+    args = parser.parse_args(argv)
+
+    with EmbeddingCache(args.cache) as cache:
+        if args.cmd == "stats":
+            rows = cache.stats()
+            print(f"📦 {cache.path}")
+            for model, dims, n, size in rows:
+                print(f"   {model} dims={dims or 'native'}: {n} vectors, {size / 1024:.1f} KiB")
+            if not rows:
+                print("   (empty)")
+        elif args.cmd == "export":
+            hashes = None
+            if args.registry:
+                from rag.registry import get_registry
+
+                hashes = [
+                    text_sha256((ch.get("data") or "").strip())
+                    for ch in get_registry().chunks
+                ]
+            n = cache.export(args.path, model=args.model, hashes=hashes)
+            print(f"✅ Exported {n} vectors to {args.path}")
+        else:
+            n = cache.import_from(args.path)
+            print(f"✅ Imported {n} new vectors from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# rag/manifest.py
+"""
+Active index version for blue/green builds.
+
+Every build writes a new versioned collection (`<CHROMA_COLLECTION>__<version>`)
+and a matching centroid file (`topic_centroids.<version>.json`). Once the new
+version validates, `activate()` rewrites `<CHROMA_DIR>/active.json` with a
+single `os.replace`. Readers see either the old version or the new one, never
+a collection being filled.
+
+Routers call `active_index()` on every request. It costs one `stat` unless the
+manifest changed, so a new version is picked up without a restart. Replaced
+versions are listed under `retired`. `gc()` drops them once they are older
+than `INDEX_GC_GRACE_SECONDS`, so requests that already resolved the old
+version can finish.
+
+Without a manifest (stores built before versioning) the plain
+`CHROMA_COLLECTION` and `topic_centroids.json` are used.
+
+Each activated version also records a build manifest under "build": embedding
+model, requested and actual dimension, the sorted embed keys of the records
+it was built from (plus their digest) and the build time. An embed key hashes
+only what a record serves: the embedded `data` and the routing metadata
+(doc_type, topic, role, priority); editing a chunk's `text` does not change
+it, so such edits never mark the index stale. `index_problems()` compares the
+build with the router's configuration, the loaded centroids and the current
+registry, using only hashes and header fields. Builds from before embed keys
+(no "chunk_key" field) are compared by chunk id.
+
+    python rag/manifest.py          # show active + retired versions
+    python rag/manifest.py --gc     # drop retired versions past the grace period
+"""
+import argparse
+import calendar
+import hashlib
+import json
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", os.getenv("CHROMA_DIR", ".chroma"))
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "rag_chunks_v1")
+INDEX_GC_GRACE_SECONDS = float(os.getenv("INDEX_GC_GRACE_SECONDS", "3600"))
+
+MANIFEST_NAME = "active.json"
+CHUNK_KEY = "embed-v1"
+EMBED_KEY_FIELDS = ("doc_type", "topic", "role", "priority", "data_sha256")
+LEGACY_CENTROIDS = "topic_centroids.json"
+_VERSION_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+class StaleIndexError(RuntimeError):
+    """
+    The index does not match the router's model/dimension or the registry.
+    """
+
+
+@dataclass(frozen=True)
+class ActiveIndex:
+    version: Optional[str]      # None for an unversioned (legacy) store
+    collection: str
+    centroids_path: str
+    build: Optional[Dict[str, Any]] = None
+
+
+def manifest_path(chroma_dir: str = CHROMA_DIR) -> str:
+    return os.path.join(chroma_dir, MANIFEST_NAME)
+
+
+def new_version() -> str:
+    return time.strftime(_VERSION_TIME_FORMAT, time.gmtime()) + "-" + secrets.token_hex(3)
+
+
+def _version_time(version: str) -> Optional[float]:
+    try:
+        return calendar.timegm(time.strptime(version.split("-", 1)[0], _VERSION_TIME_FORMAT))
+    except (ValueError, OverflowError):
+        return None
+
+
+def versioned_names(version: str, base: str = COLLECTION_NAME) -> Tuple[str, str]:
+    """(collection name, centroid file name) for a build version."""
+    return f"{base}__{version}", f"topic_centroids.{version}.json"
+
+
+_MANIFEST_CACHE: Dict[str, Tuple[Tuple[int, int], Optional[Dict]]] = {}
+
+
+def read_manifest(chroma_dir: str = CHROMA_DIR) -> Optional[Dict]:
+    path = manifest_path(chroma_dir)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _MANIFEST_CACHE.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    _MANIFEST_CACHE[path] = (stamp, manifest)
+    return manifest
+
+
+def active_index(chroma_dir: str = CHROMA_DIR, base: str = COLLECTION_NAME) -> ActiveIndex:
+    manifest = read_manifest(chroma_dir)
+    if not manifest or manifest.get("base") != base:
+        return ActiveIndex(None, base, os.path.join(chroma_dir, LEGACY_CENTROIDS))
+    return ActiveIndex(
+        manifest["version"],
+        manifest["collection"],
+        os.path.join(chroma_dir, manifest["centroids"]),
+        manifest.get("build"),
+    )
+
+
+def chunks_digest(chunk_ids: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()
+
+
+def index_metadata(chunk) -> Dict[str, Any]:
+    """Metadata stored with a chunk's vector (everything routing reads)."""
+    return {
+        "doc_type": chunk.get("doc_type"),
+        "topic": chunk.get("topic"),
+        "priority": int(chunk.get("priority", 0)),
+        "role": str(chunk.get("role")),
+        "data_sha256": chunk.get("data_sha256"),
+    }
+
+
+def embed_key(metadata: Dict[str, Any]) -> str:
+    """Hash of what an index record serves: embedded `data` + routing metadata."""
+    raw = "\x1f".join(str(metadata.get(f)) for f in EMBED_KEY_FIELDS)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def build_manifest(
+    embed_keys: List[str], embed_model: str, embed_dimensions: int, dim: int
+) -> Dict[str, Any]:
+    return {
+        "embed_model": embed_model,
+        "embed_dimensions": embed_dimensions,
+        "dim": dim,
+        "count": len(embed_keys),
+        "chunk_key": CHUNK_KEY,
+        "chunks_digest": chunks_digest(embed_keys),
+        "chunk_hashes": sorted(embed_keys),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def build_keys(build: Optional[Dict[str, Any]], ids: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+    """Keys of records (ids, metadatas) comparable with `build["chunk_hashes"]`."""
+    if (build or {}).get("chunk_key") == CHUNK_KEY:
+        return [embed_key(m) for m in metadatas]
+    return list(ids)
+
+
+def registry_digest(registry, build: Optional[Dict[str, Any]]) -> str:
+    """Digest of the registry chunks an index build embeds (non-empty `data`)."""
+    chunks = [ch for ch in registry.chunks if (ch.data or "").strip()]
+    return chunks_digest(
+        build_keys(build, [ch.chunk_id for ch in chunks], [index_metadata(ch) for ch in chunks])
+    )
+
+
+def index_problems(
+    build: Optional[Dict[str, Any]],
+    embed_model: str,
+    embed_dimensions: int,
+    centroid_model: Optional[str],
+    centroid_dim: Optional[int],
+    registry_digest: Optional[str],
+) -> List[str]:
+    """
+    Human-readable mismatches between an index and the router/registry.
+    Without a build manifest (legacy store) only the centroid file's model
+    and dimension can be checked.
+    """
+    problems: List[str] = []
+    if centroid_model and centroid_model != embed_model:
+        problems.append(f"centroids were built with '{centroid_model}', router embeds with '{embed_model}'")
+    if centroid_dim and embed_dimensions and centroid_dim != embed_dimensions:
+        problems.append(f"centroids have dimension {centroid_dim}, router requests {embed_dimensions}")
+    if not build:
+        return problems
+
+    if build.get("embed_model") != embed_model:
+        problems.append(f"index was built with '{build.get('embed_model')}', router embeds with '{embed_model}'")
+    if int(build.get("embed_dimensions") or 0) != embed_dimensions:
+        problems.append(
+            f"index was built with EMBED_DIMENSIONS={build.get('embed_dimensions') or 0}, "
+            f"router uses {embed_dimensions}"
+        )
+    if centroid_dim and build.get("dim") and centroid_dim != build["dim"]:
+        problems.append(f"centroids have dimension {centroid_dim}, index vectors {build['dim']}")
+    if registry_digest and build.get("chunks_digest") != registry_digest:
+        problems.append("index chunk hashes do not match the current registry (chunks were edited since the build)")
+    return problems
+
+
+def _write_manifest(chroma_dir: str, manifest: Dict) -> None:
+    path = manifest_path(chroma_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def activate(version: str, chroma_dir: str = CHROMA_DIR, base: str = COLLECTION_NAME, **extra: Any) -> Dict:
+    """
+    Atomically point the manifest at `version`; the previously active
+    version (or the legacy unversioned store) is moved to `retired`.
+    """
+    current = read_manifest(chroma_dir)
+    if current and current.get("base") != base:
+        current = None
+    retired: List[Dict] = list((current or {}).get("retired", []))
+    now = time.time()
+
+    if current:
+        retired.append(
+            {
+                "version": current["version"],
+                "collection": current["collection"],
+                "centroids": current["centroids"],
+                "retired_at": now,
+            }
+        )
+    elif os.path.exists(os.path.join(chroma_dir, LEGACY_CENTROIDS)):
+        retired.append(
+            {"version": None, "collection": base, "centroids": LEGACY_CENTROIDS, "retired_at": now}
+        )
+
+    collection, centroids = versioned_names(version, base)
+    manifest = {
+        "base": base,
+        "version": version,
+        "collection": collection,
+        "centroids": centroids,
+        "activated_at": now,
+        **extra,
+        "retired": retired,
+    }
+    _write_manifest(chroma_dir, manifest)
+    return manifest
+
+
+def gc(chroma, chroma_dir: str = CHROMA_DIR, base: str = COLLECTION_NAME,
+       grace_seconds: Optional[float] = None) -> List[str]:
+    """
+    Drop retired versions older than the grace period, plus orphaned
+    versioned collections (failed builds) older than it. Returns the
+    collection names that were deleted.
+    """
+    grace = INDEX_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    now = time.time()
+    manifest = read_manifest(chroma_dir)
+    if manifest and manifest.get("base") != base:
+        manifest = None
+
+    dropped: List[str] = []
+    keep: List[Dict] = []
+    for entry in (manifest or {}).get("retired", []):
+        if now - entry.get("retired_at", now) < grace:
+            keep.append(entry)
+            continue
+        try:
+            chroma.delete_collection(entry["collection"])
+        except Exception:
+            pass
+        try:
+            os.remove(os.path.join(chroma_dir, entry["centroids"]))
+        except OSError:
+            pass
+        dropped.append(entry["collection"])
+
+    if dropped:
+        # re-read: a build may have activated a new version meanwhile
+        latest = read_manifest(chroma_dir) or manifest
+        retired = [e for e in latest.get("retired", []) if e["collection"] not in dropped]
+        _write_manifest(chroma_dir, {**latest, "retired": retired})
+
+    # versioned collections nobody references (e.g. a build that failed validation)
+    referenced = {e["collection"] for e in keep}
+    if manifest:
+        referenced.add(manifest["collection"])
+    prefix = f"{base}__"
+    for col in chroma.list_collections():
+        name = getattr(col, "name", col)
+        if not name.startswith(prefix) or name in referenced:
+            continue
+        built = _version_time(name[len(prefix):])
+        if built is None or now - built < grace:
+            continue
+        try:
+            chroma.delete_collection(name)
+        except Exception:
+            continue
+        version = name[len(prefix):]
+        try:
+            os.remove(os.path.join(chroma_dir, versioned_names(version, base)[1]))
+        except OSError:
+            pass
+        dropped.append(name)
+
+    return dropped
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Show or garbage-collect index versions.")
+    parser.add_argument("--gc", action="store_true", help="drop retired versions past the grace period")
+    parser.add_argument("--grace", type=float, default=None, help="grace period in seconds")
+    args = parser.parse_args(argv)
+
+    active = active_index()
+    print(f"📌 Active: collection='{active.collection}' centroids='{active.centroids_path}'"
+          f" version={active.version or '(unversioned)'}")
+    if active.build:
+        b = active.build
+        print(f"   built {b['built_at']} model={b['embed_model']} dim={b['dim']} "
+              f"chunks={b['count']} digest={b['chunks_digest'][:12]}")
+    for entry in (read_manifest() or {}).get("retired", []):
+        age = time.time() - entry.get("retired_at", time.time())
+        print(f"   retired {entry['collection']} ({age / 60:.0f} min ago)")
+
+    if args.gc:
+        import chromadb
+        from chromadb.config import Settings
+
+        chroma = chromadb.PersistentClient(
+            path=CHROMA_DIR,
+            settings=Settings(anonymized_telemetry=False),
+        )
+        dropped = gc(chroma, grace_seconds=args.grace)
+        print(f"🧹 Dropped {len(dropped)} version(s): {', '.join(dropped) or '(none)'}")
+
+
+if __name__ == "__main__":
+    main()
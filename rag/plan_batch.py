@@ -0,0 +1,427 @@
+# rag/plan_batch.py
+"""
+Offline batch planning through OpenAI Batch API files.
+
+Three resumable steps share one SQLite store (`PLAN_BATCH_DB`):
+
+  prepare  build the direct-mode planner messages for every query of an input
+           file and write one Batch request line per distinct prompt. The
+           `custom_id` is the plan cache key of the prompt
+           (`rag.plan_cache.plan_key`), so identical prompts are sent once and
+           prompts with a stored result are skipped.
+  submit   upload the file and create a `/v1/chat/completions` batch. The
+           `LocalBatchClient` stand-in exposes the same `files` / `batches`
+           calls and answers every request right away from a completion
+           callable (tests, small runs without the Batch API).
+  ingest   read a Batch output file line by line, parse each plan with
+           `rag.plan_parser` into the `results` table (and the plan cache, so
+           later interactive runs of the same query hit it). Progress is
+           committed every `commit_every` lines; re-running ingest on the same
+           file resumes after the last committed line. Every parsed plan goes
+           through the catalog code check (`rag.catalog.check_plan_codes`,
+           `PLAN_CODE_CHECK`) like interactive plans. A malformed line, an
+           API error, an empty plan or a plan failing the code check is
+           recorded in `errors` with its line number and ingest moves on.
+
+The command line lives in scripts/plan_batch.py (it needs the planner prompt).
+"""
+import csv
+import json
+import os
+import sqlite3
+import time
+import types
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rag.catalog import check_plan_codes
+from rag.plan_cache import plan_key
+from rag.plan_parser import parse_plan
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAN_BATCH_DB = os.getenv("PLAN_BATCH_DB", os.path.join(_REPO_ROOT, ".cache", "plan_batch.sqlite"))
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS requests (
+        custom_id        TEXT PRIMARY KEY,
+        model            TEXT NOT NULL,
+        temperature      REAL NOT NULL,
+        registry_version TEXT NOT NULL,
+        created_at       REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS queries (
+        input     TEXT    NOT NULL,
+        line      INTEGER NOT NULL,
+        query     TEXT    NOT NULL,
+        custom_id TEXT    NOT NULL,
+        PRIMARY KEY (input, line)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS queries_custom_id ON queries (custom_id)",
+    """
+    CREATE TABLE IF NOT EXISTS batches (
+        batch_id     TEXT PRIMARY KEY,
+        input_file   TEXT NOT NULL,
+        requests     INTEGER NOT NULL,
+        submitted_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS results (
+        custom_id     TEXT PRIMARY KEY,
+        workflow_plan TEXT NOT NULL,
+        codes_output  TEXT NOT NULL,
+        source        TEXT NOT NULL,
+        line          INTEGER NOT NULL,
+        ingested_at   REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS errors (
+        source    TEXT    NOT NULL,
+        line      INTEGER NOT NULL,
+        custom_id TEXT,
+        error     TEXT    NOT NULL,
+        PRIMARY KEY (source, line)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS errors_custom_id ON errors (custom_id)",
+    """
+    CREATE TABLE IF NOT EXISTS progress (
+        source TEXT    PRIMARY KEY,
+        lines  INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def read_queries(path: str) -> List[str]:
+    """
+    One query per line; `.jsonl` lines are objects with a `query` field and
+    `.csv` files use their `query` column (the first column without a header).
+    """
+    if path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        col = 0
+        if rows and "query" in [c.strip().lower() for c in rows[0]]:
+            col = [c.strip().lower() for c in rows[0]].index("query")
+            rows = rows[1:]
+        return [r[col].strip() for r in rows if len(r) > col and r[col].strip()]
+
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                line = str(json.loads(line).get("query", "")).strip()
+                if not line:
+                    continue
+            queries.append(line)
+    return queries
+
+
+def batch_request(custom_id: str, messages: list, model: str, temperature: float) -> Dict[str, Any]:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "temperature": temperature, "messages": messages},
+    }
+
+
+class BatchStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or PLAN_BATCH_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "BatchStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def has_result(self, custom_id: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM results WHERE custom_id = ?", (custom_id,)).fetchone() is not None
+
+    def request_meta(self, custom_id: str) -> Optional[Tuple[str, float, str]]:
+        return self._conn.execute(
+            "SELECT model, temperature, registry_version FROM requests WHERE custom_id = ?", (custom_id,)
+        ).fetchone()
+
+    def record_batch(self, batch_id: str, input_file: str, requests: int) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?)",
+                (batch_id, os.path.abspath(input_file), requests, time.time()),
+            )
+
+    def export(self, input_name: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """One row per input query: its plan, or the latest error for its prompt."""
+        sql = (
+            "SELECT q.input, q.line, q.query, q.custom_id, r.workflow_plan, r.codes_output,"
+            " (SELECT e.error FROM errors e WHERE e.custom_id = q.custom_id ORDER BY e.rowid DESC LIMIT 1)"
+            " FROM queries q LEFT JOIN results r ON r.custom_id = q.custom_id"
+        )
+        params: tuple = ()
+        if input_name:
+            sql += " WHERE q.input = ?"
+            params = (input_name,)
+        for inp, line, query, custom_id, plan, codes, error in self._conn.execute(sql + " ORDER BY q.input, q.line", params):
+            yield {
+                "input": inp,
+                "line": line,
+                "query": query,
+                "custom_id": custom_id,
+                "status": "ok" if plan is not None else ("error" if error else "pending"),
+                "workflow_plan": plan,
+                "codes_output": json.loads(codes) if codes is not None else None,
+                "error": None if plan is not None else error,
+            }
+
+    def stats(self) -> Dict[str, int]:
+        one = lambda sql: self._conn.execute(sql).fetchone()[0]
+        return {
+            "queries": one("SELECT COUNT(*) FROM queries"),
+            "requests": one("SELECT COUNT(*) FROM requests"),
+            "batches": one("SELECT COUNT(*) FROM batches"),
+            "results": one("SELECT COUNT(*) FROM results"),
+            "errors": one("SELECT COUNT(*) FROM errors"),
+            "pending": one(
+                "SELECT COUNT(*) FROM requests WHERE custom_id NOT IN (SELECT custom_id FROM results)"
+            ),
+        }
+
+
+# ---- Step 1: prepare ----
+def prepare(
+    queries: Iterable[str],
+    build_messages: Callable[[str], Tuple[list, str]],
+    out_path: str,
+    store: BatchStore,
+    model: str,
+    temperature: float,
+    input_name: str = "",
+    skip_done: bool = True,
+) -> Dict[str, int]:
+    """
+    Write the Batch input file for `queries`. `build_messages(query)` returns
+    (chat messages, registry version), e.g. planner.direct_messages.
+    """
+    written, duplicates, done = set(), 0, 0
+    now = time.time()
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    n = 0
+    with open(out_path, "w", encoding="utf-8") as out, store._conn:
+        for n, query in enumerate(queries, 1):
+            messages, version = build_messages(query)
+            custom_id = plan_key(json.dumps(messages), model, temperature, version)
+            store._conn.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)", (input_name, n, query, custom_id)
+            )
+            if custom_id in written:
+                duplicates += 1
+                continue
+            if skip_done and store.has_result(custom_id):
+                done += 1
+                continue
+            written.add(custom_id)
+            store._conn.execute(
+                "INSERT OR IGNORE INTO requests VALUES (?, ?, ?, ?, ?)",
+                (custom_id, model, float(temperature), version or "", now),
+            )
+            out.write(json.dumps(batch_request(custom_id, messages, model, temperature), ensure_ascii=False) + "\n")
+    return {"queries": n, "requests": len(written), "duplicates": duplicates, "already_planned": done}
+
+
+# ---- Step 2: submit ----
+def submit(client, input_path: str, store: BatchStore, completion_window: str = "24h") -> str:
+    """Upload `input_path` and create the batch; returns the batch id."""
+    with open(input_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window=completion_window
+    )
+    with open(input_path, "rb") as f:
+        n = sum(1 for line in f if line.strip())
+    store.record_batch(batch.id, input_path, n)
+    return batch.id
+
+
+def download(client, batch_id: str, out_path: str) -> str:
+    """
+    Write the output (and error) file of a finished batch to `out_path`.
+    Returns the batch status; nothing is written until it is `completed`.
+    """
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return batch.status
+    with open(out_path, "w", encoding="utf-8") as out:
+        for file_id in (batch.output_file_id, getattr(batch, "error_file_id", None)):
+            if file_id:
+                text = client.files.content(file_id).text
+                out.write(text if not text or text.endswith("\n") else text + "\n")
+    return batch.status
+
+
+class LocalBatchClient:
+    """
+    In-process stand-in for the `files` / `batches` part of the OpenAI client.
+    `batches.create` answers every request immediately with `complete(body)`
+    (the request body -> plan text) and stores Batch-format output lines; an
+    exception becomes that line's `error`.
+    """
+
+    def __init__(self, complete: Callable[[Dict[str, Any]], str]):
+        self._complete = complete
+        self._files: Dict[str, str] = {}
+        self._batches: Dict[str, Any] = {}
+        self.files = types.SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._batches.__getitem__)
+
+    def _create_file(self, file, purpose: str = "batch"):
+        file_id = f"file-local-{len(self._files) + 1}"
+        data = file.read()
+        self._files[file_id] = data.decode("utf-8") if isinstance(data, bytes) else data
+        return types.SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id: str):
+        text = self._files[file_id]
+        return types.SimpleNamespace(text=text, content=text.encode("utf-8"))
+
+    def _answer(self, n: int, request: Dict[str, Any]) -> Dict[str, Any]:
+        body = request["body"]
+        line = {"id": f"batch_req_local_{n}", "custom_id": request["custom_id"], "response": None, "error": None}
+        try:
+            content = self._complete(body)
+        except Exception as e:
+            line["error"] = {"code": type(e).__name__, "message": str(e)}
+            return line
+        line["response"] = {
+            "status_code": 200,
+            "request_id": f"req_local_{n}",
+            "body": {
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                ],
+            },
+        }
+        return line
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str, **kw):
+        lines = [json.loads(l) for l in self._files[input_file_id].splitlines() if l.strip()]
+        answers = [self._answer(n, req) for n, req in enumerate(lines, 1)]
+        ok = [a for a in answers if a["error"] is None]
+        failed = [a for a in answers if a["error"] is not None]
+        output_id = self._create_file(_JsonlText(ok)).id
+        error_id = self._create_file(_JsonlText(failed)).id if failed else None
+        batch = types.SimpleNamespace(
+            id=f"batch_local_{len(self._batches) + 1}",
+            status="completed",
+            endpoint=endpoint,
+            input_file_id=input_file_id,
+            output_file_id=output_id,
+            error_file_id=error_id,
+            request_counts=types.SimpleNamespace(total=len(answers), completed=len(ok), failed=len(failed)),
+        )
+        self._batches[batch.id] = batch
+        return batch
+
+
+class _JsonlText:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self._text = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+
+    def read(self) -> str:
+        return self._text
+
+
+# ---- Step 3: ingest ----
+def _plan_from_line(line: Dict[str, Any]) -> str:
+    """Plan text of one Batch output line; raises ValueError with the reason."""
+    if line.get("error"):
+        err = line["error"]
+        raise ValueError(f"batch error {err.get('code')}: {err.get('message')}" if isinstance(err, dict) else str(err))
+    response = line.get("response") or {}
+    status = response.get("status_code")
+    body = response.get("body") or {}
+    if status != 200:
+        message = (body.get("error") or {}).get("message") if isinstance(body, dict) else None
+        raise ValueError(f"HTTP {status}: {message or 'no response body'}")
+    try:
+        plan = body["choices"][0]["message"]["content"] or ""
+    except (KeyError, IndexError, TypeError):
+        raise ValueError("response has no choices[0].message.content")
+    if not plan.strip():
+        raise ValueError("empty plan")
+    return plan
+
+
+def ingest(path: str, store: BatchStore, plan_cache=None, commit_every: int = 500) -> Dict[str, int]:
+    """
+    Parse a Batch output file into `results`. Resumes after the last
+    committed line of `path`; returns counts for this run.
+    """
+    source = os.path.abspath(path)
+    conn = store._conn
+    row = conn.execute("SELECT lines FROM progress WHERE source = ?", (source,)).fetchone()
+    start = row[0] if row else 0
+    counts = {"skipped": start, "ok": 0, "errors": 0}
+    pending = 0
+
+    def checkpoint(n: int) -> None:
+        conn.execute("INSERT OR REPLACE INTO progress VALUES (?, ?)", (source, n))
+        conn.commit()
+
+    n = start
+    with open(path, "r", encoding="utf-8") as f:
+        for n, raw in enumerate(f, 1):
+            if n <= start or not raw.strip():
+                continue
+            custom_id = None
+            try:
+                line = json.loads(raw)
+                custom_id = line.get("custom_id")
+                if not custom_id:
+                    raise ValueError("line has no custom_id")
+                meta = store.request_meta(custom_id)
+                if meta is None:
+                    raise ValueError("unknown custom_id (not prepared in this store)")
+                plan = _plan_from_line(line)
+                codes = parse_plan(plan)
+                check_plan_codes(codes)
+            except Exception as e:
+                conn.execute(
+                    "INSERT OR REPLACE INTO errors VALUES (?, ?, ?, ?)",
+                    (source, n, custom_id, f"{type(e).__name__}: {e}"),
+                )
+                counts["errors"] += 1
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (custom_id, plan, json.dumps(codes, ensure_ascii=False), source, n, time.time()),
+                )
+                if plan_cache is not None:
+                    plan_cache.put(custom_id, meta[0], meta[1], meta[2], plan, codes)
+                counts["ok"] += 1
+            pending += 1
+            if pending >= commit_every:
+                checkpoint(n)
+                pending = 0
+    checkpoint(max(n, start))
+    return counts
@@ -0,0 +1,206 @@
+# rag/plan_cache.py
+"""
+Persistent cache of planner responses.
+
+A plan is stored under sha256 of `(prompt, model, temperature, registry
+version)`: the exact prompt the LLM would see (the RAG-assembled prompt in
+direct/stream mode, agent + task text in crew mode), so a registry edit or a
+different model never serves a stale plan. Each entry holds the raw Markdown
+plan and its parsed `codes_output`.
+
+Entries older than `PLAN_CACHE_TTL_SECONDS` (0 = never) are treated as misses
+and purged; above `PLAN_CACHE_MAX_ENTRIES` the least recently used entries are
+evicted. Lookups and hits are counted per process (`hits` / `misses`) and in
+the file, so `stats` reports the hit rate across runs. `PLAN_CACHE=0` (or
+`use_cache=False` in `planner.plan_workflow`) bypasses the cache entirely.
+
+    python rag/plan_cache.py stats
+    python rag/plan_cache.py purge      # drop expired entries
+    python rag/plan_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH", os.path.join(_REPO_ROOT, ".cache", "plans.sqlite"))
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE", "1") not in ("0", "false", "False")
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "10000"))
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS plans (
+        key              TEXT    PRIMARY KEY,
+        model            TEXT    NOT NULL,
+        temperature      REAL    NOT NULL,
+        registry_version TEXT    NOT NULL,
+        workflow_plan    TEXT    NOT NULL,
+        codes_output     TEXT    NOT NULL,
+        created_at       REAL    NOT NULL,
+        last_used        REAL    NOT NULL,
+        hits             INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS plans_last_used ON plans (last_used)",
+    """
+    CREATE TABLE IF NOT EXISTS counters (
+        name  TEXT    PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def plan_key(prompt: str, model: str, temperature: float, registry_version: str) -> str:
+    raw = "\x1f".join([prompt, model, repr(float(temperature)), registry_version or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: float = PLAN_CACHE_TTL_SECONDS,
+        max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path or PLAN_CACHE_PATH
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # shared by planner worker threads; every statement runs under _lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "PlanCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _count(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+
+    def _expired_before(self, now: float) -> float:
+        return now - self.ttl_seconds if self.ttl_seconds > 0 else float("-inf")
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(workflow_plan, codes_output) or None on a miss / expired entry."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT workflow_plan, codes_output, created_at FROM plans WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[2] < self._expired_before(now):
+                self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+                row = None
+            self._count("lookups")
+            if not row:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE plans SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._count("hits")
+        self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(
+        self,
+        key: str,
+        model: str,
+        temperature: float,
+        registry_version: str,
+        workflow_plan: str,
+        codes_output: Dict[str, Any],
+    ) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, model, float(temperature), registry_version or "", workflow_plan,
+                 json.dumps(codes_output, ensure_ascii=False), now, now),
+            )
+            self._conn.execute("DELETE FROM plans WHERE created_at < ?", (self._expired_before(now),))
+            if self.max_entries > 0:
+                # LRU: keep the max_entries most recently used
+                self._conn.execute(
+                    "DELETE FROM plans WHERE key IN ("
+                    " SELECT key FROM plans ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def purge(self) -> int:
+        """Drop expired entries; returns how many."""
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM plans WHERE created_at < ?", (self._expired_before(time.time()),))
+            return cur.rowcount
+
+    def clear(self) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM plans")
+            self._conn.execute("DELETE FROM counters")
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size, served = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(workflow_plan) + LENGTH(codes_output)), 0), "
+                "COALESCE(SUM(hits), 0) FROM plans"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters"))
+            by_model = list(
+                self._conn.execute(
+                    "SELECT model, temperature, COUNT(*), SUM(hits) FROM plans "
+                    "GROUP BY model, temperature ORDER BY model, temperature"
+                )
+            )
+        lookups = counters.get("lookups", 0)
+        hits = counters.get("hits", 0)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits_on_entries": served,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "by_model": by_model,
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect or clean the planner response cache.")
+    parser.add_argument("--cache", default=None, help=f"cache file (default: {PLAN_CACHE_PATH})")
+    parser.add_argument("cmd", choices=["stats", "purge", "clear"])
+    args = parser.parse_args(argv)
+
+    with PlanCache(args.cache) as cache:
+        if args.cmd == "stats":
+            s = cache.stats()
+            print(f"📦 {cache.path}")
+            print(f"   {s['entries']} plans, {s['bytes'] / 1024:.1f} KiB; "
+                  f"{s['hits']}/{s['lookups']} lookups hit ({s['hit_rate']:.1%})")
+            for model, temperature, n, hits in s["by_model"]:
+                print(f"   {model} t={temperature:g}: {n} plans, {hits} hits")
+        elif args.cmd == "purge":
+            print(f"🧹 Dropped {cache.purge()} expired plan(s)")
+        else:
+            print(f"🧹 Cleared {cache.clear()} plan(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# rag/plan_parser.py
+"""
+Single-pass parser for the Markdown workflow plans the planner LLM writes.
+
+`parse_plan(text)` returns the `codes_output` dict consumed downstream
+(trigger, events, conditions, flow_sequence, binary_branches,
+sequence_logic_blocks, domino_containers, loop_internal_events).
+
+`PlanParser` is a line-at-a-time state machine: every line is classified once
+(heading / numbered flow step / ↳ branch / → nested branch / other) and
+handled by the state of the current section (Trigger, Events, Flow Sequence).
+All patterns are compiled at import, and the scans for standalone codes only
+run on lines that can contain one. The output is identical to the parser that
+used to live inline in `planner.plan_workflow`; `data/plan_golden/` holds
+plans with the outputs that parser produced.
+
+Fed a token stream with `feed(delta)`, `PlanParser` parses each line as soon
+as it is complete and returns `PlanRecord`s (trigger, event, condition, step, branch)
+for what that line added; `result()` after `close()` equals `parse_plan()`
+of the whole text.
+
+    python rag/plan_parser.py plan.md      # print codes_output as JSON
+"""
+import json
+import logging
+import re
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRIGGER = "Trigger"
+EVENTS = "Events"
+FLOW = "Flow Sequence"
+
+# `code: X`, `trigger_code: X`, ... – the label is optional, so any `: WORD`
+_CODE_AFTER_COLON = re.compile(r":\s*([A-Za-z0-9_]+)")
+_TRIGGER_CODE = re.compile(r"TRG_[A-Z_]+")
+_EVENT_CODE = re.compile(r"EVNT_[A-Z_]+")
+_CONDITION_CODE = re.compile(r"CNDN_[A-Z_]+")
+
+_STANDALONE_EVENT = re.compile(r"\b(EVNT_[A-Z_]+)\b")
+_STANDALONE_TRIGGER = re.compile(r"\b(TRG_[A-Z_]+)\b")
+_STANDALONE_CONDITION = re.compile(r"\b(CNDN_[A-Z_]+|cndn_[a-z_]+)\b")
+
+_NUMBERED_ITEM = re.compile(r"^\s*\d+\.\s*.+\([A-Z_]+\)")
+_BRANCH_START = re.compile(r"^\s*↳\s*(IF TRUE|IF FALSE|INSIDE LOOP|Logic Block|Container)")
+_FLOW_STEP = re.compile(r"^\s*\d+\.\s*([^\(]+?)\s*\((\w+)\)\s*$")
+_BRANCH = re.compile(
+    r"^\s*↳\s*(IF TRUE|IF FALSE|INSIDE LOOP|Logic Block \d+|Container \d+)\s*(?:\(([A-Z_]+)\))?:\s*(.+?)(?:\s*→\s*(.+))?$"
+)
+_NESTED = re.compile(r"^\s*→\s*(IF|ELSE):\s*(.+?)(?:\s*\(([A-Z_]+)\))?(?:\s*→\s*(.+))?")
+_TRAILING_CODE = re.compile(r"\(([A-Z_]+)\)$")
+_EVENT_IN_PARENS = re.compile(r"\(EVNT_[A-Z_]+\)")
+
+
+@dataclass(frozen=True)
+class PlanRecord:
+    kind: str                       # trigger | event | condition | step | branch
+    code: Optional[str]             # None for a nested branch without an event
+    line: int                       # 1-based line of the plan that produced it
+    step: Optional[str] = None      # step description / flow code the branch belongs to
+    branch: Optional[str] = None    # IF TRUE, IF FALSE, INSIDE LOOP, Logic Block n, Container n, IF, ELSE
+
+
+def _heading_section(line: str) -> Optional[str]:
+    lower = line.lower()
+    if "trigger" in lower and "detail" not in lower:
+        return TRIGGER
+    if "events" in lower or "actions" in lower:
+        return EVENTS
+    # Conditions / logic step headings are read as part of the flow sequence
+    if "condition" in lower and "flow" not in lower:
+        return FLOW
+    if "flow" in lower and "sequence" in lower:
+        return FLOW
+    return None
+
+
+class PlanParser:
+    """
+    Feed the plan line by line with `feed_line()` (or as stream deltas with
+    `feed()` + `close()`), then call `result()`.
+    """
+
+    def __init__(self, records: bool = False):
+        self.line_no = 0
+        self._buffer = ""
+        self._records: Optional[List[PlanRecord]] = [] if records else None
+        self.section: Optional[str] = None
+        self.trigger: Optional[str] = None
+        self.events: List[str] = []
+        self.conditions: List[str] = []
+        self.flow_sequence: List[Dict[str, Any]] = []
+
+    # ---- collected codes ----
+    def _emit(self, kind: str, code: Optional[str], **detail: Any) -> None:
+        if self._records is not None:
+            self._records.append(PlanRecord(kind, code, self.line_no, **detail))
+
+    def _set_trigger(self, code: str) -> None:
+        self.trigger = code
+        self._emit("trigger", code)
+
+    def _add_event(self, code: str) -> None:
+        if code not in self.events:
+            self.events.append(code)
+            self._emit("event", code)
+
+    def _add_condition(self, code: str) -> None:
+        code = code.upper()
+        if code not in self.conditions:
+            self.conditions.append(code)
+            self._emit("condition", code)
+
+    # ---- stream input ----
+    def feed(self, delta: str) -> List[PlanRecord]:
+        """
+        Add a chunk of streamed text; every line it completes is parsed.
+        Returns the records those lines produced (needs records=True).
+        """
+        self._buffer += delta
+        if "\n" in delta:
+            *lines, self._buffer = self._buffer.split("\n")
+            for line in lines:
+                self.feed_line(line)
+        return self._drain()
+
+    def close(self) -> List[PlanRecord]:
+        """Parse the trailing (unterminated) line once the stream ends."""
+        line, self._buffer = self._buffer, ""
+        self.feed_line(line)
+        return self._drain()
+
+    def _drain(self) -> List[PlanRecord]:
+        if not self._records:
+            return []
+        out, self._records = self._records, []
+        return out
+
+    # ---- per line ----
+    def feed_line(self, line: str) -> None:
+        self.line_no += 1
+        line = line.strip()
+        if line.startswith("#"):
+            self.section = _heading_section(line) or self.section
+        section = self.section
+
+        if section == TRIGGER:
+            if not self.trigger and ":" in line:
+                for code in _CODE_AFTER_COLON.findall(line):
+                    if _TRIGGER_CODE.match(code):
+                        self._set_trigger(code)
+                        break
+            if not self.trigger and "TRG_" in line:
+                found = _STANDALONE_TRIGGER.findall(line)
+                if found:
+                    self._set_trigger(found[0])
+        elif section == EVENTS:
+            if ":" in line:
+                for code in _CODE_AFTER_COLON.findall(line):
+                    if _EVENT_CODE.match(code):
+                        self._add_event(code)
+            if "EVNT_" in line:
+                for code in _STANDALONE_EVENT.findall(line):
+                    self._add_event(code)
+
+        if section == EVENTS or "cndn_bin" in line.lower():
+            if "CNDN_" in line or "cndn_" in line:
+                for code in _STANDALONE_CONDITION.findall(line):
+                    self._add_condition(code)
+
+        if section is None and (_NUMBERED_ITEM.match(line) or _BRANCH_START.match(line)):
+            self.section = section = FLOW
+
+        if section != FLOW:
+            return
+
+        step = _FLOW_STEP.match(line)
+        if step:
+            self._flow_step(*step.groups())
+            return
+
+        if line.startswith("↳"):
+            branch = _BRANCH.match(line)
+            if branch:
+                if not self.flow_sequence:
+                    logger.warning(f"  ⚠️ Branch found but flow_sequence is empty: {line}")
+                    return
+                self._branch(line, *branch.groups())
+                return
+
+        if line.startswith("→") and self.flow_sequence:
+            nested = _NESTED.match(line)
+            if nested:
+                self._nested(*nested.groups())
+
+    def _flow_step(self, description: str, code: str) -> None:
+        is_trigger = _TRIGGER_CODE.match(code)
+        is_event = _EVENT_CODE.match(code)
+        is_condition = _CONDITION_CODE.match(code.upper())
+        if not (is_trigger or is_event or is_condition):
+            return
+
+        self.flow_sequence.append({"step": description.strip(), "code": code, "branches": {}})
+        self._emit("step", code, step=description.strip())
+        if is_trigger:
+            if not self.trigger:
+                self._set_trigger(code)
+        elif is_event:
+            self._add_event(code)
+        else:
+            self._add_condition(code)
+
+    def _branch(
+        self,
+        line: str,
+        branch_type: str,
+        condition_code: Optional[str],
+        description: str,
+        flow_dest: Optional[str],
+    ) -> None:
+        event_code = None
+        if flow_dest:
+            m = _TRAILING_CODE.search(flow_dest)
+            if m:
+                event_code = m.group(1)
+        if not event_code and condition_code and condition_code.startswith("EVNT_"):
+            event_code = condition_code
+
+        is_logic_block = "Logic Block" in branch_type
+        last_item = self.flow_sequence[-1]
+        if is_logic_block:
+            # logic blocks belong to the closest CNDN_SEQ
+            for item in reversed(self.flow_sequence):
+                if item.get("code") == "CNDN_SEQ":
+                    last_item = item
+                    break
+        branches = last_item["branches"]
+
+        if event_code:
+            self._add_event(event_code)
+            desc = description.strip()
+            if branch_type == "IF TRUE":
+                branches["if_true"] = event_code
+                branches["if_true_desc"] = desc
+            elif branch_type == "IF FALSE":
+                branches["if_false"] = event_code
+                branches["if_false_desc"] = desc
+            elif branch_type == "INSIDE LOOP":
+                branches.setdefault("loop_internal", []).append({"event": event_code, "description": desc})
+            elif is_logic_block:
+                branches.setdefault("logic_blocks", []).append(
+                    {"event": event_code, "description": desc + (" → " + flow_dest if flow_dest else "")}
+                )
+            elif "Container" in branch_type:
+                branches.setdefault("containers", []).append({"event": event_code, "description": desc})
+            self._emit("branch", event_code, step=last_item["code"], branch=branch_type)
+            return
+
+        # no event code: "route to END", or a logic block naming its event elsewhere
+        if "route to end" in description.lower() or "END" in (flow_dest.upper() if flow_dest else ""):
+            if branch_type == "IF FALSE":
+                branches["if_false"] = "END"
+                branches["if_false_desc"] = "Route to END"
+            elif branch_type == "IF TRUE":
+                branches["if_true"] = "END"
+                branches["if_true_desc"] = "Route to END"
+            else:
+                return
+            self._emit("branch", "END", step=last_item["code"], branch=branch_type)
+        elif is_logic_block:
+            m = _EVENT_IN_PARENS.search(line)
+            if m:
+                event = m.group(0)[1:-1]
+                self._add_event(event)
+                branches.setdefault("logic_blocks", []).append(
+                    {"event": event, "description": description.strip() + (" → " + flow_dest if flow_dest else "")}
+                )
+                self._emit("branch", event, step=last_item["code"], branch=branch_type)
+
+    def _nested(
+        self,
+        branch_type: str,
+        description: str,
+        event_code: Optional[str],
+        flow_dest: Optional[str],
+    ) -> None:
+        last_item = self.flow_sequence[-1]
+        containers = last_item["branches"].get("containers")
+        if not containers:
+            return
+        containers[-1].setdefault("nested", []).append(
+            {
+                "branch_type": branch_type.strip(),
+                "description": description.strip(),
+                "event": event_code if event_code else None,
+                "flow_dest": flow_dest.strip() if flow_dest else None,
+            }
+        )
+        if event_code:
+            self._add_event(event_code)
+        self._emit("branch", event_code, step=last_item["code"], branch=branch_type.strip())
+
+    # ---- final codes_output ----
+    def result(self) -> Dict[str, Any]:
+        """
+        codes_output for everything fed so far. Does not change the parser
+        state, so it can be called again after more lines are fed.
+        """
+        events = list(self.events)
+        flow_sequence = self.flow_sequence
+        if not flow_sequence:
+            logger.warning("Flow sequence is empty, constructing from collected components")
+            flow_sequence = []
+            if self.trigger:
+                flow_sequence.append(
+                    {"step": f"Trigger on {self.trigger.lower().replace('_', ' ')}", "code": self.trigger, "branches": {}}
+                )
+            for condition in self.conditions:
+                flow_sequence.append({"step": f"Evaluate condition {condition}", "code": condition, "branches": {}})
+            for event in events:
+                flow_sequence.append({"step": f"Execute event {event}", "code": event, "branches": {}})
+        else:
+            flow_sequence = list(flow_sequence)
+        return build_codes_output(self.trigger or "UNKNOWN", events, list(self.conditions), flow_sequence)
+
+
+def build_codes_output(
+    trigger: str, events: List[str], conditions: List[str], flow_sequence: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    codes_output from collected codes and flow steps: derives the per-condition
+    summaries (binary_branches, sequence_logic_blocks, ...) from the branches.
+    Shared with rag/plan_schema.py, which builds flow steps from JSON plans.
+    """
+    events = list(events)
+    binary_branches: Dict[str, Any] = {}
+    sequence_logic_blocks: List[Dict[str, Any]] = []
+    domino_containers: List[str] = []
+    loop_internal_events: List[str] = []
+
+    for step in flow_sequence:
+        code = step.get("code", "")
+        branches = step.get("branches", {})
+        if code == "CNDN_BIN":
+            else_branch = branches.get("if_false")
+            binary_branches = {
+                "if_branch": branches.get("if_true"),
+                "else_branch": else_branch,
+                "has_explicit_else": else_branch is not None and else_branch != "END",
+                "if_branch_desc": branches.get("if_true_desc", ""),
+                "else_branch_desc": branches.get("if_false_desc", ""),
+            }
+        elif code == "CNDN_SEQ":
+            sequence_logic_blocks = []
+            for idx, lb in enumerate(branches.get("logic_blocks", []), start=1):
+                event = lb.get("event")
+                sequence_logic_blocks.append(
+                    {"logic_id": f"logic_{idx}", "description": lb.get("description"), "event": event, "next": "END"}
+                )
+                if event and event not in events:
+                    events.append(event)
+        elif code == "CNDN_DOM":
+            domino_containers = [c["event"] for c in branches.get("containers", []) if "event" in c]
+        elif code == "EVNT_LOOP_FOR":
+            loop_internal_events = [le["event"] for le in branches.get("loop_internal", []) if "event" in le]
+
+    return {
+        "trigger": trigger,
+        "events": events,
+        "conditions": conditions,
+        "flow_sequence": flow_sequence,
+        "binary_branches": binary_branches,
+        "sequence_logic_blocks": sequence_logic_blocks,
+        "domino_containers": domino_containers,
+        "loop_internal_events": loop_internal_events,
+    }
+
+
+def parse_plan(workflow_plan: str) -> Dict[str, Any]:
+    """codes_output for a complete Markdown workflow plan."""
+    parser = PlanParser()
+    for line in workflow_plan.split("\n"):
+        parser.feed_line(line)
+    codes_output = parser.result()
+    logger.info(
+        f"Parsed plan: trigger={codes_output['trigger']} events={codes_output['events']} "
+        f"conditions={codes_output['conditions']} flow_sequence={len(codes_output['flow_sequence'])}"
+    )
+    return codes_output
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python rag/plan_parser.py PLAN.md")
+        return
+    with open(argv[0], "r", encoding="utf-8") as f:
+        print(json.dumps(parse_plan(f.read()), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# rag/plan_schema.py
+"""
+JSON workflow plans: the schema the planner's "json" mode asks the model for,
+validation, conversion to `codes_output` and a locally rendered Markdown plan.
+
+A plan is the trigger, the events and conditions it uses, and the flow steps
+between Start and End. Each step may carry branches:
+
+    IF_TRUE / IF_FALSE   binary condition outcomes (no event = route to END;
+                         `loop_events` when the branch runs a For Loop)
+    LOGIC_BLOCK          one check of a sequence condition (CNDN_SEQ)
+    CONTAINER            one container of a domino condition (CNDN_DOM) with
+                         its nested IF / ELSE routes
+    INSIDE_LOOP          an event inside a For Loop step (EVNT_LOOP_FOR)
+
+`PLAN_SCHEMA` is strict-mode compatible (every property required, no extra
+properties), so it can be sent as a `json_schema` response format. It is
+compiled once at import into nested checker functions (the schema keywords
+it uses only), which validate a plan several times faster than a general
+JSON Schema library. `load_plan()` also checks that branch types fit their
+step and raises `PlanValidationError` listing the problems.
+
+`to_codes_output()` goes through `rag.plan_parser.build_codes_output`, the
+same post-pass the Markdown parser uses, and `render_markdown()` writes the
+plan in the Markdown format the planner prompt describes; parsing that
+Markdown with `parse_plan` gives the same codes (scripts/check_plan_schema.py).
+
+    python rag/plan_schema.py plan.json            # codes_output as JSON
+    python rag/plan_schema.py plan.json --markdown
+"""
+import argparse
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from rag.plan_parser import build_codes_output
+
+BRANCH_TYPES = ("IF_TRUE", "IF_FALSE", "LOGIC_BLOCK", "CONTAINER", "INSIDE_LOOP")
+
+# branch type -> the step codes it may hang off
+_BRANCH_PARENTS = {
+    "IF_TRUE": ("CNDN_BIN",),
+    "IF_FALSE": ("CNDN_BIN",),
+    "LOGIC_BLOCK": ("CNDN_SEQ",),
+    "CONTAINER": ("CNDN_DOM", "CNDN_LGC_DOM"),
+    "INSIDE_LOOP": ("EVNT_LOOP_FOR",),
+}
+
+
+def _obj(properties: Dict[str, Any], description: str = "") -> Dict[str, Any]:
+    schema = {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+    if description:
+        schema["description"] = description
+    return schema
+
+
+def _code(prefix: str, nullable: bool = False) -> Dict[str, Any]:
+    return {"type": ["string", "null"] if nullable else "string", "pattern": f"^{prefix}[A-Z0-9_]*$"}
+
+
+_TEXT = {"type": "string"}
+
+PLAN_SCHEMA: Dict[str, Any] = _obj(
+    {
+        "trigger": _obj({"code": _code("TRG_"), "name": _TEXT}),
+        "events": {"type": "array", "items": _obj({"code": _code("EVNT_"), "name": _TEXT})},
+        "conditions": {"type": "array", "items": _obj({"code": _code("CNDN_"), "name": _TEXT})},
+        "flow": {
+            "type": "array",
+            "description": "Steps between Start and End, in order (the trigger step is implied).",
+            "items": {"$ref": "#/$defs/step"},
+        },
+    }
+)
+PLAN_SCHEMA["$defs"] = {
+    "step": _obj(
+        {
+            "description": _TEXT,
+            "code": _code("(TRG|EVNT|CNDN)_"),
+            "branches": {"type": "array", "items": {"$ref": "#/$defs/branch"}},
+        }
+    ),
+    "branch": _obj(
+        {
+            "type": {"type": "string", "enum": list(BRANCH_TYPES)},
+            "description": _TEXT,
+            "event": _code("EVNT_", nullable=True),
+            "loop_events": {
+                "type": "array",
+                "description": "Events inside the loop when this branch's event is EVNT_LOOP_FOR.",
+                "items": _obj({"code": _code("EVNT_"), "description": _TEXT}),
+            },
+            "nested": {
+                "type": "array",
+                "description": "IF / ELSE routes of a CONTAINER.",
+                "items": _obj(
+                    {
+                        "type": {"type": "string", "enum": ["IF", "ELSE"]},
+                        "description": _TEXT,
+                        "event": _code("EVNT_", nullable=True),
+                        "flow_dest": {"type": ["string", "null"]},
+                    }
+                ),
+            },
+        }
+    ),
+}
+
+
+class PlanValidationError(ValueError):
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+# ---- validation ----
+# PLAN_SCHEMA only uses type / enum / pattern / properties / required /
+# additionalProperties / items / $ref, so it is compiled once into nested
+# checker functions instead of being interpreted per plan.
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def _compile(schema: Dict[str, Any], defs: Dict[str, Any], compiled: Dict[str, Any]):
+    if "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        if name not in compiled:
+            compiled[name] = None  # recursion guard; filled in below
+            compiled[name] = _compile(defs[name], defs, compiled)
+        return lambda value, path, errors: compiled[name](value, path, errors)
+
+    types = schema.get("type")
+    allowed = tuple(_TYPES[t] for t in ([types] if isinstance(types, str) else types or []))
+    type_name = types if isinstance(types, str) else " or ".join(types or [])
+    enum = schema.get("enum")
+    pattern = re.compile(schema["pattern"]) if "pattern" in schema else None
+    props = {k: _compile(v, defs, compiled) for k, v in schema.get("properties", {}).items()}
+    required = schema.get("required", [])
+    closed = schema.get("additionalProperties") is False
+    items = _compile(schema["items"], defs, compiled) if "items" in schema else None
+
+    def check(value, path: str, errors: List[str]) -> None:
+        if allowed and not isinstance(value, allowed):
+            errors.append(f"{path or '<root>'}: expected {type_name}, got {type(value).__name__}")
+            return
+        if enum is not None and value not in enum:
+            errors.append(f"{path or '<root>'}: {value!r} is not one of {enum}")
+        if pattern is not None and isinstance(value, str) and not pattern.match(value):
+            errors.append(f"{path or '<root>'}: {value!r} does not match {pattern.pattern!r}")
+        if isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path or '<root>'}: missing {key!r}")
+            for key, item in value.items():
+                sub = props.get(key)
+                if sub is not None:
+                    sub(item, f"{path}/{key}" if path else key, errors)
+                elif closed:
+                    errors.append(f"{path or '<root>'}: unexpected property {key!r}")
+        elif items is not None and isinstance(value, list):
+            for i, item in enumerate(value):
+                items(item, f"{path}/{i}" if path else str(i), errors)
+
+    return check
+
+
+_check_plan = _compile(PLAN_SCHEMA, PLAN_SCHEMA["$defs"], {})
+
+
+def validate_plan(plan: Any) -> List[str]:
+    """Every schema and structure problem of `plan` (empty when valid)."""
+    errors: List[str] = []
+    _check_plan(plan, "", errors)
+    if errors:
+        return errors
+    for i, step in enumerate(plan["flow"]):
+        for j, branch in enumerate(step["branches"]):
+            parents = _BRANCH_PARENTS[branch["type"]]
+            if step["code"] not in parents:
+                errors.append(f"flow/{i}/branches/{j}: {branch['type']} branch under {step['code']} "
+                              f"(expected {' or '.join(parents)})")
+            if branch["nested"] and branch["type"] != "CONTAINER":
+                errors.append(f"flow/{i}/branches/{j}: nested routes only belong to CONTAINER branches")
+    return errors
+
+
+def load_plan(text: str) -> Dict[str, Any]:
+    """Parse and validate the model's JSON reply."""
+    try:
+        plan = json.loads(text)
+    except ValueError as e:
+        raise PlanValidationError([f"invalid JSON: {e}"])
+    errors = validate_plan(plan)
+    if errors:
+        raise PlanValidationError(errors)
+    return plan
+
+
+# ---- codes_output ----
+def _branch_entries(branches: Dict[str, Any], branch: Dict[str, Any], names: Dict[str, str], events: List[str]) -> None:
+    kind, desc, event = branch["type"], branch["description"], branch["event"]
+    if event and event not in events:
+        events.append(event)
+    if kind in ("IF_TRUE", "IF_FALSE"):
+        key = "if_true" if kind == "IF_TRUE" else "if_false"
+        branches[key] = event or "END"
+        branches[key + "_desc"] = desc if event else "Route to END"
+        for inner in branch["loop_events"]:
+            if inner["code"] not in events:
+                events.append(inner["code"])
+            branches.setdefault("loop_internal", []).append(
+                {"event": inner["code"], "description": inner["description"]}
+            )
+    elif not event:
+        return
+    elif kind == "INSIDE_LOOP":
+        branches.setdefault("loop_internal", []).append({"event": event, "description": desc})
+    elif kind == "LOGIC_BLOCK":
+        branches.setdefault("logic_blocks", []).append(
+            {"event": event, "description": f"{desc} → {names.get(event, event)} ({event})"}
+        )
+    else:
+        container: Dict[str, Any] = {"event": event, "description": desc}
+        if branch["nested"]:
+            container["nested"] = [
+                {"branch_type": n["type"], "description": n["description"], "event": n["event"], "flow_dest": n["flow_dest"]}
+                for n in branch["nested"]
+            ]
+        branches.setdefault("containers", []).append(container)
+
+
+def to_codes_output(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """codes_output (the `rag.plan_parser.parse_plan` shape) of a valid plan."""
+    trigger = plan["trigger"]["code"]
+    names = {e["code"]: e["name"] for e in plan["events"]}
+    events: List[str] = []
+    conditions: List[str] = []
+    for e in plan["events"]:
+        if e["code"] not in events:
+            events.append(e["code"])
+    for c in plan["conditions"]:
+        if c["code"] not in conditions:
+            conditions.append(c["code"])
+
+    flow_sequence = [{"step": "Trigger", "code": trigger, "branches": {}}]
+    for step in plan["flow"]:
+        code = step["code"]
+        if code.startswith("EVNT_") and code not in events:
+            events.append(code)
+        elif code.startswith("CNDN_") and code not in conditions:
+            conditions.append(code)
+        item = {"step": step["description"], "code": code, "branches": {}}
+        for branch in step["branches"]:
+            _branch_entries(item["branches"], branch, names, events)
+        flow_sequence.append(item)
+    return build_codes_output(trigger, events, conditions, flow_sequence)
+
+
+# ---- Markdown ----
+def render_markdown(plan: Dict[str, Any]) -> str:
+    names = {e["code"]: e["name"] for e in plan["events"]}
+
+    def action(code: str) -> str:
+        return f"{names.get(code, code)} ({code})"
+
+    trigger = plan["trigger"]
+    lines = ["# Workflow Plan", "", "## Trigger", f"- {trigger['name']} — trigger_code: {trigger['code']}", "", "## Events"]
+    lines += [f"- {e['name']} — code: {e['code']}" for e in plan["events"]]
+    if plan["conditions"]:
+        lines += ["", "## Conditions"]
+        lines += [f"- {c['name']} — condition_code: {c['code']}" for c in plan["conditions"]]
+    lines += ["", "## Flow Sequence", f"1. Trigger ({trigger['code']})", "2. Start"]
+
+    n = 2
+    for step in plan["flow"]:
+        n += 1
+        lines.append(f"{n}. {step['description']} ({step['code']})")
+        blocks = containers = 0
+        for branch in step["branches"]:
+            kind, desc, event = branch["type"], branch["description"], branch["event"]
+            if kind in ("IF_TRUE", "IF_FALSE"):
+                label = "IF TRUE" if kind == "IF_TRUE" else "IF FALSE"
+                lines.append(f"   ↳ {label}: {desc} → {action(event)}" if event else f"   ↳ {label}: Route to END")
+                lines += [f"      ↳ INSIDE LOOP: {i['description']} → {action(i['code'])}" for i in branch["loop_events"]]
+            elif kind == "LOGIC_BLOCK":
+                blocks += 1
+                lines.append(f"   ↳ Logic Block {blocks} (CNDN_LGC): {desc} → {action(event)}" if event
+                             else f"   ↳ Logic Block {blocks} (CNDN_LGC): {desc}")
+            elif kind == "CONTAINER":
+                containers += 1
+                lines.append(f"   ↳ Container {containers} (CNDN_LGC_DOM): {desc} → {action(event)}" if event
+                             else f"   ↳ Container {containers} (CNDN_LGC_DOM): {desc}")
+                for route in branch["nested"]:
+                    text = f"{route['description']} ({route['event']})" if route["event"] else route["description"]
+                    dest = f" → {route['flow_dest']}" if route["flow_dest"] else ""
+                    lines.append(f"      → {route['type']}: {text}{dest}")
+            else:
+                lines.append(f"   ↳ INSIDE LOOP: {desc} → {action(event)}" if event else f"   ↳ INSIDE LOOP: {desc}")
+        if step["code"] == "EVNT_LOOP_FOR":
+            n += 1
+            lines.append(f"{n}. Loop End")
+    lines.append(f"{n + 1}. End")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Validate a JSON workflow plan and convert it.")
+    parser.add_argument("plan", help="JSON plan file")
+    parser.add_argument("--markdown", action="store_true", help="print the rendered Markdown plan instead")
+    args = parser.parse_args(argv)
+
+    with open(args.plan, "r", encoding="utf-8") as f:
+        plan = load_plan(f.read())
+    if args.markdown:
+        print(render_markdown(plan), end="")
+    else:
+        print(json.dumps(to_codes_output(plan), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
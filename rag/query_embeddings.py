@@ -6,11 +6,13 @@ import chromadb
 from chromadb.config import Settings
 from openai import OpenAI
 
+from rag.manifest import active_index
+
 load_dotenv()
 
 # ---- Config ----
 CHROMA_DIR = os.getenv("CHROMA_DIR", ".chroma")
-COLLECTION_NAME = os.getenv("CHROMA_COLLECTION")
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "rag_chunks_v1")
 
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
 TOP_K = int(os.getenv("QUERY_TOP_K", "8"))
@@ -32,7 +34,7 @@ def main():
         path=CHROMA_DIR,
         settings=Settings(anonymized_telemetry=False),
     )
-    col = chroma.get_collection(name=COLLECTION_NAME)
+    col = chroma.get_collection(name=active_index(CHROMA_DIR, COLLECTION_NAME).collection)
 
     query = input("Enter query: ").strip()
     if not query:
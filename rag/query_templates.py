@@ -0,0 +1,431 @@
+# rag/query_templates.py
+"""
+Template-level plan cache: one LLM plan per query *shape*.
+
+`mask_query()` replaces the literals of a query with numbered slots:
+
+    create user Abishek with role admin   ->  create user <NAME_1> with role <VAL_1>
+    create user Priya with role manager   ->  (same template)
+
+Slots are quoted strings (STR), e-mail addresses (EMAIL), values after a known
+field name (VAL: `role admin`, `status is approved`, `department: IT`),
+numbers (NUM) and capitalised names (NAME). Capitalised workflow vocabulary
+is never a name: the words of every code catalog name and description
+(`rag.catalog`: "Push", "Webhook", "SMS", ...) plus a short list of others
+("Slack", "Approve", "Manager", ...), so "send Slack message" and "send
+Webhook message" stay different templates. The template text, planner mode,
+model, temperature and registry version form the cache key.
+
+On a lookup the cached plan is re-filled: each span of the Markdown that
+echoes a slot value of the query that produced it (same case, whole word) is
+replaced by the new query's value. Codes, list numbering, `Logic Block n` /
+`Container n` labels and step / event names (the text right before a
+`(CODE)`) are never touched. The result is re-parsed with `rag.plan_parser`,
+so `codes_output` follows the Markdown. The planner falls back to the LLM
+when the template is low confidence (`QUERY_TEMPLATE_MIN_CONFIDENCE`: name
+guesses, too few literal words), a changed value is not found in the cached
+plan, or the re-filled plan differs from the cached one in anything but the
+slot values: its codes, step names or descriptions.
+
+Lookups, hits, misses and fallbacks are counted per template in the plan
+cache file (`PLAN_CACHE_PATH`); TTL and LRU limits are shared with
+`rag/plan_cache.py`.
+
+    python rag/query_templates.py mask "create user Priya with role manager"
+    python rag/query_templates.py stats [--top 20]
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from rag.plan_cache import PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_PATH, PLAN_CACHE_TTL_SECONDS, plan_key
+from rag.plan_parser import parse_plan
+
+QUERY_TEMPLATES_ENABLED = os.getenv("QUERY_TEMPLATES", "1") not in ("0", "false", "False")
+QUERY_TEMPLATE_MIN_CONFIDENCE = float(os.getenv("QUERY_TEMPLATE_MIN_CONFIDENCE", "0.7"))
+
+# field names whose following word is a value, not part of the workflow shape
+_FIELDS = (
+    "role", "roles", "department", "departments", "country", "countries", "status", "name",
+    "type", "priority", "stage", "category", "state", "level", "title", "group", "team",
+)
+_SLOT_PATTERNS: Tuple[Tuple[str, "re.Pattern"], ...] = (
+    ("STR", re.compile(r"\"[^\"]+\"|'[^']+'")),
+    ("EMAIL", re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")),
+    ("VAL", re.compile(
+        r"\b(?:%s)\b\s*(?::|=|\bis\b|\bas\b|\bto\b)?\s*(?P<v>[A-Za-z][\w-]*)" % "|".join(_FIELDS), re.I
+    )),
+    ("NUM", re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?!\w)")),
+    ("NAME", re.compile(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b")),
+)
+# capitalised words that are workflow vocabulary rather than names (besides the catalog's)
+_NOT_NAMES = {
+    "If", "When", "Then", "Else", "And", "Or", "Check", "Send", "Create", "Update", "Delete", "Get",
+    "Retrieve", "Filter", "Loop", "For", "Each", "While", "First", "Last", "Email", "Notification",
+    "Record", "Records", "Approved", "Rejected", "Pending", "High", "Low", "Medium", "True", "False",
+    "Approve", "Reject", "Notify", "Manager", "Admin", "Slack", "Teams", "Whatsapp", "Sms",
+}
+# connectives, negations and comparisons after a field name: "status is not approved" must
+# keep "not" in the template, or it would share the plan of "status is approved"
+_VAL_STOPWORDS = {
+    "is", "as", "to", "of", "the", "a", "an", "and", "or", "with", "from", "in", "if", "then", "field",
+    "not", "no", "never", "equal", "equals",
+}
+_NAME_WORD = re.compile(r"[A-Za-z]+")
+_SLOT_RE = re.compile(r"<(STR|EMAIL|VAL|NUM|NAME)_(\d+)>")
+_WORD_RE = re.compile(r"[a-z]+")
+_LABEL_PREFIX = re.compile(r"(?:Block|Container|Step)\s+$")
+_SENTENCE_END = re.compile(r"(?:^|[.!?:])\s*$")
+# a step / event name: the text between the last delimiter and a "(CODE)"
+_CODE_NAME = re.compile(r"[^\n→↳:()]*?\((?:TRG|EVNT|CNDN)_[A-Za-z0-9_]+\)")
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    text: str                          # normalised template, slots as <KIND_n>
+    slots: Tuple[Tuple[str, str], ...]  # (kind, literal) in slot order
+    confidence: float
+
+
+@lru_cache(maxsize=1)
+def _vocabulary() -> FrozenSet[str]:
+    """_NOT_NAMES plus every word of the catalog's code names and descriptions."""
+    from rag.catalog import get_catalog
+
+    words = set(_NOT_NAMES)
+    for entry in get_catalog():
+        words.update(_NAME_WORD.findall(entry.name))
+        words.update(_NAME_WORD.findall(entry.description))
+    return frozenset(words)
+
+
+def _name_spans(m: "re.Match") -> Iterator[Tuple[int, int]]:
+    """Runs of a capitalised match that contain no workflow vocabulary."""
+    vocabulary = _vocabulary()
+    run: Optional[Tuple[int, int]] = None
+    for w in _NAME_WORD.finditer(m.group(0)):
+        if w.group(0) in vocabulary:
+            if run:
+                yield run
+            run = None
+            continue
+        a, b = m.start() + w.start(), m.start() + w.end()
+        run = (run[0], b) if run else (a, b)
+    if run:
+        yield run
+
+
+def mask_query(query: str) -> QueryTemplate:
+    """Replace the literals of `query` with slots; see the module docstring."""
+    query = " ".join(query.split())
+    taken: List[Tuple[int, int, str]] = []
+
+    def free(a: int, b: int) -> bool:
+        return all(b <= s or a >= e for s, e, _ in taken)
+
+    for kind, pattern in _SLOT_PATTERNS:
+        for m in pattern.finditer(query):
+            if kind == "VAL":
+                a, b = m.span("v")
+                if m.group("v").lower() in _VAL_STOPWORDS:
+                    continue
+            else:
+                a, b = m.span()
+            if kind == "NAME":
+                if _SENTENCE_END.search(query[:a]):
+                    continue                      # just capitalised as a sentence start
+                spans = list(_name_spans(m))      # vocabulary words stay in the template
+            else:
+                spans = [(a, b)]
+            for a, b in spans:
+                if free(a, b):
+                    taken.append((a, b, kind))
+    taken.sort()
+
+    counts: Dict[str, int] = {}
+    parts: List[str] = []
+    slots: List[Tuple[str, str]] = []
+    pos = 0
+    for a, b, kind in taken:
+        counts[kind] = counts.get(kind, 0) + 1
+        parts.append(query[pos:a].lower())
+        parts.append(f"<{kind}_{counts[kind]}>")
+        literal = query[a:b]
+        slots.append((kind, literal[1:-1] if kind == "STR" else literal))
+        pos = b
+    parts.append(query[pos:].lower())
+    text = "".join(parts)
+
+    confidence = 1.0
+    confidence -= 0.1 * counts.get("NAME", 0)   # capitalisation is only a guess
+    if len(slots) > 6:
+        confidence -= 0.2
+    if len(_WORD_RE.findall(_SLOT_RE.sub(" ", text))) < 2:
+        confidence = 0.0                        # nothing but slots: no shape to reuse
+    return QueryTemplate(text, tuple(slots), max(0.0, round(confidence, 2)))
+
+
+def _signature(codes_output: Dict[str, Any]) -> Tuple:
+    return (
+        codes_output.get("trigger"),
+        tuple(codes_output.get("events") or ()),
+        tuple(codes_output.get("conditions") or ()),
+        tuple(step.get("code") for step in codes_output.get("flow_sequence") or ()),
+    )
+
+
+def _value_pattern(value: str) -> "re.Pattern":
+    return re.compile(r"(?<![\w])%s(?![\w])" % re.escape(value))
+
+
+def _masked(codes_output: Dict[str, Any], values: List[str]) -> str:
+    """codes_output with each value (whole word, same case) replaced by its slot index."""
+    text = json.dumps(codes_output, ensure_ascii=False, sort_keys=True)
+    for i, value in enumerate(values):
+        text = _value_pattern(value).sub(f"\x00{i}\x00", text)
+    return text
+
+
+def refill(
+    workflow_plan: str,
+    codes_output: Dict[str, Any],
+    source_slots: List[Tuple[str, str]],
+    target_slots: List[Tuple[str, str]],
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Re-fill a cached plan made for `source_slots` with `target_slots`.
+    None when it cannot be done safely.
+    """
+    if [k for k, _ in source_slots] != [k for k, _ in target_slots]:
+        return None
+    changes: Dict[str, str] = {}
+    for (_, old), (_, new) in zip(source_slots, target_slots):
+        if old == new:
+            continue
+        if changes.get(old, new) != new:
+            return None                           # one literal, two new values
+        changes[old] = new
+    if not changes:
+        return workflow_plan, codes_output
+
+    olds = list(changes)
+    news = [changes[old] for old in olds]
+    for values in (olds, news):
+        if len(set(values)) != len(values) or any(
+            a != b and a.lower() in b.lower() for a in values for b in values
+        ):
+            return None                           # overlapping literals
+
+    protected = [m.span() for m in _CODE_NAME.finditer(workflow_plan)]
+    spans: List[Tuple[int, int, str]] = []
+    for old in olds:
+        found = False
+        for m in _value_pattern(old).finditer(workflow_plan):
+            if any(a < m.end() and m.start() < b for a, b in protected):
+                continue                          # step / event name
+            if old.isdigit():
+                prefix = workflow_plan[workflow_plan.rfind("\n", 0, m.start()) + 1:m.start()]
+                if not prefix.strip() or _LABEL_PREFIX.search(prefix):
+                    continue                      # list numbering / block labels
+            spans.append((m.start(), m.end(), changes[old]))
+            found = True
+        if not found:
+            return None                           # value not echoed verbatim in the plan
+    spans.sort()
+
+    pieces: List[str] = []
+    pos = 0
+    for a, b, new in spans:
+        pieces.append(workflow_plan[pos:a])
+        pieces.append(new)
+        pos = b
+    pieces.append(workflow_plan[pos:])
+    text = "".join(pieces)
+
+    new_codes = parse_plan(text)
+    if _signature(new_codes) != _signature(codes_output):
+        return None
+    # names and descriptions must differ only where a slot value was swapped
+    if _masked(new_codes, news) != _masked(codes_output, olds):
+        return None
+    return text, new_codes
+
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS template_plans (
+        key           TEXT PRIMARY KEY,
+        template      TEXT NOT NULL,
+        slots         TEXT NOT NULL,
+        workflow_plan TEXT NOT NULL,
+        codes_output  TEXT NOT NULL,
+        created_at    REAL NOT NULL,
+        last_used     REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS template_stats (
+        key       TEXT    PRIMARY KEY,
+        template  TEXT    NOT NULL,
+        lookups   INTEGER NOT NULL DEFAULT 0,
+        hits      INTEGER NOT NULL DEFAULT 0,
+        misses    INTEGER NOT NULL DEFAULT 0,
+        fallbacks INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+)
+
+
+class TemplateCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        min_confidence: float = QUERY_TEMPLATE_MIN_CONFIDENCE,
+        ttl_seconds: float = PLAN_CACHE_TTL_SECONDS,
+        max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path or PLAN_CACHE_PATH
+        self.min_confidence = min_confidence
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "TemplateCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def _key(template: QueryTemplate, mode: str, model: str, temperature: float, registry_version: str) -> str:
+        return plan_key(f"{mode}\x1f{template.text}", model, temperature, registry_version)
+
+    def _count(self, key: str, template: QueryTemplate, outcome: str) -> None:
+        self._conn.execute(
+            f"INSERT INTO template_stats (key, template, lookups, {outcome}) VALUES (?, ?, 1, 1) "
+            f"ON CONFLICT(key) DO UPDATE SET lookups = lookups + 1, {outcome} = {outcome} + 1",
+            (key, template.text),
+        )
+
+    def lookup(
+        self, query: str, mode: str, model: str, temperature: float, registry_version: str
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(workflow_plan, codes_output) re-filled for `query`, or None."""
+        template = mask_query(query)
+        if not template.slots:
+            return None
+        key = self._key(template, mode, model, temperature, registry_version)
+        now = time.time()
+        with self._lock, self._conn:
+            if template.confidence < self.min_confidence:
+                self._count(key, template, "fallbacks")
+                return None
+            row = self._conn.execute(
+                "SELECT slots, workflow_plan, codes_output, created_at FROM template_plans WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds > 0 and row[3] < now - self.ttl_seconds:
+                self._conn.execute("DELETE FROM template_plans WHERE key = ?", (key,))
+                row = None
+            if not row:
+                self._count(key, template, "misses")
+                return None
+            out = refill(row[1], json.loads(row[2]), [tuple(s) for s in json.loads(row[0])], list(template.slots))
+            if out is None:
+                self._count(key, template, "fallbacks")
+                return None
+            self._conn.execute("UPDATE template_plans SET last_used = ? WHERE key = ?", (now, key))
+            self._count(key, template, "hits")
+        return out
+
+    def store(
+        self,
+        query: str,
+        mode: str,
+        model: str,
+        temperature: float,
+        registry_version: str,
+        workflow_plan: str,
+        codes_output: Dict[str, Any],
+    ) -> bool:
+        """Remember the plan for `query`'s template; False if it has no usable template."""
+        template = mask_query(query)
+        if not template.slots or template.confidence < self.min_confidence:
+            return False
+        key = self._key(template, mode, model, temperature, registry_version)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO template_plans VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, template.text, json.dumps(template.slots), workflow_plan,
+                 json.dumps(codes_output, ensure_ascii=False), now, now),
+            )
+            if self.max_entries > 0:
+                self._conn.execute(
+                    "DELETE FROM template_plans WHERE key IN ("
+                    " SELECT key FROM template_plans ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        return True
+
+    def stats(self, top: int = 20) -> List[Dict[str, Any]]:
+        """Per-template counters, most looked-up first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT template, SUM(lookups), SUM(hits), SUM(misses), SUM(fallbacks) FROM template_stats "
+                "GROUP BY template ORDER BY SUM(lookups) DESC, template LIMIT ?",
+                (top,),
+            ).fetchall()
+        return [
+            {
+                "template": t, "lookups": n, "hits": h, "misses": m, "fallbacks": f,
+                "hit_rate": h / n if n else 0.0,
+            }
+            for t, n, h, m, f in rows
+        ]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect query templates and their plan cache hit rates.")
+    parser.add_argument("--cache", default=None, help=f"cache file (default: {PLAN_CACHE_PATH})")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    mask = sub.add_parser("mask")
+    mask.add_argument("query")
+    st = sub.add_parser("stats")
+    st.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "mask":
+        t = mask_query(args.query)
+        print(f"🧩 {t.text}  (confidence {t.confidence:.2f})")
+        for kind, literal in t.slots:
+            print(f"   {kind}: {literal}")
+        return
+
+    with TemplateCache(args.cache) as cache:
+        rows = cache.stats(args.top)
+        print(f"📦 {cache.path}")
+        for r in rows:
+            print(f"   {r['hit_rate']:6.1%} of {r['lookups']:5d}  (miss {r['misses']}, fallback {r['fallbacks']})  "
+                  f"{r['template']}")
+        if not rows:
+            print("   (no template lookups yet)")
+
+
+if __name__ == "__main__":
+    main()
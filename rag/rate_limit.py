@@ -0,0 +1,76 @@
+# rag/rate_limit.py
+"""
+Token-bucket rate limiting for concurrent LLM calls (asyncio).
+
+A `TokenBucket` holds up to `capacity` units and refills continuously at
+`rate_per_minute / 60` units per second; `acquire(n)` waits until n units are
+available and takes them. The default capacity is ten seconds of refill, so
+a fresh run can burst a little without front-loading a whole minute.
+
+`RateLimiter` pairs a requests-per-minute and a tokens-per-minute bucket
+(`PLANNER_RPM` / `PLANNER_TPM`; 0 disables a limit). A call reserves its
+estimated tokens up front and `settle()` books the difference once the API
+reports real usage, so under-estimates slow later calls down instead of
+overrunning the limit. Time spent waiting (summed over callers) is kept in
+`waited_seconds`.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+PLANNER_RPM = int(os.getenv("PLANNER_RPM", "500"))
+PLANNER_TPM = int(os.getenv("PLANNER_TPM", "200000"))
+
+BURST_SECONDS = 10.0
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be > 0")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, n: float = 1.0) -> float:
+        """Take n units, waiting as needed; returns the seconds waited."""
+        t0 = time.monotonic()
+        # the lock keeps waiters first-come first-served
+        async with self._lock:
+            while True:
+                self._refill()
+                # a request larger than the bucket goes once it is full
+                if self.tokens >= min(n, self.capacity):
+                    self.tokens -= n
+                    return time.monotonic() - t0
+                await asyncio.sleep((min(n, self.capacity) - self.tokens) / self.rate)
+
+    def adjust(self, n: float) -> None:
+        """Give back (n > 0) or take (n < 0) units without waiting."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + n)
+
+
+class RateLimiter:
+    def __init__(self, rpm: int = PLANNER_RPM, tpm: int = PLANNER_TPM):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.waited_seconds = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        if self.requests is not None:
+            self.waited_seconds += await self.requests.acquire(1)
+        if self.tokens is not None:
+            self.waited_seconds += await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
@@ -1,17 +1,51 @@
 # rag/registry.py
-from collections import defaultdict
-from typing import Dict, List, Tuple
+"""
+Merged chunk registry.
 
-from data.rag_chunks_data_clean import chunk_data as CLEAN_CHUNKS
+Nothing is built at import time: the first call to `get_registry()` (or the
+first access to `ALL_CHUNKS` / `BUILD_REPORT` / `INDEX` on this module)
+imports the chunk data modules and builds the registry once, under a lock.
 
-# rag/registry.py
-from typing import Dict, List, Tuple
+The registry is an immutable `Registry` object. `reload_registry()` (or a
+`RegistryWatcher` thread) builds a new one in the background and swaps it in
+with a single assignment, so a caller that grabs `get_registry()` once per
+request always sees one consistent version.
+"""
+import hashlib
+import importlib
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from rag.chunk import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+def _import_fresh(name: str):
+    # Re-execute an already imported data module so edits on disk are seen.
+    module = sys.modules.get(name)
+    if module is not None:
+        return importlib.reload(module)
+    return importlib.import_module(name)
+
+
+def _load_clean_chunks(fresh: bool = False):
+    if fresh:
+        return _import_fresh("data.rag_chunks_data_clean").chunk_data
+    from data.rag_chunks_data_clean import chunk_data
+    return chunk_data
 
-from data.rag_chunks_data_clean import chunk_data as CLEAN_CHUNKS
 
-def _load_legacy_chunks():
+def _load_legacy_chunks(fresh: bool = False):
     try:
-        import data.rag_chunks as legacy
+        if fresh:
+            legacy = _import_fresh("data.rag_chunks")
+        else:
+            import data.rag_chunks as legacy
     except Exception:
         return []
     for name in ("CHUNKS", "chunk_data", "chunks", "RAG_CHUNKS"):
@@ -19,11 +53,20 @@ def _load_legacy_chunks():
             return getattr(legacy, name)
     return []
 
-LEGACY_CHUNKS = _load_legacy_chunks()
+
+def text_hash(text: str) -> str:
+    """
+    Hash used to dedupe prompt blocks by text.
+    """
+    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
 
 def _chunk_key(chunk: Dict) -> Tuple:
     """
-    Identity key for merging chunks.
+    Slot key used to decide whether a legacy chunk fills a gap.
+
+    Chunk identity itself is the content-addressed `chunk_id`; several clean
+    chunks may share a slot (e.g. multiple support entries for one topic).
     """
     return (
         chunk.get("doc_type"),
@@ -32,23 +75,36 @@ def _chunk_key(chunk: Dict) -> Tuple:
     )
 
 
-def _normalize_chunk(chunk: Dict, source: str) -> Dict:
+def _normalize_chunk(chunk: Dict, source: str) -> Chunk:
     """
     Normalize any chunk to the locked contract.
     """
-    return {
-        "doc_type": chunk["doc_type"],
-        "topic": chunk["topic"],
-        "priority": int(chunk["priority"]),
-        "role": chunk["role"],
-        "data": chunk["data"].strip(),
-        "text": chunk["text"].strip(),
-        "source": source,
-    }
+    return Chunk(
+        doc_type=chunk["doc_type"],
+        topic=chunk["topic"],
+        priority=chunk["priority"],
+        role=chunk["role"],
+        data=chunk["data"].strip(),
+        text=chunk["text"].strip(),
+        expands=chunk.get("expands", ()),
+        always_include=chunk.get("always_include", False),
+        source=source,
+    )
+
 
+def build_registry(
+    clean_chunks: Optional[List[Dict]] = None,
+    legacy_chunks: Optional[List[Dict]] = None,
+    fresh: bool = False,
+):
+    if clean_chunks is None:
+        clean_chunks = _load_clean_chunks(fresh=fresh)
+    if legacy_chunks is None:
+        legacy_chunks = _load_legacy_chunks(fresh=fresh)
 
-def build_registry():
-    merged: Dict[Tuple, Dict] = {}
+    merged: List[Chunk] = []
+    seen_ids: Set[str] = set()
+    slots: Dict[Tuple, List[int]] = {}
     report = {
         "clean_count": 0,
         "legacy_count": 0,
@@ -56,30 +112,357 @@ def build_registry():
         "legacy_overrides": [],
     }
 
-    # 1) Load clean chunks first (authoritative)
-    for ch in CLEAN_CHUNKS:
-        key = _chunk_key(ch)
-        merged[key] = _normalize_chunk(ch, source="clean")
+    # 1) Load clean chunks first (authoritative); only exact duplicates collapse
+    for ch in clean_chunks:
+        normalized = _normalize_chunk(ch, source="clean")
         report["clean_count"] += 1
+        if normalized.chunk_id in seen_ids:
+            continue
+        seen_ids.add(normalized.chunk_id)
+        slots.setdefault(_chunk_key(normalized), []).append(len(merged))
+        merged.append(normalized)
 
     # 2) Merge legacy chunks (fill gaps only)
-    for ch in LEGACY_CHUNKS:
+    for ch in legacy_chunks:
         key = _chunk_key(ch)
         report["legacy_count"] += 1
 
         normalized = _normalize_chunk(ch, source="legacy")
+        positions = slots.get(key)
 
-        if key not in merged:
-            merged[key] = normalized
-        else:
-            existing = merged[key]
-            # clean-first, legacy-fill
-            if len(existing["text"]) < len(normalized["text"]):
-                existing["text"] = normalized["text"]
+        if not positions:
+            if normalized.chunk_id not in seen_ids:
+                seen_ids.add(normalized.chunk_id)
+                slots[key] = [len(merged)]
+                merged.append(normalized)
+        elif len(positions) == 1:
+            existing = merged[positions[0]]
+            # clean-first, legacy-fill (ambiguous when a slot holds several chunks)
+            if len(existing.text) < len(normalized.text):
+                merged[positions[0]] = existing.replace(text=normalized.text)
                 report["legacy_overrides"].append(key)
 
     report["merged_count"] = len(merged)
-    return list(merged.values()), report
+    report["source"] = "modules"
+    return merged, report
+
+
+@dataclass(frozen=True)
+class RegistryIndex:
+    """
+    Prebuilt lookup tables over a merged chunk list.
+
+    Index values are positions into `chunks`, in registry order, so callers can
+    merge several buckets and restore the original ordering cheaply.
+    """
+    chunks: Tuple[Dict, ...]
+    by_topic: Dict[str, Tuple[int, ...]]
+    by_role: Dict[str, Tuple[int, ...]]
+    by_doc_type: Dict[str, Tuple[int, ...]]
+    # router/support chunks per topic (what support expansion draws from)
+    expandable_by_topic: Dict[str, Tuple[int, ...]]
+    # static CORE blocks, already sorted by priority desc
+    core_blocks: Tuple[Dict, ...]
+    # topic -> transitive closure of declared `expands` (includes the topic itself)
+    closure: Dict[str, FrozenSet[str]]
+    always_include: FrozenSet[str]
+    # (topic, referenced topic) pairs dropped because no chunk has that topic
+    missing_dependencies: Tuple[Tuple[str, str], ...]
+
+    def expand_topics(self, topics) -> Set[str]:
+        out = set(self.always_include)
+        for t in topics:
+            out |= self.closure.get(t, frozenset((t,)))
+        return out
+
+    def topic_chunks(self, topic: str) -> List[Dict]:
+        return [self.chunks[i] for i in self.by_topic.get(topic, ())]
+
+    def role_chunks(self, role: str) -> List[Dict]:
+        return [self.chunks[i] for i in self.by_role.get(role, ())]
+
+    def doc_type_chunks(self, doc_type: str) -> List[Dict]:
+        return [self.chunks[i] for i in self.by_doc_type.get(doc_type, ())]
+
+
+CORE_TOPICS = {"core_intro", "intro", "core"}
+
+
+def _is_core_block(chunk: Dict) -> bool:
+    return chunk.get("role") == "static" and (
+        chunk.get("doc_type") == "CORE" or chunk.get("topic") in CORE_TOPICS
+    )
+
+
+def compile_topic_closure(
+    chunks: List[Dict],
+) -> Tuple[Dict[str, FrozenSet[str]], FrozenSet[str], List[Tuple[str, str]]]:
+    """
+    Compile the `expands` / `always_include` chunk metadata into a closure table.
+
+    References to topics no chunk provides are dropped and returned so the
+    caller can report them; a dependency cycle raises ValueError.
+    """
+    topics = {ch.get("topic") for ch in chunks if ch.get("topic")}
+    edges: Dict[str, Set[str]] = {t: set() for t in topics}
+    always: Set[str] = set()
+    missing: List[Tuple[str, str]] = []
+
+    for ch in chunks:
+        topic = ch.get("topic")
+        if not topic:
+            continue
+        if ch.get("always_include"):
+            always.add(topic)
+        for dep in ch.get("expands", ()):
+            if dep in topics:
+                edges[topic].add(dep)
+            elif (topic, dep) not in missing:
+                missing.append((topic, dep))
+
+    closure: Dict[str, FrozenSet[str]] = {}
+    visiting: List[str] = []
+
+    def visit(topic: str) -> FrozenSet[str]:
+        if topic in closure:
+            return closure[topic]
+        if topic in visiting:
+            cycle = visiting[visiting.index(topic):] + [topic]
+            raise ValueError("Topic dependency cycle: " + " -> ".join(cycle))
+        visiting.append(topic)
+        out = {topic}
+        for dep in sorted(edges[topic]):
+            out |= visit(dep)
+        visiting.pop()
+        closure[topic] = frozenset(out)
+        return closure[topic]
+
+    for t in sorted(topics):
+        visit(t)
+
+    return closure, frozenset(always), missing
+
+
+def build_index(chunks: List[Dict]) -> RegistryIndex:
+    by_topic: Dict[str, List[int]] = {}
+    by_role: Dict[str, List[int]] = {}
+    by_doc_type: Dict[str, List[int]] = {}
+    expandable: Dict[str, List[int]] = {}
+
+    for i, ch in enumerate(chunks):
+        topic = ch.get("topic")
+        role = ch.get("role")
+        by_topic.setdefault(topic, []).append(i)
+        by_role.setdefault(role, []).append(i)
+        by_doc_type.setdefault(ch.get("doc_type"), []).append(i)
+        if topic and role in {"router", "support"}:
+            expandable.setdefault(topic, []).append(i)
+
+    core_blocks = sorted(
+        (ch for ch in chunks if _is_core_block(ch)),
+        key=lambda c: int(c.get("priority", 0)),
+        reverse=True,
+    )
+
+    closure, always_include, missing = compile_topic_closure(chunks)
+
+    return RegistryIndex(
+        chunks=tuple(chunks),
+        by_topic={k: tuple(v) for k, v in by_topic.items()},
+        by_role={k: tuple(v) for k, v in by_role.items()},
+        by_doc_type={k: tuple(v) for k, v in by_doc_type.items()},
+        expandable_by_topic={k: tuple(v) for k, v in expandable.items()},
+        core_blocks=tuple(core_blocks),
+        closure=closure,
+        always_include=always_include,
+        missing_dependencies=tuple(missing),
+    )
+
+
+@dataclass(frozen=True)
+class Registry:
+    chunks: List[Chunk]
+    report: Dict
+    index: RegistryIndex
+    # content fingerprint; caches derived from a registry key on this
+    version: str
+
+
+def registry_version(chunks: List[Chunk]) -> str:
+    h = hashlib.sha256()
+    for ch in chunks:
+        fields = (
+            ch["chunk_id"], ch["doc_type"], ch["topic"], str(ch["priority"]), str(ch["role"]),
+            ",".join(ch["expands"]), str(ch["always_include"]),
+            ch["text_sha1"], ch["data_sha256"],
+        )
+        h.update("\x1f".join(fields).encode("utf-8") + b"\x1e")
+    return h.hexdigest()[:16]
+
+
+_REGISTRY: Optional[Registry] = None
+_REGISTRY_LOCK = threading.Lock()
+_RELOAD_LOCK = threading.Lock()
+_RELOAD_LISTENERS: List[Callable[[Registry, Registry], None]] = []
+
+
+def build_from_modules(fresh: bool = False) -> Registry:
+    chunks, report = build_registry(fresh=fresh)
+    return Registry(
+        chunks=chunks,
+        report=report,
+        index=build_index(chunks),
+        version=registry_version(chunks),
+    )
+
+
+def _warn_missing_dependencies(reg: Registry) -> Registry:
+    missing = reg.index.missing_dependencies
+    if missing:
+        logger.warning(
+            "Registry %s: `expands` names topics no chunk provides (dropped): %s",
+            reg.version,
+            ", ".join(f"{topic} -> {dep}" for topic, dep in missing),
+        )
+    return reg
+
+
+def _load_registry(fresh: bool = False) -> Registry:
+    return _warn_missing_dependencies(_load_from_sources(fresh))
+
+
+def _load_from_sources(fresh: bool = False) -> Registry:
+    # Prefer a router bundle's snapshot, then the compiled snapshot; both are
+    # ignored when missing or stale.
+    bundle_path = os.getenv("ROUTER_BUNDLE")
+    if bundle_path and os.path.exists(bundle_path):
+        from rag.bundle import get_bundle
+
+        reg = get_bundle(bundle_path).registry()
+        if reg is not None:
+            return reg
+
+    from rag.snapshot import load_snapshot
+
+    reg = load_snapshot()
+    if reg is not None:
+        return reg
+    return build_from_modules(fresh=fresh)
+
+
+def get_registry() -> Registry:
+    """
+    Return the process-wide registry, building it on first use.
+    """
+    global _REGISTRY
+    reg = _REGISTRY
+    if reg is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = _load_registry()
+            reg = _REGISTRY
+    return reg
+
+
+def on_reload(callback: Callable[[Registry, Registry], None]) -> None:
+    """
+    Register `callback(old, new)`, called after a reload swaps in a new version.
+    """
+    _RELOAD_LISTENERS.append(callback)
+
+
+def reload_registry() -> bool:
+    """
+    Rebuild the registry from the snapshot / data modules and swap it in.
+
+    The new registry is built without holding the reader lock; readers keep
+    using the old object until the single-assignment swap. Returns True if the
+    content changed.
+    """
+    global _REGISTRY
+    with _RELOAD_LOCK:
+        new = _load_registry(fresh=True)
+        old = _REGISTRY
+        if old is not None and old.version == new.version:
+            return False
+        with _REGISTRY_LOCK:
+            _REGISTRY = new
+
+    if old is not None:
+        logger.info("Registry reloaded: %s -> %s (%d chunks)", old.version, new.version, len(new.chunks))
+        for callback in list(_RELOAD_LISTENERS):
+            try:
+                callback(old, new)
+            except Exception:
+                logger.exception("Registry reload listener failed")
+    return True
+
+
+def _watched_files() -> List[str]:
+    from rag.snapshot import SNAPSHOT_PATH, source_files
+
+    return [SNAPSHOT_PATH] + source_files()
+
+
+def _files_fingerprint(paths: List[str]) -> Tuple:
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            out.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append((path, None, None))
+    return tuple(out)
+
+
+class RegistryWatcher(threading.Thread):
+    """
+    Polls the snapshot header and chunk source files and reloads on change.
+    """
+
+    def __init__(self, interval: float = 2.0):
+        super().__init__(name="registry-watcher", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._paths = _watched_files()
+        self._fingerprint = _files_fingerprint(self._paths)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            current = _files_fingerprint(self._paths)
+            if current == self._fingerprint:
+                continue
+            self._fingerprint = current
+            try:
+                reload_registry()
+            except Exception:
+                # keep serving the previous version (e.g. half-saved file)
+                logger.exception("Registry reload failed; keeping current version")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_watcher(interval: Optional[float] = None) -> RegistryWatcher:
+    if interval is None:
+        interval = float(os.getenv("REGISTRY_WATCH_INTERVAL", "2.0"))
+    get_registry()
+    watcher = RegistryWatcher(interval=interval)
+    watcher.start()
+    return watcher
+
+
+# Backwards-compatible module attributes, resolved lazily (PEP 562).
+_LAZY_ATTRS = {
+    "ALL_CHUNKS": lambda: get_registry().chunks,
+    "BUILD_REPORT": lambda: get_registry().report,
+    "INDEX": lambda: get_registry().index,
+    "CLEAN_CHUNKS": _load_clean_chunks,
+    "LEGACY_CHUNKS": _load_legacy_chunks,
+}
 
 
-ALL_CHUNKS, BUILD_REPORT = build_registry()
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        return _LAZY_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,14 @@
 import os
-import json
-import math
+import threading
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
 
 from dotenv import load_dotenv
-import chromadb
-from chromadb.config import Settings
-from openai import OpenAI
+
+# chromadb / openai take ~1.5s to import; they are loaded on first routing
+# call so importing rag.assembler / rag.router stays cheap.
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 load_dotenv()
 
@@ -15,6 +16,7 @@ load_dotenv()
 CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", os.getenv("CHROMA_DIR", ".chroma"))
 COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "rag_chunks_v1")
 EMBED_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", os.getenv("EMBED_MODEL", "text-embedding-3-small"))
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", "0"))  # must match the index build
 
 TOP_K = int(os.getenv("ROUTER_TOP_K", "12"))          # retrieve this many candidates
 TOP_ROUTER = int(os.getenv("TOP_ROUTER", "8"))        # only consider this many router hits
@@ -32,6 +34,17 @@ MAX_ALLOWED_TOPICS = int(os.getenv("MAX_ALLOWED_TOPICS", "2"))
 STOP_EARLY_TOPICS = ["user_mgmt", "static_vs_dynamic"]
 DISALLOWED_OUTPUT_TOPICS = {"router_disambiguation"}
 
+# Prebuilt single-file index (python rag/bundle.py export); when set, routing
+# never opens the Chroma store
+ROUTER_BUNDLE = os.getenv("ROUTER_BUNDLE", "")
+
+# What to do when the index does not match the router config or the registry:
+# error (raise StaleIndexError) | warn (log once, keep routing) |
+# rebuild (log once, sync in the background, keep routing meanwhile)
+ROUTER_ON_STALE = os.getenv("ROUTER_ON_STALE", "warn")
+
+# Legacy (unversioned) centroid file; versioned builds are resolved through
+# the active manifest on every request (rag/manifest.py)
 CENTROIDS_PATH = os.path.join(CHROMA_DIR, "topic_centroids.json")
 
 
@@ -42,49 +55,101 @@ class Candidate:
     meta: Dict
 
 
-def _embed_query(oai: OpenAI, text: str) -> List[float]:
-    resp = oai.embeddings.create(model=EMBED_MODEL, input=[text])
+def _embed_query(oai: "OpenAI", text: str) -> List[float]:
+    extra = {"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}
+    resp = oai.embeddings.create(model=EMBED_MODEL, input=[text], **extra)
     return resp.data[0].embedding
 
 
-def _get_collection():
-    chroma = chromadb.PersistentClient(
-        path=CHROMA_DIR,
-        settings=Settings(anonymized_telemetry=False),
-    )
-    return chroma.get_collection(name=COLLECTION_NAME)
+# One Chroma client per process, created under a lock: chromadb's client
+# registry is not safe to populate from several threads at once (concurrent
+# first routing calls, e.g. scripts/plan_bulk.py)
+_CHROMA_LOCK = threading.Lock()
+_CHROMA_CLIENT = None
+
+
+def _get_collection(name: str = COLLECTION_NAME):
+    global _CHROMA_CLIENT
+    with _CHROMA_LOCK:
+        if _CHROMA_CLIENT is None:
+            import chromadb
+            from chromadb.config import Settings
+
+            _CHROMA_CLIENT = chromadb.PersistentClient(
+                path=CHROMA_DIR,
+                settings=Settings(anonymized_telemetry=False),
+            )
+        return _CHROMA_CLIENT.get_collection(name=name)
 
 
 def _group_key(meta: Dict) -> Tuple[str, str, str]:
     return (meta.get("doc_type"), meta.get("topic"), meta.get("role"))
 
 
-def _cosine_distance(a: List[float], b: List[float]) -> float:
-    # 1 - cosine similarity
-    dot = 0.0
-    na = 0.0
-    nb = 0.0
-    for x, y in zip(a, b):
-        fx = float(x)
-        fy = float(y)
-        dot += fx * fy
-        na += fx * fx
-        nb += fy * fy
-    if na <= 0.0 or nb <= 0.0:
-        return 1.0
-    return 1.0 - (dot / (math.sqrt(na) * math.sqrt(nb)))
-
-
-def _load_centroids() -> Optional[Dict[str, List[float]]]:
-    try:
-        with open(CENTROIDS_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        centroids = data.get("centroids", {})
-        if not isinstance(centroids, dict) or not centroids:
-            return None
-        return centroids
-    except Exception:
-        return None
+# (index key, registry version) -> problems found when that index was first used
+_INDEX_CHECKS: Dict[Tuple[str, str], List[str]] = {}
+_REBUILD_LOCK = threading.Lock()
+
+
+def _rebuild_in_background() -> None:
+    if not _REBUILD_LOCK.acquire(blocking=False):
+        return  # one rebuild at a time
+
+    def run():
+        try:
+            from rag.create_embeddings import main as build_main
+
+            build_main(["--sync"])
+            if ROUTER_BUNDLE:
+                from rag.bundle import export_bundle
+
+                export_bundle(ROUTER_BUNDLE)
+        except Exception as e:
+            print(f"[router] background rebuild failed: {e!r}")
+        finally:
+            _REBUILD_LOCK.release()
+
+    threading.Thread(target=run, name="router-rebuild", daemon=True).start()
+
+
+def _check_index(key: str, build: Optional[Dict], centroid_index) -> None:
+    """
+    Verify the index against the router config and the current registry
+    (hashes and header fields only), once per index version and registry
+    version; then apply ROUTER_ON_STALE.
+    """
+    from rag.manifest import StaleIndexError, index_problems, registry_digest
+    from rag.registry import get_registry
+
+    if ROUTER_ON_STALE not in ("error", "warn", "rebuild"):
+        raise ValueError(f"ROUTER_ON_STALE must be error, warn or rebuild (got {ROUTER_ON_STALE!r})")
+
+    reg = get_registry()
+    check_key = (key, reg.version)
+    problems = _INDEX_CHECKS.get(check_key)
+    if problems is None:
+        problems = index_problems(
+            build,
+            EMBED_MODEL,
+            EMBED_DIMENSIONS,
+            centroid_index.embed_model if centroid_index else None,
+            centroid_index.dim if centroid_index else None,
+            registry_digest(reg, build) if build else None,
+        )
+        _INDEX_CHECKS[check_key] = problems
+        if problems and ROUTER_ON_STALE != "error":
+            print(f"[router] ⚠️ stale index '{key}': " + "; ".join(problems))
+            if ROUTER_ON_STALE == "rebuild":
+                print("[router] starting background sync")
+                _rebuild_in_background()
+
+    if problems and ROUTER_ON_STALE == "error":
+        raise StaleIndexError(
+            f"Index '{key}' is stale: " + "; ".join(problems)
+            + ". Rebuild with `python rag/create_embeddings.py --sync`"
+            + (" and re-export the bundle" if ROUTER_BUNDLE else "")
+            + ", or set ROUTER_ON_STALE=warn|rebuild."
+        )
 
 
 def route_topics(query: str, debug: bool = True) -> List[str]:
@@ -92,9 +157,29 @@ def route_topics(query: str, debug: bool = True) -> List[str]:
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY not found (check .env)")
 
+    from openai import OpenAI
+
     oai = OpenAI(api_key=api_key)
-    col = _get_collection()
-    centroids = _load_centroids()
+    if ROUTER_BUNDLE:
+        from rag.bundle import get_bundle
+
+        bundle = get_bundle(ROUTER_BUNDLE)
+        col = bundle.index
+        centroid_index = bundle.centroids
+        _check_index(
+            f"{ROUTER_BUNDLE}@{bundle.header['sections']['vectors']['sha256'][:12]}",
+            bundle.header.get("build"),
+            centroid_index,
+        )
+    else:
+        from rag.centroids import load_centroid_index
+        from rag.manifest import active_index
+
+        # Resolve the active build once per request (blue/green rebuilds)
+        active = active_index(CHROMA_DIR, COLLECTION_NAME)
+        col = _get_collection(active.collection)
+        centroid_index = load_centroid_index(active.centroids_path)
+        _check_index(active.collection, active.build, centroid_index)
 
     qvec = _embed_query(oai, query)
 
@@ -160,13 +245,14 @@ def route_topics(query: str, debug: bool = True) -> List[str]:
     topics_in_hits = [t for t in topics_in_hits if t not in DISALLOWED_OUTPUT_TOPICS]
 
     # If centroid file missing or topic missing in centroids, fallback to NN winner
-    if centroids:
+    if centroid_index:
+        # one matrix-vector product over every topic prototype
+        topic_dists = centroid_index.distances(qvec)
         scored = []
         for t in topics_in_hits:
-            cvec = centroids.get(t)
-            if not cvec:
+            cd = topic_dists.get(t)
+            if cd is None:
                 continue
-            cd = _cosine_distance(qvec, cvec)
             # Keep priority for tie-break only
             pr = next((g["priority"] for g in group_summaries if g.get("topic") == t), 0)
             scored.append({"topic": t, "centroid_dist": cd, "priority": pr})
@@ -238,13 +324,12 @@ def route_topics(query: str, debug: bool = True) -> List[str]:
         for g in group_summaries:
             print(f"  - {g['best_dist']:.4f}  {g['topic']}  pr={g['priority']} size={g['size']}")
 
-        if centroids:
+        if centroid_index:
             # show centroid distances for transparency (only for topics we scored)
             scored_debug = []
             for t in topics_in_hits:
-                cvec = centroids.get(t)
-                if cvec:
-                    cd = _cosine_distance(qvec, cvec)
+                cd = topic_dists.get(t)
+                if cd is not None:
                     pr = next((g["priority"] for g in group_summaries if g.get("topic") == t), 0)
                     scored_debug.append((cd, t, pr))
             scored_debug.sort(key=lambda x: x[0])
@@ -0,0 +1,237 @@
+# rag/snapshot.py
+"""
+Compiled registry snapshot.
+
+`python rag/snapshot.py` merges the chunk data modules once and writes:
+- `registry_snapshot.json`: header with format version, source-file hash,
+  chunk metadata (blob offsets, hashes, token counts) and prebuilt indexes.
+- `registry_snapshot.<blob_sha>.blob`: every chunk's `data` and `text` as one
+  UTF-8 blob. The header names its blob, so replacing the header is the only
+  step a reader can observe.
+
+At runtime `rag.registry` loads the snapshot instead of importing the data
+modules, unless the snapshot is missing or was built from different source
+files. Every chunk's strings are decoded on load (Chunk records are
+immutable), so the blob is read in one call rather than memory-mapped.
+"""
+import hashlib
+import json
+import os
+import time
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple
+
+from rag.chunk import Chunk
+from rag.registry import Registry, RegistryIndex, build_from_modules, registry_version
+from rag.tokens import count_tokens, tokenizer_name
+
+FORMAT_VERSION = 2
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_PATH = os.getenv(
+    "REGISTRY_SNAPSHOT",
+    os.path.join(_REPO_ROOT, "data", "registry_snapshot.json"),
+)
+
+SOURCE_MODULES = ("data.rag_chunks_data_clean", "data.rag_chunks")
+
+# chunk keys copied into the header as-is
+_META_KEYS = ("chunk_id", "doc_type", "topic", "priority", "role", "expands", "always_include", "source", "text_sha1", "data_sha256")
+
+
+def source_files() -> List[str]:
+    paths = []
+    for name in SOURCE_MODULES:
+        spec = find_spec(name)
+        if spec is not None and spec.origin and os.path.exists(spec.origin):
+            paths.append(spec.origin)
+    return paths
+
+
+def source_hash() -> str:
+    """
+    Content hash over the chunk source modules (what makes a snapshot stale).
+    """
+    h = hashlib.sha256()
+    for path in source_files():
+        h.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            h.update(f.read())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _blob_name(snapshot_path: str, blob_sha: str) -> str:
+    stem = os.path.splitext(snapshot_path)[0]
+    return f"{stem}.{blob_sha[:16]}.blob"
+
+
+def _index_to_json(index: RegistryIndex) -> Dict:
+    positions = {id(ch): i for i, ch in enumerate(index.chunks)}
+    return {
+        "by_topic": index.by_topic,
+        "by_role": index.by_role,
+        "by_doc_type": index.by_doc_type,
+        "expandable_by_topic": index.expandable_by_topic,
+        "core_blocks": [positions[id(ch)] for ch in index.core_blocks],
+        "closure": {t: sorted(c) for t, c in index.closure.items()},
+        "always_include": sorted(index.always_include),
+        "missing_dependencies": index.missing_dependencies,
+    }
+
+
+def _index_from_json(chunks: List[Chunk], d: Dict) -> RegistryIndex:
+    def positions(m: Dict) -> Dict:
+        return {k: tuple(v) for k, v in m.items()}
+
+    return RegistryIndex(
+        chunks=tuple(chunks),
+        by_topic=positions(d["by_topic"]),
+        by_role=positions(d["by_role"]),
+        by_doc_type=positions(d["by_doc_type"]),
+        expandable_by_topic=positions(d["expandable_by_topic"]),
+        core_blocks=tuple(chunks[i] for i in d["core_blocks"]),
+        closure={t: frozenset(c) for t, c in d["closure"].items()},
+        always_include=frozenset(d["always_include"]),
+        missing_dependencies=tuple(tuple(p) for p in d["missing_dependencies"]),
+    )
+
+
+def compile_snapshot() -> Tuple[Dict, bytes]:
+    """
+    Merge the chunk modules and return (header, blob) without writing
+    anything; the header's "blob" name is filled in by the writer.
+    """
+    reg = build_from_modules()
+
+    blob = bytearray()
+    entries = []
+    for ch in reg.chunks:
+        entry = {k: ch[k] for k in _META_KEYS}
+        entry["role"] = ch.role.value
+        for field in ("data", "text"):
+            raw = ch[field].encode("utf-8")
+            entry[field] = [len(blob), len(raw)]
+            entry[f"{field}_tokens"] = count_tokens(ch[field])
+            blob += raw
+        entries.append(entry)
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "source_hash": source_hash(),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "tokenizer": tokenizer_name(),
+        "blob": None,
+        "blob_size": len(blob),
+        "blob_sha256": hashlib.sha256(blob).hexdigest(),
+        "report": {**reg.report, "source": "snapshot"},
+        "chunks": entries,
+        "index": _index_to_json(reg.index),
+    }
+    return header, bytes(blob)
+
+
+def build_snapshot(path: Optional[str] = None) -> Dict:
+    import glob
+
+    path = path or SNAPSHOT_PATH
+    header, blob = compile_snapshot()
+    blob_path = _blob_name(path, header["blob_sha256"])
+    header["blob"] = os.path.basename(blob_path)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if not os.path.exists(blob_path):
+        tmp = blob_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, blob_path)
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+    # Old blobs are no longer referenced by the header.
+    for old in glob.glob(os.path.splitext(path)[0] + ".*.blob"):
+        if os.path.abspath(old) != os.path.abspath(blob_path):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    return header
+
+
+def read_header(path: Optional[str] = None) -> Optional[Dict]:
+    try:
+        with open(path or SNAPSHOT_PATH, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(header: Optional[Dict]) -> bool:
+    return (
+        header is not None
+        and header.get("format_version") == FORMAT_VERSION
+        and header.get("source_hash") == source_hash()
+    )
+
+
+def load_snapshot(path: Optional[str] = None) -> Optional[Registry]:
+    """
+    Load a fresh snapshot, or return None so the caller falls back to the
+    Python data modules.
+    """
+    path = path or SNAPSHOT_PATH
+    header = read_header(path)
+    if not is_fresh(header):
+        return None
+
+    blob_path = os.path.join(os.path.dirname(os.path.abspath(path)), header["blob"])
+    try:
+        f = open(blob_path, "rb")
+    except OSError:
+        return None
+
+    with f:
+        if os.fstat(f.fileno()).st_size != header["blob_size"]:
+            return None
+        buf = f.read()
+    return registry_from_snapshot(header, buf)
+
+
+def registry_from_snapshot(header: Dict, buf) -> Registry:
+    """
+    Build a Registry from a snapshot header and its blob bytes.
+    """
+    chunks = []
+    for entry in header["chunks"]:
+        fields = {k: entry[k] for k in _META_KEYS}
+        for field in ("data", "text"):
+            off, n = entry[field]
+            fields[field] = buf[off:off + n].decode("utf-8")
+            fields[f"{field}_tokens"] = entry[f"{field}_tokens"]
+        chunks.append(Chunk(**fields))
+
+    report = dict(header["report"])
+    report["legacy_overrides"] = [tuple(k) for k in report.get("legacy_overrides", [])]
+    return Registry(
+        chunks=chunks,
+        report=report,
+        index=_index_from_json(chunks, header["index"]),
+        version=registry_version(chunks),
+    )
+
+
+def main():
+    t0 = time.perf_counter()
+    header = build_snapshot()
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"✅ Wrote registry snapshot: {SNAPSHOT_PATH}")
+    print(f"   chunks={len(header['chunks'])} blob={header['blob_size']} bytes "
+          f"tokenizer={header['tokenizer']} ({ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,39 @@
 # rag/support_expander.py
-from typing import Dict, List, Set, Tuple
-from rag.registry import ALL_CHUNKS
+from typing import Dict, List, Optional, Set
+from rag.registry import RegistryIndex, get_registry
 
-ALWAYS_INCLUDE_TOPICS = {"planner_policy"}  # keep tiny; do NOT add "conditions" here
+# Topic families and always-on topics are declared in chunk metadata
+# (`expands` / `always_include`) and compiled into the registry index closure.
 
 
-def _key(ch: Dict) -> Tuple:
-    return (ch.get("doc_type"), ch.get("topic"), ch.get("role"), int(ch.get("priority", 0)))
+def _key(ch: Dict) -> str:
+    # content-addressed: several support chunks of one topic must not collapse
+    return ch["chunk_id"]
 
 
-def expand_support(allowed_topics: List[str]) -> List[Dict]:
-    allowed: Set[str] = set(allowed_topics)
+def expand_support(allowed_topics: List[str], index: Optional[RegistryIndex] = None) -> List[Dict]:
+    index = index or get_registry().index
+    explicit: Set[str] = set(allowed_topics)
+    allowed = index.expand_topics(explicit)
 
-    # Only expand topic families if the parent topic is selected
-    existing_topics = {c.get("topic") for c in ALL_CHUNKS}
-
-    if "conditions" in allowed:
-        for t in ("cond_bin", "cond_seq", "cond_dom"):
-            if t in existing_topics:
-                allowed.add(t)
-
-    if "loops" in allowed and "flow_formatting" in existing_topics:
-        allowed.add("flow_formatting")
-
-    allowed |= ALWAYS_INCLUDE_TOPICS
+    # Merge the per-topic buckets back into registry order
+    positions = sorted(
+        i for t in allowed for i in index.expandable_by_topic.get(t, ())
+    )
 
     picked = {}
-    for ch in ALL_CHUNKS:
-        topic = ch.get("topic")
-        role = ch.get("role")
-        if not topic or role not in {"router", "support"}:
+    for i in positions:
+        ch = index.chunks[i]
+        # Optional: do not auto-include CATALOG unless explicitly selected
+        if ch.get("doc_type") == "CATALOG" and ch.get("topic") not in explicit:
             continue
-
-        # IMPORTANT: only include chunks whose topic is allowed
-        if topic in allowed:
-            # Optional: do not auto-include CATALOG unless explicitly selected
-            if ch.get("doc_type") == "CATALOG" and topic not in set(allowed_topics):
-                continue
-            picked[_key(ch)] = ch
+        picked[_key(ch)] = ch
 
     return list(picked.values())
+
+
+def __getattr__(name: str):
+    # ALWAYS_INCLUDE_TOPICS now lives on the (lazily built) registry index
+    if name == "ALWAYS_INCLUDE_TOPICS":
+        return get_registry().index.always_include
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,102 @@
+# rag/tokens.py
+"""
+Token counting shared by the snapshot builder, embedding batcher and reports.
+
+Uses tiktoken when its encoding for the model can be loaded. tiktoken fetches
+encoding files on first use, so offline machines fall back to a
+~4-characters-per-token estimate; `tokenizer_name()` says which one is active.
+
+Inside `with local_only():` (the dry-run estimate) an encoding is only used if
+its file is already in tiktoken's cache directory, so counting never touches
+the network there.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, Optional
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+APPROX_CHARS_PER_TOKEN = 4
+APPROX_TOKENIZER = "approx-4cpt"
+
+_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+_LOCAL_ONLY = False
+
+
+@contextmanager
+def local_only() -> Iterator[None]:
+    """Within the block, never download an encoding file (estimate instead)."""
+    global _LOCAL_ONLY
+    previous, _LOCAL_ONLY = _LOCAL_ONLY, True
+    try:
+        yield
+    finally:
+        _LOCAL_ONLY = previous
+
+
+def _bpe_cached(encoding_name: str) -> bool:
+    """True if tiktoken can load `encoding_name` without a download."""
+    from tiktoken.registry import ENCODINGS
+
+    if encoding_name in ENCODINGS:
+        return True
+    # same lookup as tiktoken.load.read_file_cached
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    elif "DATA_GYM_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["DATA_GYM_CACHE_DIR"]
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return False
+    key = hashlib.sha1(_BPE_URL.format(encoding_name).encode()).hexdigest()
+    return os.path.exists(os.path.join(cache_dir, key))
+
+
+@lru_cache(maxsize=None)
+def _encoding_name(model: str) -> Optional[str]:
+    try:
+        from tiktoken.model import encoding_name_for_model
+    except ImportError:
+        return None
+    try:
+        return encoding_name_for_model(model)
+    except KeyError:
+        return "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    import tiktoken
+
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # encoding file not cached and no network
+        return None
+
+
+def _encoding(model: str, local: bool = False):
+    name = _encoding_name(model)
+    if name is None:
+        return None
+    # checked on every call (not cached): the file may be fetched later
+    if local and not _bpe_cached(name):
+        return None
+    return _load_encoding(name)
+
+
+def tokenizer_name(model: Optional[str] = None) -> str:
+    enc = _encoding(model or LLM_MODEL, _LOCAL_ONLY)
+    return enc.name if enc is not None else APPROX_TOKENIZER
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    enc = _encoding(model or LLM_MODEL, _LOCAL_ONLY)
+    if enc is None:
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+    return len(enc.encode(text, disallowed_special=()))
@@ -13,7 +13,7 @@ def validate_chunks(chunks):
     errors = []
 
     for i, ch in enumerate(chunks):
-        missing = REQUIRED_KEYS - ch.keys()
+        missing = REQUIRED_KEYS - set(ch.keys())
         if missing:
             errors.append(f"Chunk[{i}] missing keys: {missing}")
 
@@ -29,9 +29,45 @@ def validate_chunks(chunks):
         if ch.get("role") not in {"router", "support", "static"}:
             errors.append(f"Chunk[{i}] invalid role: {ch.get('role')}")
 
+        expands = ch.get("expands", ())
+        if not isinstance(expands, (list, tuple)) or not all(isinstance(t, str) and t for t in expands):
+            errors.append(f"Chunk[{i}] expands must be a list of topic names")
+
+        if not isinstance(ch.get("always_include", False), bool):
+            errors.append(f"Chunk[{i}] always_include must be bool")
+
+    # `expands` must name topics some chunk provides; the closure would drop them silently
+    topics = {ch.get("topic") for ch in chunks if ch.get("topic")}
+    for i, ch in enumerate(chunks):
+        expands = ch.get("expands", ())
+        if not isinstance(expands, (list, tuple)):
+            continue
+        for dep in expands:
+            if isinstance(dep, str) and dep and dep not in topics:
+                errors.append(f"Chunk[{i}] ({ch.get('topic')}) expands unknown topic: {dep}")
+
     if errors:
         raise ValueError(
             "❌ Chunk validation failed:\n" + "\n".join(errors)
         )
 
     return True
+
+
+def main():
+    # CI gate: validate the merged registry (clean + legacy chunks)
+    import sys
+
+    from rag.registry import get_registry
+
+    chunks = list(get_registry().chunks)
+    try:
+        validate_chunks(chunks)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"✅ {len(chunks)} chunks valid")
+
+
+if __name__ == "__main__":
+    main()
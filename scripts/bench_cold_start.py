@@ -0,0 +1,102 @@
+# scripts/bench_cold_start.py
+"""
+Cold-start time of a fresh router worker: opening the Chroma store + centroid
+JSON vs memory-mapping a router bundle. Each run is a new Python process that
+imports what it needs, loads the index and answers one query.
+
+The store is copied to a temp dir first (Chroma writes to it on open) and the
+bundle is exported from that copy.
+
+    python scripts/bench_cold_start.py [chroma_dir] [runs]
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHROMA_DIR = sys.argv[1] if len(sys.argv) > 1 else "chroma_store"
+RUNS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHROMA_WORKER = """
+import json, sys, time
+t0 = time.perf_counter()
+import chromadb
+from chromadb.config import Settings
+from rag.centroids import load_centroid_index
+from rag.manifest import active_index
+active = active_index(sys.argv[1])
+col = chromadb.PersistentClient(path=sys.argv[1], settings=Settings(anonymized_telemetry=False)).get_collection(active.collection)
+centroids = load_centroid_index(active.centroids_path)
+t_load = time.perf_counter()
+q = [0.01] * int(sys.argv[2])
+col.query(query_embeddings=[q], n_results=12, include=["distances", "metadatas"])
+centroids.distances(q)
+t_query = time.perf_counter()
+print(json.dumps({"load": t_load - t0, "first_query": t_query - t_load}))
+"""
+
+_BUNDLE_WORKER = """
+import json, sys, time
+t0 = time.perf_counter()
+from rag.bundle import load_bundle
+bundle = load_bundle(sys.argv[1])
+t_load = time.perf_counter()
+q = [0.01] * int(sys.argv[2])
+bundle.index.query([q], n_results=12)
+bundle.centroids.distances(q)
+t_query = time.perf_counter()
+print(json.dumps({"load": t_load - t0, "first_query": t_query - t_load}))
+"""
+
+
+def _run(code: str, target: str, dim: int) -> dict:
+    env = {**os.environ, "PYTHONPATH": _REPO_ROOT}
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", code, target, str(dim)],
+        capture_output=True, text=True, check=True, env=env,
+    ).stdout
+    wall = time.perf_counter() - t0
+    return {**json.loads(out.strip().splitlines()[-1]), "process": wall}
+
+
+def _report(name: str, runs: list) -> None:
+    def med(key: str) -> float:
+        return statistics.median(r[key] for r in runs) * 1000
+
+    print(f"{name:<8} load={med('load'):8.1f} ms  first_query={med('first_query'):7.1f} ms  "
+          f"process={med('process'):8.1f} ms  (median of {len(runs)})")
+
+
+def main():
+    from rag.bundle import export_bundle
+
+    tmp = tempfile.mkdtemp(prefix="bench_cold_start_")
+    try:
+        store = os.path.join(tmp, "store")
+        shutil.copytree(CHROMA_DIR, store)
+        bundle_path = os.path.join(tmp, "router.bundle")
+        header = export_bundle(bundle_path, chroma_dir=store)
+        dim = header["dim"]
+        print(f"store={CHROMA_DIR} vectors={header['count']}x{dim} "
+              f"bundle={os.path.getsize(bundle_path) / 1024:.1f} KiB")
+
+        chroma_runs, bundle_runs = [], []
+        for _ in range(RUNS):
+            chroma_runs.append(_run(_CHROMA_WORKER, store, dim))
+            bundle_runs.append(_run(_BUNDLE_WORKER, bundle_path, dim))
+
+        _report("chroma", chroma_runs)
+        _report("bundle", bundle_runs)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
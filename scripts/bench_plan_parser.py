@@ -0,0 +1,60 @@
+# scripts/bench_plan_parser.py
+"""
+Check rag.plan_parser against the golden corpus in data/plan_golden/ (each
+PLAN.md next to the PLAN.json codes_output it must produce), then measure
+parser throughput in plans/sec over the same corpus.
+
+    python scripts/bench_plan_parser.py [rounds]
+"""
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+from rag.plan_parser import parse_plan
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(_REPO_ROOT, "data", "plan_golden")
+
+
+def load_corpus():
+    corpus = []
+    for md in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md"))):
+        with open(md, "r", encoding="utf-8") as f:
+            text = f.read()
+        with open(md[:-3] + ".json", "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        corpus.append((os.path.basename(md), text, expected))
+    return corpus
+
+
+def main():
+    logging.disable(logging.WARNING)
+    corpus = load_corpus()
+
+    failed = [name for name, text, expected in corpus
+              if json.loads(json.dumps(parse_plan(text))) != expected]
+    print(f"golden: {len(corpus) - len(failed)}/{len(corpus)} plans match")
+    for name in failed:
+        print(f"   ❌ {name}")
+    if failed:
+        sys.exit(1)
+
+    texts = [text for _, text, _ in corpus]
+    n_lines = sum(t.count("\n") + 1 for t in texts)
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in texts:
+            parse_plan(text)
+    elapsed = time.perf_counter() - t0
+    n = ROUNDS * len(texts)
+    print(f"parsed {n} plans in {elapsed:.2f}s: {n / elapsed:,.0f} plans/sec, "
+          f"{ROUNDS * n_lines / elapsed:,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# scripts/bench_plan_stream.py
+"""
+First-trigger latency of the streaming planner.
+
+Offline (default): every plan in data/plan_golden/ is replayed as a token
+stream (random 1-8 character deltas) through rag.plan_parser.PlanParser.
+The stream's final codes_output is checked against the batch parser, and
+the time of the first trigger / first event record is reported on a
+simulated clock: TTFT + delta index / tokens-per-second.
+
+Live (--live QUERY ...): runs planner.plan_workflow_stream and reports wall
+clock time to the first trigger, the first event and the complete plan.
+
+    python scripts/bench_plan_stream.py [--ttft 0.4] [--tps 80]
+    python -m scripts.bench_plan_stream --live "if status is approved send email"
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+from rag.plan_parser import PlanParser, parse_plan
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(_REPO_ROOT, "data", "plan_golden")
+
+
+def _deltas(text: str, rng: random.Random) -> List[str]:
+    out, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 8)
+        out.append(text[i:i + n])
+        i += n
+    return out
+
+
+def replay(ttft: float, tps: float, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    first_trigger, first_event, complete, mismatched = [], [], [], []
+    for md in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md"))):
+        with open(md, "r", encoding="utf-8") as f:
+            text = f.read()
+        deltas = _deltas(text, rng)
+        parser = PlanParser(records=True)
+        seen = {}
+        for i, delta in enumerate(deltas):
+            for record in parser.feed(delta):
+                seen.setdefault(record.kind, ttft + (i + 1) / tps)
+        for record in parser.close():
+            seen.setdefault(record.kind, ttft + len(deltas) / tps)
+
+        total = ttft + len(deltas) / tps
+        complete.append(total)
+        if "trigger" in seen:
+            first_trigger.append(seen["trigger"])
+        if "event" in seen:
+            first_event.append(seen["event"])
+        if json.dumps(parser.result(), sort_keys=True) != json.dumps(parse_plan(text), sort_keys=True):
+            mismatched.append(os.path.basename(md))
+
+    print(f"replayed {len(complete)} plans (ttft={ttft}s, {tps:g} deltas/s); "
+          f"stream == batch for {len(complete) - len(mismatched)}/{len(complete)}")
+    for name in mismatched:
+        print(f"   ❌ {name}")
+    print(f"⏱️  median first trigger {statistics.median(first_trigger):.2f}s "
+          f"({len(first_trigger)} plans), first event {statistics.median(first_event):.2f}s, "
+          f"complete plan {statistics.median(complete):.2f}s")
+    if mismatched:
+        sys.exit(1)
+
+
+def live(queries: List[str]) -> None:
+    import planner
+
+    for q in queries:
+        t0 = time.perf_counter()
+        seen = {}
+
+        def on_record(record):
+            seen.setdefault(record.kind, time.perf_counter() - t0)
+
+        planner.plan_workflow_stream(q, on_record=on_record, use_cache=False)
+        total = time.perf_counter() - t0
+        trig = f"{seen['trigger']:.2f}s" if "trigger" in seen else "n/a"
+        evnt = f"{seen['event']:.2f}s" if "event" in seen else "n/a"
+        print(f"first trigger {trig}  first event {evnt}  complete {total:.2f}s  {q[:60]}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Streaming planner first-trigger latency.")
+    parser.add_argument("--live", nargs="+", metavar="QUERY", help="stream real plans for these queries")
+    parser.add_argument("--ttft", type=float, default=0.4, help="simulated time to first token (s)")
+    parser.add_argument("--tps", type=float, default=80.0, help="simulated deltas per second")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    if args.live:
+        live(args.live)
+    else:
+        replay(args.ttft, args.tps)
+
+
+if __name__ == "__main__":
+    main()
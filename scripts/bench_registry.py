@@ -0,0 +1,116 @@
+# scripts/bench_registry.py
+"""
+Benchmark support expansion + core block lookup on a synthetic registry.
+
+    python scripts/bench_registry.py [n_chunks]
+"""
+import random
+import sys
+import time
+from typing import Dict, List
+
+from rag.registry import build_index
+from rag.support_expander import _key, expand_support
+
+N_CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+N_TOPICS = 400
+N_QUERIES = 2_000
+
+
+def _synthetic_chunks(n: int) -> List[Dict]:
+    rng = random.Random(42)
+    topics = [f"topic_{i}" for i in range(N_TOPICS)] + ["conditions", "loops", "planner_policy"]
+    chunks = []
+    for i in range(n):
+        role = rng.choice(["router", "support", "support", "static"])
+        chunks.append(
+            {
+                "chunk_id": f"chunk-{i}",
+                "doc_type": "CORE" if role == "static" and i % 50 == 0 else rng.choice(["RULE", "RULE", "CATALOG"]),
+                "topic": rng.choice(topics),
+                "priority": rng.randint(0, 150),
+                "role": role,
+                "data": f"data {i}",
+                "text": f"text {i}",
+                "source": "synthetic",
+                "expands": (),
+                "always_include": False,
+            }
+        )
+    for ch in chunks:
+        if ch["topic"] == "loops":
+            ch["expands"] = ("flow_formatting",)
+        elif ch["topic"] == "planner_policy":
+            ch["always_include"] = True
+    return chunks
+
+
+def _scan_expand(all_chunks: List[Dict], allowed_topics: List[str]) -> List[Dict]:
+    # Pre-index implementation: full scan + hardcoded family rules per call.
+    allowed = set(allowed_topics)
+    existing_topics = {c.get("topic") for c in all_chunks}
+    if "conditions" in allowed:
+        for t in ("cond_bin", "cond_seq", "cond_dom"):
+            if t in existing_topics:
+                allowed.add(t)
+    if "loops" in allowed and "flow_formatting" in existing_topics:
+        allowed.add("flow_formatting")
+    allowed |= {"planner_policy"}
+
+    picked = {}
+    for ch in all_chunks:
+        topic = ch.get("topic")
+        if not topic or ch.get("role") not in {"router", "support"}:
+            continue
+        if topic in allowed:
+            if ch.get("doc_type") == "CATALOG" and topic not in set(allowed_topics):
+                continue
+            picked[_key(ch)] = ch
+    return list(picked.values())
+
+
+def _scan_core(all_chunks: List[Dict]) -> List[Dict]:
+    core = [
+        ch for ch in all_chunks
+        if ch.get("role") == "static" and (
+            ch.get("doc_type") == "CORE" or ch.get("topic") in {"core_intro", "intro", "core"}
+        )
+    ]
+    return sorted(core, key=lambda c: int(c.get("priority", 0)), reverse=True)
+
+
+def main():
+    chunks = _synthetic_chunks(N_CHUNKS)
+    rng = random.Random(7)
+    topic_pool = sorted({c["topic"] for c in chunks})
+    queries = [rng.sample(topic_pool, rng.randint(1, 2)) for _ in range(N_QUERIES)]
+
+    t0 = time.perf_counter()
+    index = build_index(chunks)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    # sanity: both paths agree
+    for q in queries[:50]:
+        assert expand_support(q, index=index) == _scan_expand(chunks, q)
+    assert list(index.core_blocks) == _scan_core(chunks)
+
+    t0 = time.perf_counter()
+    for q in queries:
+        _scan_core(chunks)
+        _scan_expand(chunks, q)
+    scan_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for q in queries:
+        index.core_blocks
+        expand_support(q, index=index)
+    index_s = time.perf_counter() - t0
+
+    print(f"chunks={N_CHUNKS} topics={len(topic_pool)} queries={N_QUERIES}")
+    print(f"index build: {build_ms:.1f} ms (once per registry load)")
+    print(f"full scan:   {scan_s / N_QUERIES * 1e6:9.1f} us/query")
+    print(f"indexed:     {index_s / N_QUERIES * 1e6:9.1f} us/query  ({scan_s / index_s:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
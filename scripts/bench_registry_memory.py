@@ -0,0 +1,115 @@
+# scripts/bench_registry_memory.py
+"""
+Per-registry memory footprint: plain-dict chunks vs slotted `Chunk` records.
+
+Each registry is built from freshly decoded JSON, like a snapshot load, so
+repeated metadata strings are separate objects unless interned.
+
+    python scripts/bench_registry_memory.py [n_chunks] [n_registries]
+"""
+import gc
+import hashlib
+import json
+import random
+import sys
+import tracemalloc
+from typing import Dict, List
+
+from rag.chunk import Chunk
+
+N_CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+N_REGISTRIES = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+
+def _synthetic_source(n: int) -> str:
+    rng = random.Random(42)
+    topics = [f"topic_{i}" for i in range(200)]
+    rows = []
+    for i in range(n):
+        rows.append(
+            {
+                "doc_type": rng.choice(["RULE", "RULE", "CATALOG", "CORE"]),
+                "topic": rng.choice(topics),
+                "priority": rng.randint(0, 150),
+                "role": rng.choice(["router", "support", "static"]),
+                "data": f"ROUTER.RULE summary {i} " + "x" * rng.randint(40, 200),
+                "text": f"Full rule text {i} " + "y" * rng.randint(200, 2000),
+                "expands": [rng.choice(topics)] if i % 10 == 0 else [],
+                "always_include": False,
+            }
+        )
+    return json.dumps(rows)
+
+
+def _as_dict(ch: Dict) -> Dict:
+    # Pre-Chunk registry record: normalized dict + precomputed hashes.
+    return {
+        "doc_type": ch["doc_type"],
+        "topic": ch["topic"],
+        "priority": int(ch["priority"]),
+        "role": ch["role"],
+        "data": ch["data"].strip(),
+        "text": ch["text"].strip(),
+        "expands": tuple(ch.get("expands", ())),
+        "always_include": bool(ch.get("always_include", False)),
+        "source": "clean",
+        "text_sha1": hashlib.sha1(ch["text"].strip().encode("utf-8")).hexdigest(),
+        "data_sha256": hashlib.sha256(ch["data"].encode("utf-8")).hexdigest(),
+        "data_tokens": None,
+        "text_tokens": None,
+    }
+
+
+def _as_chunk(ch: Dict) -> Chunk:
+    return Chunk(
+        doc_type=ch["doc_type"],
+        topic=ch["topic"],
+        priority=ch["priority"],
+        role=ch["role"],
+        data=ch["data"].strip(),
+        text=ch["text"].strip(),
+        expands=ch.get("expands", ()),
+        always_include=ch.get("always_include", False),
+        source="clean",
+    )
+
+
+def _measure(source: str, make) -> List[int]:
+    sizes = []
+    keep = []
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(N_REGISTRIES):
+        before = tracemalloc.get_traced_memory()[0]
+        rows = json.loads(source)
+        registry = [make(r) for r in rows]
+        del rows
+        gc.collect()
+        sizes.append(tracemalloc.get_traced_memory()[0] - before)
+        keep.append(registry)
+    tracemalloc.stop()
+    return sizes
+
+
+def main():
+    source = _synthetic_source(N_CHUNKS)
+    text_bytes = sum(
+        sys.getsizeof(r["data"]) + sys.getsizeof(r["text"]) for r in json.loads(source)
+    )
+
+    dict_sizes = _measure(source, _as_dict)
+    chunk_sizes = _measure(source, _as_chunk)
+
+    def mb(n: float) -> str:
+        return f"{n / 1024 / 1024:7.2f} MB"
+
+    d = sum(dict_sizes) / len(dict_sizes)
+    c = sum(chunk_sizes) / len(chunk_sizes)
+    print(f"chunks={N_CHUNKS} registries={N_REGISTRIES} (data+text strings: {mb(text_bytes)})")
+    print(f"dict chunks:  {mb(d)} per registry, {mb(d - text_bytes)} excluding data/text")
+    print(f"Chunk:        {mb(c)} per registry, {mb(c - text_bytes)} excluding data/text")
+    print(f"saved:        {mb(d - c)} per registry ({(d - c) / d:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# scripts/check_index_staleness.py
+"""
+Check the build manifest's staleness test (rag.manifest.index_problems)
+against edits of the current registry: a `text`-only edit must leave the
+index valid, while edits of the embedded `data` or of routing metadata must
+report it stale. Builds from before embed keys keep comparing chunk ids.
+
+    python scripts/check_index_staleness.py
+"""
+import sys
+from types import SimpleNamespace
+
+from rag.manifest import build_manifest, chunks_digest, embed_key, index_metadata, index_problems, registry_digest
+from rag.registry import get_registry
+
+MODEL, DIMENSIONS, DIM = "text-embedding-3-small", 0, 1536
+
+
+def _check(label: str, ok: bool, failures: list) -> None:
+    print(f"{'✅' if ok else '❌'} {label}")
+    if not ok:
+        failures.append(label)
+
+
+def _embedded(chunks) -> list:
+    return [ch for ch in chunks if (ch.data or "").strip()]
+
+
+def _edited(chunks, **changes):
+    # the first embedded chunk, replaced
+    i = next(i for i, ch in enumerate(chunks) if (ch.data or "").strip())
+    return SimpleNamespace(chunks=chunks[:i] + [chunks[i].replace(**changes)] + chunks[i + 1:])
+
+
+def _problems(build, registry) -> list:
+    return index_problems(build, MODEL, DIMENSIONS, None, None, registry_digest(registry, build))
+
+
+def main():
+    failures: list = []
+    chunks = list(get_registry().chunks)
+    embedded = _embedded(chunks)
+    build = build_manifest([embed_key(index_metadata(ch)) for ch in embedded], MODEL, DIMENSIONS, DIM)
+    first = embedded[0]
+
+    _check("unchanged registry is not stale", not _problems(build, SimpleNamespace(chunks=chunks)), failures)
+    _check(
+        "text-only edit is not stale",
+        not _problems(build, _edited(chunks, text=(first.text or "") + " (edited)")),
+        failures,
+    )
+    _check("data edit is stale", bool(_problems(build, _edited(chunks, data=first.data + " (edited)"))), failures)
+    _check(
+        "priority edit is stale",
+        bool(_problems(build, _edited(chunks, priority=int(first.priority or 0) + 1))),
+        failures,
+    )
+
+    legacy = {k: v for k, v in build.items() if k != "chunk_key"}
+    legacy["chunk_hashes"] = sorted(ch.chunk_id for ch in embedded)
+    legacy["chunks_digest"] = chunks_digest(legacy["chunk_hashes"])
+    _check("legacy build matches by chunk id", not _problems(legacy, SimpleNamespace(chunks=chunks)), failures)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
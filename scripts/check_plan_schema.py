@@ -0,0 +1,80 @@
+# scripts/check_plan_schema.py
+"""
+Check rag.plan_schema on the sample JSON plans in data/plan_json/: each plan
+must validate, and its `codes_output` must equal `parse_plan()` of its own
+rendered Markdown (nested container routes are compared by type only; the
+Markdown parser keeps just the first character of their text). Then measure
+validate + convert throughput against parsing the rendered Markdown.
+
+    python scripts/check_plan_schema.py [rounds]
+"""
+import copy
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+from rag.plan_parser import parse_plan
+from rag.plan_schema import load_plan, render_markdown, to_codes_output, validate_plan
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAN_DIR = os.path.join(_REPO_ROOT, "data", "plan_json")
+
+
+def _comparable(codes_output):
+    out = copy.deepcopy(codes_output)
+    for step in out["flow_sequence"]:
+        for container in step["branches"].get("containers", []):
+            container["nested"] = [n["branch_type"] for n in container.get("nested", [])]
+    return out
+
+
+def main():
+    logging.disable(logging.WARNING)
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(PLAN_DIR, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            corpus.append((os.path.basename(path), f.read()))
+
+    failed = []
+    for name, text in corpus:
+        plan = load_plan(text)
+        if _comparable(to_codes_output(plan)) != _comparable(parse_plan(render_markdown(plan))):
+            failed.append(name)
+    print(f"round trip: {len(corpus) - len(failed)}/{len(corpus)} plans match their rendered Markdown")
+    for name in failed:
+        print(f"   ❌ {name}")
+
+    # a broken plan reports every problem
+    bad = json.loads(corpus[0][1])
+    bad["trigger"]["code"] = "DB_TRIGGER"
+    bad["flow"][0]["branches"][0]["type"] = "LOGIC_BLOCK"
+    del bad["events"]
+    errors = validate_plan(bad)
+    print(f"invalid plan: {len(errors)} errors reported")
+    for e in errors:
+        print(f"   {e}")
+    if failed or not errors:
+        sys.exit(1)
+
+    texts = [text for _, text in corpus]
+    markdown = [render_markdown(json.loads(t)) for t in texts]
+    for label, fn, inputs in (
+        ("json validate + convert", lambda t: to_codes_output(load_plan(t)), texts),
+        ("markdown parse", parse_plan, markdown),
+    ):
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            for item in inputs:
+                fn(item)
+        elapsed = time.perf_counter() - t0
+        n = ROUNDS * len(inputs)
+        print(f"{label}: {n / elapsed:,.0f} plans/sec")
+
+
+if __name__ == "__main__":
+    main()
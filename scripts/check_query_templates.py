@@ -0,0 +1,94 @@
+# scripts/check_query_templates.py
+"""
+Check rag.query_templates: negated and plain field values, and capitalised
+workflow words ("Slack", "Webhook", catalog names), must give different
+templates, and re-filling a cached plan must only swap the spans that echo
+the old query's values (never step / event names), falling back when the
+re-filled plan would differ in anything else.
+
+    python scripts/check_query_templates.py
+"""
+import logging
+import sys
+
+from rag.plan_parser import parse_plan
+from rag.query_templates import mask_query, refill
+
+USER_PLAN = """## Trigger
+- trigger_code: TRG_API
+
+## Events
+- EVNT_USER_MGMT_ADD
+
+## Flow Sequence
+1. Trigger (TRG_API)
+2. Start
+3. Create User (EVNT_USER_MGMT_ADD)
+4. End
+
+## Summary
+Creates the account with role {role}.
+"""
+
+NAME_IN_STEP_PLAN = """## Trigger
+- trigger_code: TRG_API
+
+## Events
+- EVNT_USER_MGMT_ADD
+
+## Flow Sequence
+1. Trigger (TRG_API)
+2. Start
+3. Create user (EVNT_USER_MGMT_ADD)
+4. End
+
+## Summary
+Creates the account with role user.
+"""
+
+
+def _check(label: str, ok: bool, failures: list) -> None:
+    print(f"{'✅' if ok else '❌'} {label}")
+    if not ok:
+        failures.append(label)
+
+
+def main():
+    logging.disable(logging.WARNING)
+    failures: list = []
+
+    plain = mask_query("if status is approved send email to the manager")
+    negated = mask_query("if status is not approved send email to the manager")
+    _check(f"negation keeps its own template ({negated.text!r})", plain.text != negated.text, failures)
+    never = mask_query("if priority never high then notify the team")
+    _check("'never' is not a slot value", ("VAL", "never") not in never.slots, failures)
+
+    slack = mask_query("when a record is created send Slack message to Priya")
+    webhook = mask_query("when a record is created send Webhook message to Priya")
+    _check(f"workflow words keep their own template ({webhook.text!r})", slack.text != webhook.text, failures)
+    _check("a name next to workflow words is still a slot", ("NAME", "Priya") in webhook.slots, failures)
+
+    source = mask_query("create user Abishek with role user")
+    target = mask_query("create user Abishek with role admin")
+    _check("role queries share a template", source.text == target.text, failures)
+
+    cached = USER_PLAN.format(role="user")
+    out = refill(cached, parse_plan(cached), list(source.slots), list(target.slots))
+    _check("echoed value is swapped", out is not None and "with role admin." in out[0], failures)
+    _check(
+        "step name is kept",
+        out is not None and "Create User (EVNT_USER_MGMT_ADD)" in out[0]
+        and out[1]["flow_sequence"][1]["step"] == parse_plan(cached)["flow_sequence"][1]["step"],
+        failures,
+    )
+
+    # the old value also appears (same case) inside a step name: ambiguous, so no reuse
+    out = refill(NAME_IN_STEP_PLAN, parse_plan(NAME_IN_STEP_PLAN), list(source.slots), list(target.slots))
+    _check("value inside a step name falls back", out is None, failures)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
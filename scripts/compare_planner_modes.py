@@ -0,0 +1,89 @@
+# scripts/compare_planner_modes.py
+"""
+Prompt size and latency of the two planner paths on the same queries:
+
+  crew    CrewAI agent (role/goal/backstory) + prompt_full in the task
+  direct  RAG-assembled prompt (rag.assembler) in one chat completion
+
+Prompt tokens are counted locally with rag.tokens over the text each path
+sends; CrewAI wraps it in its own templates, so the crew numbers are a lower
+bound. With --run each query is also planned end to end in both modes and
+the wall time is reported (the crew path is skipped if crewai is missing).
+
+    python -m scripts.compare_planner_modes [--run] [query ...]
+"""
+import argparse
+import importlib.util
+import statistics
+import time
+from typing import List, Optional
+
+import planner
+from rag.assembler import assemble_prompt
+from rag.tokens import LLM_MODEL, count_tokens, tokenizer_name
+
+DEFAULT_QUERIES = [
+    "If quantity > 100 send email, else send notification",
+    "Check if status is approved then send email, and check if amount > 1000 then send alert",
+    "First check if status is Low then email, if not then check if status is Medium then alert",
+    "When application status changes to Approved, send 10 times email notifications to anish@gmail.com",
+    "retrieve all id of records where Quantity > 10",
+    "create a record with role: admin, department: science",
+]
+
+_CREW_EXPECTED_OUTPUT = "Markdown structured workflow plan with explicit trigger_code, code, and code for each component."
+
+
+def crew_prompt_tokens(query: str) -> int:
+    agent = "\n".join([planner.PLANNER_ROLE, planner.PLANNER_GOAL, planner.PLANNER_BACKSTORY])
+    task = f"User Query: {query}\n{planner.prompt_full}\n{_CREW_EXPECTED_OUTPUT}"
+    return count_tokens(agent, LLM_MODEL) + count_tokens(task, LLM_MODEL)
+
+
+def direct_prompt_tokens(query: str) -> int:
+    prompt = assemble_prompt(query, debug=False)
+    return count_tokens(planner.PLANNER_SYSTEM_PROMPT, LLM_MODEL) + count_tokens(prompt, LLM_MODEL)
+
+
+def _timed_plan(query: str, mode: str) -> float:
+    t0 = time.perf_counter()
+    planner.plan_workflow(query, mode=mode, use_cache=False)
+    return time.perf_counter() - t0
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare the crew and direct planner paths.")
+    parser.add_argument("--run", action="store_true", help="also call the LLM in both modes and time it")
+    parser.add_argument("queries", nargs="*", help="queries (default: a built-in sample)")
+    args = parser.parse_args(argv)
+
+    queries = args.queries or DEFAULT_QUERIES
+    has_crew = importlib.util.find_spec("crewai") is not None
+    print(f"tokenizer={tokenizer_name(LLM_MODEL)} queries={len(queries)}"
+          + ("" if not args.run or has_crew else " (crewai not installed: crew path not timed)"))
+
+    crew_tokens, direct_tokens, crew_s, direct_s = [], [], [], []
+    for q in queries:
+        ct, dt = crew_prompt_tokens(q), direct_prompt_tokens(q)
+        crew_tokens.append(ct)
+        direct_tokens.append(dt)
+        line = f"crew={ct:6d} tok  direct={dt:6d} tok ({dt / ct:5.1%})"
+        if args.run:
+            d = _timed_plan(q, "direct")
+            direct_s.append(d)
+            if has_crew:
+                c = _timed_plan(q, "crew")
+                crew_s.append(c)
+                line += f"  crew={c:6.2f}s"
+            line += f"  direct={d:6.2f}s"
+        print(f"{line}  {q[:60]}")
+
+    print(f"📊 median prompt tokens: crew={statistics.median(crew_tokens):.0f} "
+          f"direct={statistics.median(direct_tokens):.0f}")
+    if direct_s:
+        crew_part = f"crew={statistics.median(crew_s):.2f}s " if crew_s else ""
+        print(f"⏱️  median latency: {crew_part}direct={statistics.median(direct_s):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# scripts/plan_batch.py
+"""
+Plan a query file offline through the OpenAI Batch API (see rag/plan_batch.py).
+
+    python -m scripts.plan_batch prepare queries.txt --out .cache/batch/plans.jsonl
+    python -m scripts.plan_batch submit .cache/batch/plans.jsonl          # prints the batch id
+    python -m scripts.plan_batch fetch BATCH_ID --out .cache/batch/results.jsonl
+    python -m scripts.plan_batch ingest .cache/batch/results.jsonl       # resumable
+    python -m scripts.plan_batch export --out plans.jsonl [--input queries.txt]
+    python -m scripts.plan_batch stats
+
+`submit --local --out FILE` answers the requests now with regular chat
+completions (same output format, no batch discount) and writes FILE.
+Query files hold one query per line, or `{"query": ...}` objects in `.jsonl`.
+Ingested plans also go into the plan cache unless `--no-cache` / PLAN_CACHE=0.
+"""
+import argparse
+import json
+import logging
+from typing import List, Optional
+
+import planner
+from rag.plan_batch import PLAN_BATCH_DB, BatchStore, LocalBatchClient, download, ingest, prepare, read_queries, submit
+from rag.plan_cache import PLAN_CACHE_ENABLED
+
+
+def _local_client() -> LocalBatchClient:
+    client = planner.get_openai_client()
+
+    def complete(body):
+        resp = client.chat.completions.create(**body)
+        return resp.choices[0].message.content or ""
+
+    return LocalBatchClient(complete)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline batch planning via Batch API JSONL files.")
+    parser.add_argument("--db", default=None, help=f"batch store (default: {PLAN_BATCH_DB})")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("prepare", help="assemble prompts into a Batch input file")
+    p.add_argument("queries")
+    p.add_argument("--out", required=True)
+    p.add_argument("--all", action="store_true", help="also re-request prompts that already have a result")
+
+    p = sub.add_parser("submit", help="upload the input file and create a batch")
+    p.add_argument("input")
+    p.add_argument("--local", action="store_true", help="answer now with chat completions instead of the Batch API")
+    p.add_argument("--out", help="output file for --local")
+
+    p = sub.add_parser("fetch", help="download the output of a completed batch")
+    p.add_argument("batch_id")
+    p.add_argument("--out", required=True)
+
+    p = sub.add_parser("ingest", help="parse a Batch output file into the results table")
+    p.add_argument("output")
+    p.add_argument("--commit-every", type=int, default=500)
+    p.add_argument("--no-cache", action="store_true", help="do not copy plans into the plan cache")
+
+    p = sub.add_parser("export", help="write one JSON line per query with its plan or error")
+    p.add_argument("--out", required=True)
+    p.add_argument("--input", help="only queries of this input file")
+
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    with BatchStore(args.db) as store:
+        if args.cmd == "prepare":
+            s = prepare(
+                read_queries(args.queries), planner.direct_messages, args.out, store,
+                planner.PLANNER_MODEL, planner.PLANNER_TEMPERATURE,
+                input_name=args.queries, skip_done=not args.all,
+            )
+            print(f"📝 {s['queries']} queries -> {s['requests']} requests in {args.out} "
+                  f"({s['duplicates']} duplicate prompts, {s['already_planned']} already planned)")
+        elif args.cmd == "submit":
+            if args.local:
+                if not args.out:
+                    parser.error("submit --local needs --out")
+                client = _local_client()
+                batch_id = submit(client, args.input, store)
+                download(client, batch_id, args.out)
+                print(f"✅ {batch_id}: output written to {args.out}")
+            else:
+                batch_id = submit(planner.get_openai_client(), args.input, store)
+                print(f"🚀 Submitted {batch_id}")
+        elif args.cmd == "fetch":
+            status = download(planner.get_openai_client(), args.batch_id, args.out)
+            if status == "completed":
+                print(f"✅ {args.batch_id}: output written to {args.out}")
+            else:
+                print(f"⏳ {args.batch_id} is {status}")
+        elif args.cmd == "ingest":
+            cache = planner.get_plan_cache() if PLAN_CACHE_ENABLED and not args.no_cache else None
+            c = ingest(args.output, store, plan_cache=cache, commit_every=args.commit_every)
+            print(f"📥 {c['ok']} plans, {c['errors']} errors ({c['skipped']} lines already ingested)")
+        elif args.cmd == "export":
+            n = 0
+            with open(args.out, "w", encoding="utf-8") as out:
+                for row in store.export(args.input):
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    n += 1
+            print(f"📤 {n} queries written to {args.out}")
+        else:
+            s = store.stats()
+            print(f"📦 {store.path}")
+            print(f"   {s['queries']} queries, {s['requests']} requests, {s['batches']} batches")
+            print(f"   {s['results']} plans, {s['errors']} error lines, {s['pending']} requests without a plan")
+
+
+if __name__ == "__main__":
+    main()
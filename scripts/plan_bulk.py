@@ -0,0 +1,183 @@
+# scripts/plan_bulk.py
+"""
+Plan a whole query file concurrently (direct mode), within rate limits.
+
+Queries come from a `.jsonl` (`query` field), `.csv` (`query` column) or
+plain text file. A pool of `--concurrency` asyncio workers routes and
+assembles each prompt and sends it with the async OpenAI client. Every call
+first takes one request and its estimated tokens (prompt +
+`PLANNER_EST_COMPLETION_TOKENS`) from the rate limiter (rag/rate_limit.py, `PLANNER_RPM` / `PLANNER_TPM`);
+rate-limit and transient errors are retried with backoff. Plan cache hits
+skip the LLM and the limiter.
+
+Routing, assembly, the plan cache and the catalog code check
+(`PLAN_CODE_CHECK`) go through `planner.prepare_direct_plan` /
+`finish_direct_plan` in worker threads, so results are checked exactly like
+`plan_workflow`'s. Each result is appended to the output JSONL as soon as it
+completes (so the lines are in completion order; `index` is the input
+position). Throughput, latency percentiles and error counts are printed at
+the end.
+
+    python -m scripts.plan_bulk queries.jsonl --out plans.jsonl [--concurrency 8] [--rpm 500] [--tpm 200000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import planner
+from rag.embedder import RETRYABLE_ERRORS, retry_after
+from rag.plan_batch import read_queries
+from rag.rate_limit import PLANNER_RPM, PLANNER_TPM, RateLimiter
+from rag.tokens import count_tokens
+
+PLANNER_CONCURRENCY = int(os.getenv("PLANNER_CONCURRENCY", "8"))
+PLANNER_EST_COMPLETION_TOKENS = int(os.getenv("PLANNER_EST_COMPLETION_TOKENS", "800"))
+PLANNER_MAX_RETRIES = int(os.getenv("PLANNER_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+async def _complete(client, messages: list, limiter: RateLimiter, estimated: int):
+    attempt = 0
+    while True:
+        await limiter.acquire(estimated)
+        try:
+            resp = await client.chat.completions.create(
+                model=planner.PLANNER_MODEL,
+                temperature=planner.PLANNER_TEMPERATURE,
+                messages=messages,
+            )
+        except RETRYABLE_ERRORS as exc:
+            limiter.settle(estimated, 0)
+            attempt += 1
+            if attempt > PLANNER_MAX_RETRIES:
+                raise
+            delay = retry_after(exc)
+            if delay is None:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(delay)
+            continue
+        usage = getattr(resp, "usage", None)
+        limiter.settle(estimated, getattr(usage, "total_tokens", None))
+        return resp.choices[0].message.content or "", attempt
+
+
+async def _plan_one(index: int, query: str, client, limiter: RateLimiter, use_cache: bool) -> Dict:
+    t0 = time.perf_counter()
+    row = {"index": index, "query": query, "status": "ok", "cached": False, "retries": 0}
+    try:
+        # routing, assembly, the plan cache and the code check block: keep them off the event loop
+        request = await asyncio.to_thread(planner.prepare_direct_plan, query, use_cache)
+        if request.cached is not None:
+            workflow_plan, codes_output = request.cached
+            row["cached"] = True
+        else:
+            estimated = sum(count_tokens(m["content"]) for m in request.messages) + PLANNER_EST_COMPLETION_TOKENS
+            reply, row["retries"] = await _complete(client, request.messages, limiter, estimated)
+            workflow_plan, codes_output = await asyncio.to_thread(planner.finish_direct_plan, request, reply)
+        row["workflow_plan"] = workflow_plan
+        row["codes_output"] = codes_output
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["latency_s"] = round(time.perf_counter() - t0, 4)
+    return row
+
+
+async def run(
+    queries: List[str],
+    out_path: str,
+    concurrency: int = PLANNER_CONCURRENCY,
+    rpm: int = PLANNER_RPM,
+    tpm: int = PLANNER_TPM,
+    use_cache: bool = True,
+) -> Dict:
+    client = planner.get_async_openai_client()
+    limiter = RateLimiter(rpm, tpm)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in enumerate(queries):
+        queue.put_nowait(item)
+
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    counts = Counter()
+
+    with open(out_path, "w", encoding="utf-8") as out:
+        async def worker() -> None:
+            while True:
+                try:
+                    index, query = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                row = await _plan_one(index, query, client, limiter, use_cache)
+                # single event loop thread: lines never interleave
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+                latencies.append(row["latency_s"])
+                counts[row["status"]] += 1
+                counts["cached"] += row["cached"]
+                counts["retries"] += row["retries"]
+                if row["status"] == "error":
+                    errors[row["error"].split(":", 1)[0]] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(queries) or 1)))))
+        elapsed = time.perf_counter() - t0
+
+    return {
+        "queries": len(queries),
+        "ok": counts["ok"],
+        "errors": counts["error"],
+        "error_types": dict(errors),
+        "cached": counts["cached"],
+        "retries": counts["retries"],
+        "elapsed_s": elapsed,
+        "throughput": len(queries) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p90": _percentile(latencies, 90),
+        "p99": _percentile(latencies, 99),
+        "rate_limit_wait_s": limiter.waited_seconds,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Concurrent, rate-limited planning of a query file.")
+    parser.add_argument("queries", help=".jsonl / .csv / .txt query file")
+    parser.add_argument("--out", required=True, help="output JSONL (one line per query, completion order)")
+    parser.add_argument("--concurrency", type=int, default=PLANNER_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=PLANNER_RPM, help="requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=PLANNER_TPM, help="tokens per minute (0 = unlimited)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the plan cache")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    queries = read_queries(args.queries)
+    print(f"🚀 Planning {len(queries)} queries with {args.concurrency} workers "
+          f"(rpm={args.rpm or '∞'}, tpm={args.tpm or '∞'})")
+    s = asyncio.run(run(queries, args.out, args.concurrency, args.rpm, args.tpm, use_cache=not args.no_cache))
+
+    print(f"✅ {s['ok']}/{s['queries']} planned in {s['elapsed_s']:.1f}s "
+          f"({s['throughput']:.2f} queries/s, {s['cached']} from cache, {s['retries']} retries)")
+    print(f"⏱️  latency p50 {s['p50']:.2f}s  p90 {s['p90']:.2f}s  p99 {s['p99']:.2f}s; "
+          f"rate limiter wait {s['rate_limit_wait_s']:.1f}s")
+    if s["errors"]:
+        print(f"❌ {s['errors']} errors: " + ", ".join(f"{k} x{v}" for k, v in sorted(s["error_types"].items())))
+    print(f"📄 Results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
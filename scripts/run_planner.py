@@ -1,9 +1,14 @@
 # scripts/run_planner.py
+import argparse
+import json
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
 
 from rag.assembler import assemble_prompt
+from rag.plan_cache import PLAN_CACHE_ENABLED, PlanCache, plan_key
+from rag.plan_parser import parse_plan
+from rag.registry import get_registry
 
 load_dotenv()
 
@@ -11,25 +16,41 @@ MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
 
 def main():
+    parser = argparse.ArgumentParser(description="Assemble the prompt for a query and run the planner LLM.")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the plan cache")
+    args = parser.parse_args()
+
     q = input("Enter query: ").strip()
     if not q:
         print("Empty query.")
         return
 
+    version = get_registry().version
     prompt = assemble_prompt(q, debug=False)
-
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    resp = client.chat.completions.create(
-        model=MODEL,
-        temperature=TEMPERATURE,
-        messages=[
-            {"role": "system", "content": "You are a precise workflow planner. Output Markdown only."},
-            {"role": "user", "content": prompt},
-        ],
-    )
+    messages = [
+        {"role": "system", "content": "You are a precise workflow planner. Output Markdown only."},
+        {"role": "user", "content": prompt},
+    ]
+
+    cache = PlanCache() if PLAN_CACHE_ENABLED and not args.no_cache else None
+    key = plan_key(json.dumps(messages), MODEL, TEMPERATURE, version)
+    hit = cache.get(key) if cache else None
+    if hit:
+        plan = hit[0]
+        print("\n(plan cache hit)")
+    else:
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        resp = client.chat.completions.create(
+            model=MODEL,
+            temperature=TEMPERATURE,
+            messages=messages,
+        )
+        plan = resp.choices[0].message.content or ""
+        if cache and plan.strip():
+            cache.put(key, MODEL, TEMPERATURE, version, plan, parse_plan(plan))
 
     print("\n=== PLANNER OUTPUT ===\n")
-    print(resp.choices[0].message.content)
+    print(plan)
 
 if __name__ == "__main__":
     main()